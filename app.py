@@ -1,8 +1,30 @@
-import openactive as oa
+import cache
+import harvest
+import numpy as np
+import os
 import pandas as pd
-import pydeck as pdk
 import streamlit as st
 from datetime import datetime
+from itertools import chain
+from extract import concat_highlights, get_highlights
+from facets import TOP_N_DEFAULT, FacetIndex
+from filters import FilterIndex
+from ingest import SECONDS_TIMEOUT_DEFAULT, fetch_stats_template, get_opportunities_empty, get_opportunities_pages
+from jobs import JobManager
+from join import SuperEventReader, get_superevent_feed_url, join_superevents
+from profiling import Profiler, get_rss_bytes, profile
+from spill import HighlightsBuffer
+from store import DatasetStore
+from table import PAGE_SIZES, SortIndex, get_num_pages
+
+# --------------------------------------------------------------------------------------------------
+
+SECONDS_RENDER_PREVIEW = 1
+SECONDS_WAIT_SUPEREVENTS = 0.5
+SECONDS_POLL_JOB = 0.5
+ROWS_PAGINATE = 10000
+ROWS_EXTRACT_CACHED = 50000 # Cached items are extracted in chunks, so that a big feed can go over its memory budget part way through
+PROFILING_LOG_PATH = os.environ.get('OPENACTIVE_PROFILING_LOG') # Profiling records are also appended to this JSON lines file if set
 
 # --------------------------------------------------------------------------------------------------
 
@@ -30,15 +52,43 @@ st.set_page_config(
 
 # --------------------------------------------------------------------------------------------------
 
-# Cache feeds to allow access across sessions i.e. different browser tabs
-@st.cache_data
-def get_feeds():
-    return oa.get_feeds()
+# Share feeds across sessions i.e. different browser tabs. Dataset sites are read concurrently, which is
+# much faster than the serial read in oa.get_feeds(), and the feeds are kept on disk, so that after a
+# restart the app starts with the feeds from the last read while they are read again in the background.
+@st.cache_resource
+def get_catalogue():
+    return harvest.Catalogue()
+
+# --------------------------------------------------------------------------------------------------
+
+def set_feeds(feeds, time_created):
+    st.session_state.feeds = feeds
+    st.session_state.feeds_time_created = time_created
+    st.session_state.providers = sorted(
+        [(dataset_url,feeds_dataset[0]['publisherName'] or dataset_url) for dataset_url,feeds_dataset in st.session_state.feeds.items()],
+        key=lambda x: x[1].lower()
+    )
+
+# --------------------------------------------------------------------------------------------------
+
+# One store per process, so that sessions reading the same feed share a single copy of its data
+@st.cache_resource
+def get_store():
+    return DatasetStore()
+
+# --------------------------------------------------------------------------------------------------
+
+# One job manager per process, so that feeds are read in the background whatever the sessions waiting
+# for them do, and sessions reading the same feed share a single read
+@st.cache_resource
+def get_job_manager():
+    return JobManager()
 
 # --------------------------------------------------------------------------------------------------
 
 def go():
     clear_outputs()
+    st.session_state.superevent_feed_url = get_superevent_feed_url_selected() if (st.session_state.join_superevents) else None
     st.session_state.started = True
     st.session_state.running = True
 
@@ -53,6 +103,7 @@ def clear():
 def clear_inputs():
     st.session_state.dataset_url_name = None
     st.session_state.feed_url = None
+    st.session_state.superevent_feed_url = None
 
 # --------------------------------------------------------------------------------------------------
 
@@ -61,15 +112,29 @@ def clear_outputs():
         st.session_state.started = False
     if (st.session_state.running):
         st.session_state.running = False
+    st.session_state.cache_status = None
+    st.session_state.cache_bytes_saved = 0
+    st.session_state.fetch_stats = dict(fetch_stats_template)
+    st.session_state.job_error = None
+    if (st.session_state.job is not None):
+        st.session_state.job.release()
+        st.session_state.job = None
+    if (st.session_state.dataset is not None):
+        st.session_state.dataset.release()
+        st.session_state.dataset = None
     if (st.session_state.got_data):
         st.session_state.opportunities = None
+        st.session_state.superevent_opportunities = None
+        st.session_state.superevents = None
         st.session_state.df = None
-        st.session_state.unique_ids = []
-        st.session_state.unique_superevent_ids = []
-        st.session_state.unique_organizer_names = []
+        st.session_state.filter_index = None
+        st.session_state.facet_index = None
+        st.session_state.sort_index = None
+        st.session_state.json_rows = set()
+        st.session_state.json_rows_filters_key = None
+        st.session_state.map = None
+        st.session_state.map_filters_key = None
         st.session_state.unique_organizer_names_logos = []
-        st.session_state.unique_names = []
-        st.session_state.unique_locations = []
         st.session_state.unique_dates = []
         st.session_state.unique_dates_range = ()
         st.session_state.got_data = False
@@ -80,6 +145,7 @@ def clear_outputs():
 # --------------------------------------------------------------------------------------------------
 
 def clear_filters():
+    st.session_state.filtered_text = ''
     st.session_state.filtered_ids = []
     st.session_state.filtered_superevent_ids = []
     st.session_state.filtered_organizers = []
@@ -89,6 +155,78 @@ def clear_filters():
 
 # --------------------------------------------------------------------------------------------------
 
+# The Session Series feed that goes with the selected Scheduled Sessions feed, if there is one
+def get_superevent_feed_url_selected():
+    if (    (st.session_state.dataset_url_name is None)
+        or  (st.session_state.feed_url is None)
+    ):
+        return None
+    return get_superevent_feed_url(
+        st.session_state.feed_url,
+        [feed['url'] for feed in st.session_state.feeds.get(st.session_state.dataset_url_name[0], [])],
+    )
+
+# --------------------------------------------------------------------------------------------------
+
+# Datasets are shared between sessions by this key, as a joined feed has different data to the same
+# feed read on its own
+def get_dataset_key():
+    if (st.session_state.superevent_feed_url):
+        return '{} + {}'.format(st.session_state.feed_url, st.session_state.superevent_feed_url)
+    return st.session_state.feed_url
+
+# --------------------------------------------------------------------------------------------------
+
+def get_superevents(superevent_reader):
+    if (superevent_reader is None):
+        return None
+    return superevent_reader.index.get_df()
+
+# --------------------------------------------------------------------------------------------------
+
+def get_progress_text(job_status, progress):
+    if (job_status == 'queued'):
+        return 'Waiting for one of the {} feed reads already running to finish'.format(get_job_manager().max_jobs)
+    text = '{} pages, {} items{}'.format(
+        progress.get('num_pages', 0),
+        progress.get('num_items', 0),
+        ', written to disk' if (progress.get('spilled')) else '',
+    )
+    superevents = progress.get('superevents')
+    if (superevents is not None):
+        text += '\n\nSession Series: {} pages, {} items{}'.format(
+            superevents['num_pages'],
+            superevents['num_items'],
+            '' if (superevents['running']) else ', done',
+        )
+    if (progress.get('indexing')):
+        text += '\n\nBuilding the table and filters'
+    return text
+
+# --------------------------------------------------------------------------------------------------
+
+def get_fetch_stats_text(fetch_stats):
+    text = '{:,.2f} MB downloaded'.format(fetch_stats['num_bytes'] / 1024**2)
+    if (fetch_stats['num_bytes_decoded'] > fetch_stats['num_bytes']):
+        text += ' ({:,.2f} MB uncompressed)'.format(fetch_stats['num_bytes_decoded'] / 1024**2)
+    text += ', {} {} fetched'.format(fetch_stats['num_fetched'], 'page' if (fetch_stats['num_fetched'] == 1) else 'pages')
+    if (fetch_stats['num_revalidated']):
+        text += ', {} unchanged'.format(fetch_stats['num_revalidated'])
+    if (fetch_stats['num_retries']):
+        text += ', {} {}'.format(fetch_stats['num_retries'], 'retry' if (fetch_stats['num_retries'] == 1) else 'retries')
+    return text
+
+# --------------------------------------------------------------------------------------------------
+
+def get_superevent_item(superevent_id):
+    if (    (st.session_state.superevents is None)
+        or  (superevent_id not in st.session_state.superevents.index)
+    ):
+        return None
+    return st.session_state.superevent_opportunities['items'][st.session_state.superevents.at[superevent_id, 'ID']]
+
+# --------------------------------------------------------------------------------------------------
+
 def disable_input_controls(default=False):
     return st.session_state.running or default
 
@@ -102,6 +240,7 @@ def disable_button_clear_filters():
         st.session_state.filtered_names +
         st.session_state.filtered_locations
     ) > 0
+    filtered_text_active = len(st.session_state.filtered_text.strip()) > 0
 
     if (len(st.session_state.filtered_dates_range) == 0):
         filtered_dates_range_active = False
@@ -112,34 +251,315 @@ def disable_button_clear_filters():
             (st.session_state.filtered_dates_range[0] != st.session_state.unique_dates_range[0]) \
         or  (st.session_state.filtered_dates_range[1] != st.session_state.unique_dates_range[1])
 
-    return ((not filtered_multiselects_active) and (not filtered_dates_range_active))
+    return ((not filtered_multiselects_active) and (not filtered_text_active) and (not filtered_dates_range_active))
+
+# --------------------------------------------------------------------------------------------------
+
+# Missing values may be None or NaN depending on the column dtype, and NaN is the only value that
+# isn't equal to itself
+def get_unique(iterable):
+    return sorted(set([x for x in iterable if (x) and (x == x)]))
 
 # --------------------------------------------------------------------------------------------------
 
-def set_location(location_in):
-    try: location_out = [location_in['name'].strip()]
-    except: location_out = []
+def get_unique_pairs(df):
+    df = df.drop_duplicates().astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
 
-    if ('address' in location_in.keys()):
-        for address_parts_type in ['streetAddress', 'addressLocality', 'addressRegion', 'postalCode', 'addressCountry']:
-            try: address_parts = location_in['address'][address_parts_type].strip().split(',')
-            except: address_parts = []
-            for address_part in address_parts:
-                if (address_part not in location_out):
-                    location_out.append(address_part)
+# --------------------------------------------------------------------------------------------------
+
+def get_uniques(df):
+    unique_dates = get_unique(pd.concat([
+        (df['Date/time start'].loc[df['Date/time start'].notnull()]).dt.date,
+        (df['Date/time end'].loc[df['Date/time end'].notnull()]).dt.date
+    ]))
 
-    return ',\n'.join(location_out) or None
+    return {
+        'unique_organizer_names_logos': get_unique_pairs(df[['Organizer name', 'Organizer logo']]),
+        'unique_dates': unique_dates,
+        'unique_dates_range': (unique_dates[0], unique_dates[-1]) if unique_dates else (),
+    }
 
 # --------------------------------------------------------------------------------------------------
 
-def set_datetime(datetime_isoformat):
-    try: return datetime.fromisoformat(datetime_isoformat)
-    except: return None
+# Combines the uniques of the parts of a spilled table, keeping the organisers in the order first seen
+def merge_uniques(uniques_parts):
+    unique_dates = sorted(set(chain.from_iterable([uniques['unique_dates'] for uniques in uniques_parts])))
+
+    return {
+        'unique_organizer_names_logos': list(dict.fromkeys(chain.from_iterable([uniques['unique_organizer_names_logos'] for uniques in uniques_parts]))),
+        'unique_dates': unique_dates,
+        'unique_dates_range': (unique_dates[0], unique_dates[-1]) if unique_dates else (),
+    }
 
 # --------------------------------------------------------------------------------------------------
 
-def get_unique(iterable):
-    return sorted(set([x for x in iterable if x]))
+# Only the most common options, or those that match the search, are sent to each filter widget, as a
+# feed can have tens of thousands of distinct names. The values already selected are always included,
+# so that they stay selected when the search changes. counts is given for adaptive filters, as the
+# counts of the values with the other filters applied.
+def show_facet_filter(label, column, key, counts=None):
+    facet_index = st.session_state.facet_index
+    options = facet_index.get_options(column, st.session_state.filtered_text, st.session_state.get(key, []), counts=counts)
+    labels = facet_index.get_labels(column, options, counts)
+    st.multiselect(
+        label,
+        options,
+        key=key,
+        format_func=lambda x: labels[x],
+        disabled=(facet_index.get_num_values(column) == 0),
+        help='Options are listed with their numbers of items, most common first, and only the top {:,} are shown. Use the search box to find others.'.format(TOP_N_DEFAULT) if (facet_index.get_num_values(column) > TOP_N_DEFAULT) else None,
+    )
+
+# --------------------------------------------------------------------------------------------------
+
+def get_table(df):
+    return df.drop(columns=['Organizer logo']).rename(columns={'Organizer name': 'Organiser'}) # Note British English for display
+
+# --------------------------------------------------------------------------------------------------
+
+# We use [Lon,Lat] rather than [Lat,Lon] in all of the following map code, as this is the required
+# order for PyDeck, so just standardised in all cases of seeing these quantities. The columns are
+# selected first, so that only these are read from a spilled table.
+def get_map_data(df):
+    df = df[['Lon', 'Lat', 'Location']]
+    return df.loc[
+            df['Lon'].notna()
+        &   df['Lat'].notna()
+    ]
+
+# --------------------------------------------------------------------------------------------------
+
+def get_map(df):
+    map_data = get_map_data(df)
+    if (len(map_data) == 0):
+        return None
+
+    from geo import get_map_layer_data
+    import pydeck as pdk
+
+    layer_data, aggregated = get_map_layer_data(map_data)
+    return (
+        layer_data,
+        aggregated,
+        # This computed view doesn't create a fully encompassing bounding box for some reason, may need to
+        # work something out manually
+        pdk.data_utils.viewport_helpers.compute_view(layer_data[['Lon', 'Lat']]),
+    )
+
+# --------------------------------------------------------------------------------------------------
+
+# The map points and initial view only change when the filtered rows change, so they are worked out
+# once for each set of filters and kept in the session state, rather than on every rerun
+def get_map_cached(df, filters_key):
+    if (st.session_state.map_filters_key != filters_key):
+        st.session_state.map = get_map(df)
+        st.session_state.map_filters_key = filters_key
+
+    return st.session_state.map
+
+# --------------------------------------------------------------------------------------------------
+
+def show_map(layer_data, aggregated, view_state):
+    import pydeck as pdk
+
+    st.subheader(
+        'Geo',
+        help='This map shows locations with coordinate data, with one pin per location. Zoom in and out with your mouse scroll function, and hover over the pins to show pop-up boxes of the location names and addresses, and the number of items at each location. If there are a very large number of locations, then nearby locations are grouped together into single pins, which are sized by the number of items that they contain. Note that the initial zoom may not capture all pins that are actually present, so it\'s worth zooming out a bit to check for others that aren\'t initially seen.'
+    )
+    st.pydeck_chart(pdk.Deck(
+        map_style='road',
+        initial_view_state=view_state,
+        # initial_view_state=pdk.ViewState(
+        #     longitude=-3.0,
+        #     latitude=54.5,
+        #     zoom=4.4,
+        #     pitch=30,
+        # ),
+        layers=[
+            pdk.Layer(
+                'ScatterplotLayer',
+                layer_data,
+                get_position=['Lon', 'Lat'],
+                get_radius='Radius' if (aggregated) else 1,
+                radius_units='pixels' if (aggregated) else 'meters',
+                pickable=True,
+                filled=True,
+                stroked=True,
+                radius_min_pixels=1 if (aggregated) else 10,
+                radius_max_pixels=100 if (aggregated) else 10,
+                line_width_min_pixels=1,
+                line_width_max_pixels=1,
+                get_fill_color=[0, 158, 277],
+                get_line_color=[3, 102, 175],
+                opacity=0.5,
+                elevation_scale=4,
+                elevation_range=[0, 1000],
+            ),
+        ],
+        tooltip={
+            'text': '{Count} items at {Venues} locations' if (aggregated) else '{Locations}\n\n{Count} items',
+        }
+    ))
+    # The dedicated map widget is just a simplified convenience wrapper around PyDeck, and doesn't have
+    # tooltip functionality for e.g. showing location info over individual pins, hence not using this approach
+    # st.map(
+    #     map_data,
+    #     use_container_width=True,
+    #     longitude='Lon',
+    #     latitude='Lat',
+    #     size=200,
+    #     color='#009ee3',
+    # )
+
+# --------------------------------------------------------------------------------------------------
+
+def get_reader_progress(superevent_reader):
+    if (superevent_reader is None):
+        return None
+    return {
+        'num_pages': superevent_reader.num_pages,
+        'num_items': superevent_reader.num_items,
+        'running': superevent_reader.running,
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+# The preview shows only the most recently read rows, no more than ROWS_PAGINATE of them, so that making
+# and drawing it every few seconds takes the same time however much of the feed has been read so far
+def get_preview(dfs, items, superevents):
+    dfs_preview = []
+    num_rows = 0
+    for df in reversed(dfs):
+        dfs_preview.insert(0, df)
+        num_rows += len(df)
+        if (num_rows >= ROWS_PAGINATE):
+            break
+    item_ids = pd.concat(dfs_preview, ignore_index=True)['ID'].drop_duplicates(keep='last')
+    item_ids = [item_id for item_id in item_ids if (item_id in items)][-ROWS_PAGINATE:]
+    return get_table(join_superevents(concat_highlights(dfs_preview, item_ids), superevents))
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads a feed and builds its dataset as a background job (see jobs.py), and returns the data to be
+# published in the dataset store, or None if the feed is empty or the job is cancelled. This runs
+# outside of any session's script, so nothing here calls Streamlit, and the sessions attached to the
+# job show its progress. Each page is extracted as it arrives, and a preview table of the latest rows
+# read is made at most every SECONDS_RENDER_PREVIEW seconds. A partner Session Series feed is read
+# in the background at the same time, and the sessions read so far are joined with the series read so
+# far each time. If the feed goes over the memory budget, then from then on its rows and items are
+# written to disk instead (see spill.py), and there's no preview, as the rows read so far are no longer
+# in memory. The job is checked for cancellation between pages, so the read stops cleanly. A page that
+# can't be read fails the job rather than the feed being shown as if it ended there, while a feed that
+# takes longer than SECONDS_TIMEOUT_DEFAULT to read is shown as far as it was read, with a warning.
+def read_feed(job, feed_url, superevent_feed_url, profiler=None):
+    highlights = HighlightsBuffer()
+    fetch_stats = dict(fetch_stats_template)
+    num_pages = 0
+    num_items = 0
+    time_render = None
+    df_preview = None
+    cache.evict()
+    superevent_reader = SuperEventReader(superevent_feed_url, profiler=profiler) if (superevent_feed_url) else None
+
+    try:
+        with profile(profiler, 'cache read', feed_url=feed_url):
+            opportunities, cache_bytes_saved = cache.get_opportunities(feed_url)
+        job.set_progress(
+            cache_status='miss' if (opportunities is None) else 'hit',
+            cache_bytes_saved=cache_bytes_saved,
+            fetch_stats=fetch_stats,
+            superevents=get_reader_progress(superevent_reader),
+        )
+        if (opportunities is not None):
+            item_ids = list(opportunities['items'].keys())
+            for idx in range(0, len(item_ids), ROWS_EXTRACT_CACHED):
+                with profile(profiler, 'extract', num_items=len(item_ids[idx:idx+ROWS_EXTRACT_CACHED])):
+                    highlights.add(opportunities, get_highlights({item_id: opportunities['items'][item_id] for item_id in item_ids[idx:idx+ROWS_EXTRACT_CACHED]}))
+                if (job.cancelled):
+                    return None
+            del(item_ids)
+        else:
+            opportunities = get_opportunities_empty(feed_url)
+        for opportunities, items_updated, ids_deleted in get_opportunities_pages(opportunities, profiler=profiler, fetch_stats=fetch_stats):
+            with profile(profiler, 'cache write', num_items=len(items_updated)):
+                cache.set_page(feed_url, opportunities, items_updated, ids_deleted)
+            num_pages += 1
+            with profile(profiler, 'extract', num_items=len(items_updated)):
+                highlights.add(opportunities, get_highlights(items_updated) if (items_updated) else None, ids_deleted)
+            num_items = len(opportunities['items'].keys())
+
+            if (    (num_items > 0)
+                and (not highlights.spilled)
+                and (not opportunities['status'])
+                and ((time_render is None) or ((datetime.now() - time_render).total_seconds() >= SECONDS_RENDER_PREVIEW))
+            ):
+                with profile(profiler, 'preview', num_items=num_items):
+                    df_preview = get_preview(highlights.dfs, opportunities['items'], get_superevents(superevent_reader))
+                time_render = datetime.now()
+            job.set_progress(
+                num_pages=num_pages,
+                num_items=num_items,
+                spilled=highlights.spilled,
+                superevents=get_reader_progress(superevent_reader),
+                df_preview=None if (highlights.spilled) else df_preview,
+            )
+            if (job.cancelled):
+                return None
+        if (opportunities['status'] == 'ERROR'):
+            raise Exception('{}: Page could not be read'.format(opportunities['next_url']))
+
+        if (superevent_reader is not None):
+            while (superevent_reader.running):
+                job.set_progress(superevents=get_reader_progress(superevent_reader))
+                if (job.cancelled):
+                    return None
+                superevent_reader.wait(SECONDS_WAIT_SUPEREVENTS)
+            for key,value in superevent_reader.fetch_stats.items():
+                fetch_stats[key] += value
+            job.set_progress(superevents=get_reader_progress(superevent_reader))
+
+        if (len(opportunities['items'].keys()) == 0):
+            return None
+
+        job.set_progress(indexing=True)
+        superevents = get_superevents(superevent_reader)
+        if (highlights.spilled):
+            # The parts are joined and their uniques found one at a time as they're read back
+            uniques_parts = []
+            def transform(df_part):
+                df_part = join_superevents(df_part, superevents)
+                uniques_parts.append(get_uniques(df_part))
+                return get_table(df_part)
+            with profile(profiler, 'combine', num_items=len(opportunities['items'])):
+                df_table = highlights.get_spilled_table(transform)
+                uniques = merge_uniques(uniques_parts)
+        else:
+            with profile(profiler, 'combine', num_items=len(opportunities['items'])):
+                df = join_superevents(concat_highlights(highlights.dfs, opportunities['items'].keys()), superevents)
+                df_table = get_table(df)
+            with profile(profiler, 'uniques', num_items=len(df)):
+                uniques = get_uniques(df)
+        highlights = None
+        with profile(profiler, 'index', num_items=len(df_table)):
+            filter_index = FilterIndex(df_table)
+            facet_index = FacetIndex(filter_index)
+            sort_index = SortIndex(df_table)
+
+        return {
+            'status': opportunities['status'],
+            'opportunities': opportunities,
+            'superevent_opportunities': None if (superevent_reader is None) else superevent_reader.opportunities,
+            'superevents': superevents,
+            'df': df_table,
+            'uniques': uniques,
+            'filter_index': filter_index,
+            'facet_index': facet_index,
+            'sort_index': sort_index,
+        }
+    finally:
+        if (superevent_reader is not None):
+            superevent_reader.stop()
 
 # --------------------------------------------------------------------------------------------------
 
@@ -149,14 +569,45 @@ if ('initialised' not in st.session_state):
     st.session_state.running = False
     st.session_state.got_data = False
     st.session_state.got_filters = False
+    st.session_state.cache_status = None
+    st.session_state.cache_bytes_saved = 0
+    st.session_state.fetch_stats = dict(fetch_stats_template)
+    st.session_state.dataset = None
+    st.session_state.superevent_feed_url = None
+    st.session_state.job = None
+    st.session_state.job_error = None
+    st.session_state.superevent_opportunities = None
+    st.session_state.superevents = None
+    st.session_state.json_rows = set()
+    st.session_state.json_rows_filters_key = None
+    st.session_state.map = None
+    st.session_state.map_filters_key = None
     st.session_state.feeds = None
+    st.session_state.feeds_time_created = None
     st.session_state.providers = None
+    st.session_state.profiler = None
+
+# --------------------------------------------------------------------------------------------------
+
+# Feeds that have been read again in the background are picked up on the next rerun, but not while a
+# feed is being read
+if (    (st.session_state.initialised)
+    and (not st.session_state.running)
+):
+    feeds, time_created = get_catalogue().get_feeds()
+    if (time_created != st.session_state.feeds_time_created):
+        set_feeds(feeds, time_created)
 
 # --------------------------------------------------------------------------------------------------
 
 with st.sidebar:
     st.image('https://openactive.io/brand-assets/openactive-logo-large.png')
     show_info = st.toggle('Info', True)
+    show_profiling = st.toggle(
+        'Profiling',
+        False,
+        help='Records the time taken by each stage of reading and showing a feed, along with the data downloaded and the memory used by the app, and shows these in a panel at the bottom of the page.'
+    )
     st.divider()
     st.selectbox(
         'Data Provider',
@@ -169,13 +620,21 @@ with st.sidebar:
     )
     st.selectbox(
         'Data Type',
-        [feed['url'] for feed in st.session_state.feeds[st.session_state.dataset_url_name[0]]] if st.session_state.dataset_url_name else [],
+        [feed['url'] for feed in st.session_state.feeds.get(st.session_state.dataset_url_name[0], [])] if st.session_state.dataset_url_name else [],
         key='feed_url',
         format_func=lambda x: x.split('/')[-1],
         index=None,
         on_change=clear_outputs,
         disabled=disable_input_controls(st.session_state.dataset_url_name == None),
     )
+    st.toggle(
+        'Join Session Series',
+        True,
+        key='join_superevents',
+        on_change=clear_outputs,
+        disabled=disable_input_controls(get_superevent_feed_url_selected() is None),
+        help='Scheduled Sessions feeds usually come with a partner Session Series feed, which holds the details that are shared by all of the sessions in a series, such as the organiser, name and location. With this on, both feeds are read at the same time, and any of these details that are missing from a session are filled in from its series.',
+    )
     col1, col2 = st.columns([1,4])
     with col1:
         st.button(
@@ -192,6 +651,22 @@ with st.sidebar:
             on_click=clear,
             disabled=(st.session_state.dataset_url_name == None),
         )
+    if (st.session_state.feeds_time_created):
+        st.caption(
+            'Feeds as of {}{}'.format(
+                datetime.fromtimestamp(st.session_state.feeds_time_created).strftime('%Y-%m-%d %H:%M'),
+                ', updating' if (get_catalogue().refreshing) else '',
+            ),
+            help='The list of feeds is kept on disk, so that it is available straight away when the app is restarted. It is read again in the background when it is over an hour old, and the new list is used from the next interaction with the app once this has finished.',
+        )
+
+# Nothing is recorded while profiling is switched off, and records are kept when it is switched off
+# and on again
+if (    (show_profiling)
+    and (st.session_state.profiler is None)
+):
+    st.session_state.profiler = Profiler(PROFILING_LOG_PATH)
+profiler = st.session_state.profiler if (show_profiling) else None
 
 # --------------------------------------------------------------------------------------------------
 
@@ -205,13 +680,13 @@ if show_info:
 
         All code for both [the package](https://github.com/openactive/openactive-python/blob/main/src/openactive/openactive.py) and [this app](https://github.com/openactive/openactive-python-streamlit/blob/main/app.py) is open sourced under the MIT licence, so feel free to make a copy and modify as you like, ensuring that the original licence content is included in anything that you publish. The code has been intentionally kept minimal in order to be digestible, while still providing enough functionality to quickly get past common starting barriers.
 
-        Want an idea for a project? How about taking this app and extending it to read and display a matched pair of feeds together i.e. a Session Series feed with its partner Scheduled Sessions feed. There should be enough information in the package [readme file](https://github.com/openactive/openactive-python/blob/main/README.md) to get you going. See the fully fledged live [OpenActive Visualiser](https://visualiser.openactive.io/) (a JavaScript app) for an idea of how something like this functions in practice.
+        When a Scheduled Sessions feed is chosen, its partner Session Series feed is read at the same time, and the two are joined so that the details of each series, such as the organiser, name and location, are filled in for its sessions. Want an idea for a project? How about taking this app and extending it to join other matched pairs of feeds together e.g. a Facility Use feed with its partner Slots feed. There should be enough information in the package [readme file](https://github.com/openactive/openactive-python/blob/main/README.md) to get you going. See the fully fledged live [OpenActive Visualiser](https://visualiser.openactive.io/) (a JavaScript app) for an idea of how something like this functions in practice.
 
         Note that it is not recommended to deploy this app on the Streamlit Community Cloud, unless the ingested data is heavily truncated. This is because there is often a lot of data in an OpenActive feed, which could rapidly saturate the memory quota of a cloud deployment, especially if you have multiple concurrent users. It is therefore best to keep this tool for download and use on individual machines using their own memory.
 
-        It will take a couple of minutes to initialise the app with the current list of OpenActive feeds. You can open multiple windows or tabs at the same app location that all use the same base process, so they don't all need to be individually initialised. This allows you to read in and observe multiple datasets simultaneously, if needed.
+        It will take a short while to initialise the app with the current list of OpenActive feeds the first time it is run. The list is then kept on disk, so that on later runs the app is ready straight away with the list from last time, which is updated in the background if it is over an hour old. You can open multiple windows or tabs at the same app location that all use the same base process, so they don't all need to be individually initialised. This allows you to read in and observe multiple datasets simultaneously, if needed. Windows or tabs showing the same feed share a single copy of its data in memory, and the sidebar shows how much memory this takes and how many sessions are sharing it.
 
-        To use, simply choose a feed from the sidebar, which is separated into "Data Provider" and "Data Type" fields, and click the "Go" button. Note that the number of pages in a given feed is not known in advance, and so the time required to read all associated pages can vary greatly between one feed and another, from a number of seconds to a number of minutes. If a feed is taking too long to read and you would like to try something else, you can click the "Clear" button at any time to cancel the current task and start again.
+        To use, simply choose a feed from the sidebar, which is separated into "Data Provider" and "Data Type" fields, and click the "Go" button. Note that the number of pages in a given feed is not known in advance, and so the time required to read all associated pages can vary greatly between one feed and another, from a number of seconds to a number of minutes. While a feed is being read, a running count of pages and items is shown in the sidebar, and the map and table show the latest 10,000 items read so far. If a feed is taking too long to read and you would like to try something else, you can click the "Clear" button at any time to cancel the current task and start again.
         '''
     )
 
@@ -219,12 +694,9 @@ if show_info:
 
 if (not st.session_state.initialised):
     with st.sidebar:
-        # Calling get_feeds() automatically includes a spinner
-        st.session_state.feeds = get_feeds()
-        st.session_state.providers = sorted(
-            [(dataset_url,feeds_dataset[0]['publisherName'] or dataset_url) for dataset_url,feeds_dataset in st.session_state.feeds.items()],
-            key=lambda x: x[1].lower()
-        )
+        # Calling get_catalogue() automatically includes a spinner, which is only seen if there are no
+        # feeds on disk from a previous run
+        set_feeds(*get_catalogue().get_feeds())
         st.session_state.initialised = True
         st.rerun()
 
@@ -238,131 +710,187 @@ if (st.session_state.started):
             help='This is the location from which the displayed data is sourced. To obtain all of the data, this page and its chain of "next" pages are all visited in turn, until the final page with no further entries is met.'
         )
         st.markdown(st.session_state.feed_url)
+        if (st.session_state.superevent_feed_url):
+            st.markdown(
+                'Joined with',
+                help='Sessions are joined with their series from this Session Series feed, by their super-event ID.'
+            )
+            st.markdown(st.session_state.superevent_feed_url)
+        if (st.session_state.cache_status):
+            st.markdown(
+                'Cache {}'.format(st.session_state.cache_status),
+                help='Feeds are cached on disk after reading. When a cached feed is read again, only the pages after the last page previously read are downloaded, and the cached items are updated with any changes.'
+            )
+            if (st.session_state.cache_bytes_saved):
+                st.markdown('{:,.1f} MB not downloaded again'.format(st.session_state.cache_bytes_saved / 1024**2))
+        if (    (st.session_state.fetch_stats['num_fetched'])
+            or  (st.session_state.fetch_stats['num_revalidated'])
+        ):
+            st.markdown(
+                get_fetch_stats_text(st.session_state.fetch_stats),
+                help='The data downloaded for this read, which is compressed if the feed server supports it. When a cached feed is read again, the last page read before is only downloaded again if the server says that it has changed, otherwise it counts as unchanged.'
+            )
+        if (st.session_state.dataset is not None):
+            for dataset_stats in get_store().get_stats():
+                if (dataset_stats['feed_url'] == get_dataset_key()):
+                    st.markdown(
+                        '{:,.1f} MB in memory{}, shared by {} {}'.format(
+                            dataset_stats['num_bytes'] / 1024**2,
+                            ' and {:,.1f} MB on disk'.format(dataset_stats['num_bytes_disk'] / 1024**2) if (dataset_stats['num_bytes_disk']) else '',
+                            dataset_stats['num_sessions'],
+                            'session' if (dataset_stats['num_sessions'] == 1) else 'sessions',
+                        ),
+                        help='Feed data is held once in memory for all app sessions, e.g. browser windows or tabs, that are showing the same feed, and is freed when the last of these sessions moves on to something else. A feed that is too big for the memory budget is written to disk as it is read, and its table and JSON are then read from disk as they are shown.'
+                    )
+        if (    (st.session_state.dataset is not None)
+            and (st.session_state.dataset.data['status'] == 'TIMEOUT')
+        ):
+            st.warning('This feed took longer than {:,} minutes to read, so only the items read in that time are shown.'.format(SECONDS_TIMEOUT_DEFAULT // 60))
         if (    (not st.session_state.running)
             and (not st.session_state.got_data)
         ):
-            st.info('No data in this feed')
+            if (st.session_state.job_error):
+                st.error('The feed could not be read: {}'.format(st.session_state.job_error))
+            else:
+                st.info('No data in this feed')
 
 # --------------------------------------------------------------------------------------------------
 
 if (st.session_state.running):
+    st.session_state.dataset = get_store().acquire(get_dataset_key())
+    if (    (st.session_state.dataset is not None)
+        and (st.session_state.job is not None)
+    ):
+        st.session_state.job.release()
+        st.session_state.job = None
+
+if (    (st.session_state.running)
+    and (st.session_state.dataset is None)
+):
     with st.sidebar:
         with st.spinner(''):
-            st.session_state.opportunities = oa.get_opportunities(st.session_state.feed_url)
-            num_items = len(st.session_state.opportunities['items'].keys())
-
-            if (num_items == 0):
-                st.session_state.running = False
-                st.rerun()
-
-            st.session_state.df = pd.DataFrame({
-                'JSON': [False] * num_items,
-                'ID': st.session_state.opportunities['items'].keys(),
-                'Super-event ID': [None] * num_items,
-                'Organizer name': [None] * num_items,
-                'Organizer logo': [None] * num_items,
-                'Name': [None] * num_items,
-                'Location': [None] * num_items,
-                'Lat': [None] * num_items,
-                'Lon': [None] * num_items,
-                'Date/time start': [None] * num_items,
-                'Date/time end': [None] * num_items,
-                'URL': [None] * num_items,
-            })
-
-            for item_idx,item in enumerate(st.session_state.opportunities['items'].values()):
-                if ('data' in item.keys()):
-                    try: st.session_state.df.at[item_idx, 'Super-event ID'] = item['data']['superEvent'].split('/')[-1] # This may be type str or dict, depending on context. We are currently only looking for the str version, and the dict version should be passed over.
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Organizer name'] = item['data']['organizer']['name'].strip()
-                    except:
-                        try: st.session_state.df.at[item_idx, 'Organizer name'] = item['data']['superEvent']['organizer']['name'].strip()
-                        except: pass
-                    try: st.session_state.df.at[item_idx, 'Organizer logo'] = item['data']['organizer']['logo']['url'].strip()
-                    except:
-                        try: st.session_state.df.at[item_idx, 'Organizer logo'] = item['data']['superEvent']['organizer']['logo']['url'].strip()
-                        except: pass
-                    try: st.session_state.df.at[item_idx, 'Name'] = item['data']['name'].strip()
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Location'] = set_location(item['data']['location'])
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Lat'] = float(item['data']['location']['geo']['latitude'])
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Lon'] = float(item['data']['location']['geo']['longitude'])
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Date/time start'] = set_datetime(item['data']['startDate'].strip())
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'Date/time end'] = set_datetime(item['data']['endDate'].strip())
-                    except: pass
-                    try: st.session_state.df.at[item_idx, 'URL'] = item['data']['url'].strip()
-                    except: pass
-
-            st.session_state.df.index = range(1, num_items+1)
-
-            st.session_state.unique_ids = get_unique(st.session_state.df['ID'])
-            st.session_state.unique_superevent_ids = get_unique(st.session_state.df['Super-event ID'])
-            st.session_state.unique_organizer_names = get_unique(st.session_state.df['Organizer name'])
-            st.session_state.unique_organizer_names_logos = get_unique(zip(st.session_state.df['Organizer name'], st.session_state.df['Organizer logo']))
-            st.session_state.unique_names = get_unique(st.session_state.df['Name'])
-            st.session_state.unique_locations = get_unique(st.session_state.df['Location'])
-            st.session_state.unique_dates = get_unique(pd.concat([
-                (st.session_state.df['Date/time start'].loc[st.session_state.df['Date/time start'].notnull()]).apply(datetime.date),
-                (st.session_state.df['Date/time end'].loc[st.session_state.df['Date/time end'].notnull()]).apply(datetime.date)
-            ]))
-            st.session_state.unique_dates_range = (
-                st.session_state.unique_dates[0],
-                st.session_state.unique_dates[-1]
-            ) if st.session_state.unique_dates else ()
-
-            st.session_state.df.rename(columns={'Organizer name': 'Organiser'}, inplace=True) # Note British English for display
-            del(st.session_state.df['Organizer logo'])
-
-            st.session_state.disabled_columns = ['_index'] + list(st.session_state.df.columns) # Index column editing is disabled by default, but for some reason becomes enabled when a filter selection is made, so we explicitly add it to the disabled list here to ensure against this
-            st.session_state.disabled_columns.remove('JSON')
-
-            st.session_state.running = False
-            st.session_state.got_data = True
-            st.rerun()
+            container_progress = st.empty()
+    container_preview = st.empty()
+
+    # The feed is read by a background job (see read_feed()), which this session attaches to, along with
+    # any other sessions reading the same feed, and then checks on every SECONDS_POLL_JOB seconds to show
+    # its progress and its latest preview. Any widget interaction interrupts the script at the next
+    # Streamlit call, but the job carries on, and the session attaches to it again on the rerun. Clicking
+    # "Clear" detaches the session, and the job is cancelled between pages if no other session is
+    # attached to it.
+    if (st.session_state.job is None):
+        st.session_state.job = get_job_manager().attach(
+            get_dataset_key(),
+            read_feed,
+            st.session_state.feed_url,
+            st.session_state.superevent_feed_url,
+            profiler,
+        )
+    job = st.session_state.job.job
+    df_preview = None
+    spilled_shown = False
+    while (True):
+        finished = job.wait(SECONDS_POLL_JOB)
+        progress = job.get_progress()
+        container_progress.markdown(get_progress_text(job.status, progress))
+        if (    (progress.get('spilled'))
+            and (not spilled_shown)
+        ):
+            container_preview.info('This feed is too big to hold in memory, so it\'s being written to disk as it\'s read. The table and map will be shown when the read is finished.')
+            spilled_shown = True
+        elif (  (progress.get('df_preview') is not None)
+            and (progress['df_preview'] is not df_preview)
+        ):
+            df_preview = progress['df_preview']
+            with profile(profiler, 'render preview', num_items=len(df_preview)):
+                with container_preview.container():
+                    map_preview = get_map(df_preview)
+                    if (map_preview is not None):
+                        show_map(*map_preview)
+                    st.subheader('Highlights')
+                    st.markdown('Latest {:,} of {:,} rows so far'.format(len(df_preview), progress.get('num_items', len(df_preview))))
+                    st.dataframe(df_preview, use_container_width=True)
+        if (finished):
+            break
+
+    st.session_state.cache_status = progress.get('cache_status')
+    st.session_state.cache_bytes_saved = progress.get('cache_bytes_saved', 0)
+    st.session_state.fetch_stats = dict(progress.get('fetch_stats', fetch_stats_template))
+    if (job.result is None):
+        st.session_state.job_error = None if (job.error is None) else str(job.error)
+        st.session_state.job.release()
+        st.session_state.job = None
+        st.session_state.running = False
+        st.rerun()
+
+    st.session_state.dataset = get_store().publish(get_dataset_key(), job.result)
+    st.session_state.job.release()
+    st.session_state.job = None
+
+if (st.session_state.running):
+    st.session_state.opportunities = st.session_state.dataset.data['opportunities']
+    st.session_state.superevent_opportunities = st.session_state.dataset.data['superevent_opportunities']
+    st.session_state.superevents = st.session_state.dataset.data['superevents']
+    st.session_state.df = st.session_state.dataset.data['df']
+    st.session_state.filter_index = st.session_state.dataset.data['filter_index']
+    st.session_state.facet_index = st.session_state.dataset.data['facet_index']
+    st.session_state.sort_index = st.session_state.dataset.data['sort_index']
+    for key,value in st.session_state.dataset.data['uniques'].items():
+        st.session_state[key] = value
+
+    st.session_state.disabled_columns = ['_index'] + list(st.session_state.df.columns) # Index column editing is disabled by default, but for some reason becomes enabled when a filter selection is made, so we explicitly add it to the disabled list here to ensure against this
+
+    st.session_state.running = False
+    st.session_state.got_data = True
+    st.rerun()
 
 # --------------------------------------------------------------------------------------------------
 
 if (st.session_state.got_data):
+    # The filters are applied before their widgets are drawn, as for adaptive filters the options of each
+    # widget depend on the others. Widget values are already in the session state at the start of the
+    # script, or aren't there yet on the first run after loading a feed.
+    filters = {
+        'ID': st.session_state.get('filtered_ids', []),
+        'Super-event ID': st.session_state.get('filtered_superevent_ids', []),
+        'Organiser': st.session_state.get('filtered_organizers', []),
+        'Name': st.session_state.get('filtered_names', []),
+        'Location': st.session_state.get('filtered_locations', []),
+    }
+    filtered_text = st.session_state.get('filtered_text', '')
+    filtered_dates_range = st.session_state.get('filtered_dates_range', st.session_state.unique_dates_range)
+    filters_key = repr((st.session_state.feed_url, filtered_text, filters, filtered_dates_range))
+    with profile(profiler, 'filter') as profile_fields:
+        masks = st.session_state.filter_index.get_masks(
+            filters,
+            filtered_dates_range,
+            st.session_state.facet_index.get_rows_text(filtered_text),
+        )
+        positions = st.session_state.filter_index.get_positions_masks(masks)
+        df_filtered = st.session_state.df if (positions is None) else st.session_state.df.take(positions)
+        profile_fields['num_items'] = len(df_filtered)
+    facet_counts = {}
+    if (st.session_state.get('adaptive_filters', False)):
+        with profile(profiler, 'adaptive filters', num_items=len(df_filtered)):
+            facet_counts = st.session_state.facet_index.get_counts_adaptive(masks)
+
     with st.sidebar:
         st.divider()
         st.markdown(
             'Filters',
-            help='This is intentionally not an adaptive filter system, so choosing one option from one filter will not restrict the other options in other filters, all options will remain with respect to the full dataset. If this wasn\'t so, then filter selection couldn\'t be easily adjusted after the initial selection.'
-        )
-        st.multiselect(
-            'ID',
-            st.session_state.unique_ids,
-            key='filtered_ids',
-            disabled=(len(st.session_state.unique_ids) == 0),
-        )
-        st.multiselect(
-            'Super-event ID',
-            st.session_state.unique_superevent_ids,
-            key='filtered_superevent_ids',
-            disabled=(len(st.session_state.unique_superevent_ids) == 0),
+            help='By default, choosing one option from one filter will not restrict the other options in other filters, all options will remain with respect to the full dataset, so that filter selection can be easily adjusted after the initial selection. The numbers next to the options are then their numbers of items in the whole dataset. With "Adaptive filters" on, each filter only offers the options that are found with all of the other filters and the search applied, and the numbers are the numbers of items that would be shown by adding each option.'
         )
-        st.multiselect(
-            'Organiser', # Note British English for display
-            st.session_state.unique_organizer_names,
-            key='filtered_organizers',
-            disabled=(len(st.session_state.unique_organizer_names) == 0),
-        )
-        st.multiselect(
-            'Name',
-            st.session_state.unique_names,
-            key='filtered_names',
-            disabled=(len(st.session_state.unique_names) == 0),
-        )
-        st.multiselect(
-            'Location',
-            st.session_state.unique_locations,
-            key='filtered_locations',
-            disabled=(len(st.session_state.unique_locations) == 0),
+        st.toggle('Adaptive filters', key='adaptive_filters')
+        st.text_input(
+            'Search',
+            key='filtered_text',
+            help='Shows only the items with every word of the search in their organiser, name or location, matching the starts of words, e.g. "swim" matches "Swimming". The options in the filters below are narrowed to those that match the search too, and for the IDs these are the IDs that start with the search.',
         )
+        show_facet_filter('ID', 'ID', 'filtered_ids', facet_counts.get('ID'))
+        show_facet_filter('Super-event ID', 'Super-event ID', 'filtered_superevent_ids', facet_counts.get('Super-event ID'))
+        show_facet_filter('Organiser', 'Organiser', 'filtered_organizers', facet_counts.get('Organiser')) # Note British English for display
+        show_facet_filter('Name', 'Name', 'filtered_names', facet_counts.get('Name'))
+        show_facet_filter('Location', 'Location', 'filtered_locations', facet_counts.get('Location'))
         st.date_input(
             'Date',
             value=st.session_state.unique_dates_range,
@@ -379,24 +907,16 @@ if (st.session_state.got_data):
         )
         st.session_state.got_filters = True
 
-    df_filtered = st.session_state.df
-    if (st.session_state.filtered_ids):
-        df_filtered = df_filtered.loc[df_filtered['ID'].isin(st.session_state.filtered_ids)]
-    if (st.session_state.filtered_superevent_ids):
-        df_filtered = df_filtered.loc[df_filtered['Super-event ID'].isin(st.session_state.filtered_superevent_ids)]
-    if (st.session_state.filtered_organizers):
-        df_filtered = df_filtered.loc[df_filtered['Organiser'].isin(st.session_state.filtered_organizers)]
-    if (st.session_state.filtered_names):
-        df_filtered = df_filtered.loc[df_filtered['Name'].isin(st.session_state.filtered_names)]
-    if (st.session_state.filtered_locations):
-        df_filtered = df_filtered.loc[df_filtered['Location'].isin(st.session_state.filtered_locations)]
-    if (st.session_state.filtered_dates_range):
-        df_filtered = df_filtered.loc[
-                (df_filtered['Date/time start'].apply(datetime.date) >= st.session_state.filtered_dates_range[0])
-            &   (df_filtered['Date/time end'].apply(datetime.date) <= st.session_state.filtered_dates_range[len(st.session_state.filtered_dates_range)-1])
-        ]
-    if (len(df_filtered)>0):
-        df_filtered.at[df_filtered.index[0], 'JSON'] = True
+    paginate = (len(df_filtered) > ROWS_PAGINATE)
+    table_key = None
+
+    # The DataFrame is shared with other sessions, so the JSON column is added to a shallow copy that
+    # belongs to this session only
+    if (not paginate):
+        df_table = df_filtered.copy(deep=False)
+        df_table.insert(0, 'JSON', False)
+        if (len(df_table)>0):
+            df_table.at[df_table.index[0], 'JSON'] = True
 
     if (    (len(st.session_state.unique_organizer_names_logos) == 1)
         and (st.session_state.unique_organizer_names_logos[0][1])
@@ -408,97 +928,132 @@ if (st.session_state.got_data):
 
     st.subheader(
         'Highlights',
-        help='This table shows a number of "highlight" fields from the full JSON data for each feed item. Some feeds will have no entries at all for certain table fields, but for consistency the table fields remain fixed for all feeds. Many feeds actually come in pairs, one for super-event data (e.g. Session Series) and one for sub-event data (e.g. Scheduled Sessions), and getting a full picture requires a read of both, as each feed will specialise in different table fields. This app does not allow for two feeds to be read simultaneously in one app session, but you can open another browser window or tab to run a parallel app session to read another feed if needed.'
+        help='This table shows a number of "highlight" fields from the full JSON data for each feed item. Some feeds will have no entries at all for certain table fields, but for consistency the table fields remain fixed for all feeds. Many feeds actually come in pairs, one for super-event data (e.g. Session Series) and one for sub-event data (e.g. Scheduled Sessions), and getting a full picture requires a read of both, as each feed will specialise in different table fields. When a Scheduled Sessions feed is read with "Join Session Series" on, its partner Session Series feed is read too, and fields that are missing from each session are filled in from its series. For other pairs of feeds, you can open another browser window or tab to run a parallel app session to read the other feed if needed.'
     )
     st.markdown('{} rows'.format(len(df_filtered)))
-    df_edited = st.data_editor(
-        df_filtered,
-        use_container_width=True,
-        disabled=st.session_state.disabled_columns,
-        column_config={
-            '_index': st.column_config.NumberColumn(label='Row'),
-            'JSON': st.column_config.CheckboxColumn(),
-            'Lat': st.column_config.NumberColumn(format='%.5f'), # 5 decimal places gives accuracy at the metre level
-            'Lon': st.column_config.NumberColumn(format='%.5f'), # 5 decimal places gives accuracy at the metre level
-            'Date/time start': st.column_config.DatetimeColumn(format='YYYY-MM-DD HH:mm'),
-            'Date/time end': st.column_config.DatetimeColumn(format='YYYY-MM-DD HH:mm'),
-            'URL': st.column_config.LinkColumn(),
-        },
-    )
 
-    if (any(df_edited['JSON'])):
+    # Large tables are sorted and paged here rather than in the browser, and only the current page is
+    # sent. The JSON column selection is kept in the session state by row number, so that it carries
+    # across pages, and is reset to the first row whenever the filters change.
+    if (paginate):
+        if (st.session_state.json_rows_filters_key != filters_key):
+            st.session_state.json_rows = {df_filtered.index[0]}
+            st.session_state.json_rows_filters_key = filters_key
+
+        col1, col2, col3, col4 = st.columns([3,2,2,2])
+        with col1:
+            st.selectbox('Sort by', ['Row'] + list(st.session_state.df.columns), key='table_sort_column')
+        with col2:
+            st.selectbox('Order', ['Ascending', 'Descending'], key='table_sort_order')
+        with col3:
+            st.selectbox('Rows per page', PAGE_SIZES, index=1, key='table_page_size')
+        num_pages = get_num_pages(len(df_filtered), st.session_state.table_page_size)
+        if (st.session_state.get('table_page', 1) > num_pages):
+            st.session_state.table_page = num_pages
+        with col4:
+            st.number_input('Page (of {:,})'.format(num_pages), min_value=1, max_value=num_pages, step=1, key='table_page')
+
+        positions_sorted = np.arange(len(st.session_state.df)) if (positions is None) else positions
+        if (st.session_state.table_sort_column != 'Row'):
+            positions_sorted = st.session_state.sort_index.get_positions(
+                positions_sorted,
+                st.session_state.table_sort_column,
+                st.session_state.table_sort_order == 'Ascending',
+            )
+        elif (st.session_state.table_sort_order == 'Descending'):
+            positions_sorted = positions_sorted[::-1]
+        idx_start = (st.session_state.table_page - 1) * st.session_state.table_page_size
+        df_table = st.session_state.df.take(positions_sorted[idx_start:idx_start+st.session_state.table_page_size]).copy(deep=False)
+        df_table.insert(0, 'JSON', df_table.index.isin(st.session_state.json_rows))
+
+        # A new table widget for each page, so that checkbox edits on one page aren't applied to another
+        table_key = 'table_{}'.format(hash((
+            filters_key,
+            st.session_state.table_sort_column,
+            st.session_state.table_sort_order,
+            st.session_state.table_page_size,
+            st.session_state.table_page,
+        )))
+
+    with profile(profiler, 'render table', num_items=len(df_table)):
+        df_edited = st.data_editor(
+            df_table,
+            key=table_key,
+            use_container_width=True,
+            disabled=st.session_state.disabled_columns,
+            column_config={
+                '_index': st.column_config.NumberColumn(label='Row'),
+                'JSON': st.column_config.CheckboxColumn(),
+                'Lat': st.column_config.NumberColumn(format='%.5f'), # 5 decimal places gives accuracy at the metre level
+                'Lon': st.column_config.NumberColumn(format='%.5f'), # 5 decimal places gives accuracy at the metre level
+                'Date/time start': st.column_config.DatetimeColumn(format='YYYY-MM-DD HH:mm'),
+                'Date/time end': st.column_config.DatetimeColumn(format='YYYY-MM-DD HH:mm'),
+                'URL': st.column_config.LinkColumn(),
+            },
+        )
+
+    if (paginate):
+        st.session_state.json_rows.difference_update(df_edited.index[~df_edited['JSON']])
+        st.session_state.json_rows.update(df_edited.index[df_edited['JSON']])
+        selected_idxs = sorted(st.session_state.json_rows)
+    else:
+        selected_idxs = list(df_edited.index[df_edited['JSON']])
+
+    if (selected_idxs):
         st.subheader(
             'JSON',
             help='These tabs correspond to the table rows which are selected in the "JSON" column, and they are labelled by table row number. They contain the full JSON data for their associated feed items, only a subset of which is seen in the table.'
         )
-        selected_idxs = list(df_edited.index[df_edited['JSON']])
-        selected_ids = list(df_edited['ID'][df_edited['JSON']])
-        for tab_idx,tab in enumerate(st.tabs([str(x) for x in selected_idxs])):
-            with tab:
-                st.json(st.session_state.opportunities['items'][selected_ids[tab_idx]])
-
-    # We use [Lon,Lat] rather than [Lat,Lon] in all of the following map code, as this is the required
-    # order for PyDeck, so just standardised in all cases of seeing these quantities
-    map_data = df_edited.loc[
-            df_edited['Lon'].notna()
-        &   df_edited['Lat'].notna(),
-        ['Lon', 'Lat', 'Location']
-    ]
+        # Rows are labelled from 1, so the row label less 1 is the row position
+        df_selected = st.session_state.df.take(np.array(selected_idxs) - 1)[['ID', 'Super-event ID']]
+        with profile(profiler, 'render JSON', num_items=len(df_selected)):
+            for tab_idx,tab in enumerate(st.tabs([str(x) for x in selected_idxs])):
+                with tab:
+                    st.json(st.session_state.opportunities['items'][df_selected['ID'].iat[tab_idx]])
+                    superevent_item = get_superevent_item(df_selected['Super-event ID'].iat[tab_idx])
+                    if (superevent_item is not None):
+                        st.markdown('Super-event')
+                        st.json(superevent_item)
+
+    with profile(profiler, 'render map', num_items=len(df_filtered)):
+        map_filtered = get_map_cached(df_filtered, filters_key)
+
+        if (map_filtered is not None):
+            with container_map:
+                show_map(*map_filtered)
+                st.divider()
 
-    if (len(map_data) != 0):
-        with container_map:
-            st.subheader(
-                'Geo',
-                help='This map shows locations with coordinate data. Zoom in and out with your mouse scroll function, and hover over the pins to show pop-up boxes of the location names and addresses. Note that the initial zoom may not capture all pins that are actually present, so it\'s worth zooming out a bit to check for others that aren\'t initially seen.'
+# --------------------------------------------------------------------------------------------------
+
+if (profiler is not None):
+    st.divider()
+    with st.expander('Profiling', expanded=True):
+        records = profiler.get_records()
+        st.markdown('{:,.1f} MB in memory for the whole app process, {:,.1f} MB downloaded, {:,} records'.format(
+            get_rss_bytes() / 1024**2,
+            sum([record.get('num_bytes', 0) for record in records if (record['stage'] == 'fetch')]) / 1024**2,
+            len(records),
+        ))
+        summary = profiler.get_summary()
+        if (summary is not None):
+            st.dataframe(
+                summary,
+                use_container_width=True,
+                column_config={
+                    'Total (s)': st.column_config.NumberColumn(format='%.3f'),
+                    'Mean (ms)': st.column_config.NumberColumn(format='%.1f'),
+                    'Max (ms)': st.column_config.NumberColumn(format='%.1f'),
+                    'MB': st.column_config.NumberColumn(format='%.2f'),
+                },
+            )
+        col1, col2 = st.columns([1,4])
+        with col1:
+            st.download_button(
+                'Export',
+                profiler.get_jsonl(),
+                file_name='profiling.jsonl',
+                mime='application/jsonl',
+                help='Downloads all of the records as JSON lines, one record per stage per call, with the time, the stage, the seconds taken, the memory used by the app process in bytes, and any other fields for the stage, such as the URL, bytes downloaded or number of items.',
             )
-            st.pydeck_chart(pdk.Deck(
-                map_style='road',
-                # This computed view doesn't create a fully encompassing bounding box for some reason, may need to
-                # work something out manually
-                initial_view_state=pdk.data_utils.viewport_helpers.compute_view(
-                    map_data[['Lon', 'Lat']],
-                ),
-                # initial_view_state=pdk.ViewState(
-                #     longitude=-3.0,
-                #     latitude=54.5,
-                #     zoom=4.4,
-                #     pitch=30,
-                # ),
-                layers=[
-                    pdk.Layer(
-                        'ScatterplotLayer',
-                        map_data,
-                        get_position=['Lon', 'Lat'],
-                        pickable=True,
-                        filled=True,
-                        stroked=True,
-                        radius_min_pixels=10,
-                        radius_max_pixels=10,
-                        line_width_min_pixels=1,
-                        line_width_max_pixels=1,
-                        get_fill_color=[0, 158, 277],
-                        get_line_color=[3, 102, 175],
-                        opacity=0.5,
-                        elevation_scale=4,
-                        elevation_range=[0, 1000],
-                    ),
-                ],
-                tooltip={
-                    'text': '{Location}',
-                }
-            ))
-            # The dedicated map widget is just a simplified convenience wrapper around PyDeck, and doesn't have
-            # tooltip functionality for e.g. showing location info over individual pins, hence not using this approach
-            # st.map(
-            #     df_edited.loc[
-            #             df_edited['Lon'].notna()
-            #         &   df_edited['Lat'].notna(),
-            #         ['Lon', 'Lat']
-            #     ],
-            #     use_container_width=True,
-            #     longitude='Lon',
-            #     latitude='Lat',
-            #     size=200,
-            #     color='#009ee3',
-            # )
-            st.divider()
\ No newline at end of file
+        with col2:
+            st.button('Clear', key='button_clear_profiling', on_click=profiler.clear)
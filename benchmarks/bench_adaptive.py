@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_filters import get_filtered_legacy, get_filters
+from extract import get_highlights
+from facets import FacetIndex
+from filters import COLUMNS, FilterIndex
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# Counts for adaptive filters found in the straightforward way, by filtering the DataFrame with all of
+# the filters but each column's own, and counting the distinct values that are left
+def get_counts_legacy(df, filters, dates_range):
+    counts = {}
+    for column in COLUMNS:
+        filters_other = {key: values for key,values in filters.items() if (key != column)}
+        counts[column] = get_filtered_legacy(df, filters_other, dates_range)[column].value_counts(sort=False)
+    return counts
+
+# --------------------------------------------------------------------------------------------------
+
+def check_equal(counts_legacy, counts, facet_index):
+    for column in COLUMNS:
+        values = facet_index.facets[column]['values']
+        counts_column = {value: count for value,count in zip(values, counts[column]) if (count > 0)}
+        counts_legacy_column = {value: count for value,count in counts_legacy[column].items() if (count > 0)}
+        if (counts_column != counts_legacy_column):
+            raise Exception(f'Count mismatch: {column}')
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time to recompute the options and counts of adaptive filters per interaction, compared with counting values in filtered DataFrames')
+    parser.add_argument('--items', type=int, default=500000)
+    parser.add_argument('--superevents', type=int, default=20000)
+    parser.add_argument('--locations', type=int, default=5000)
+    parser.add_argument('--interactions', type=int, default=20)
+    args = parser.parse_args()
+
+    df = get_highlights(get_items(args.items, num_locations=args.locations, num_superevents=args.superevents)).drop(columns=['Organizer logo']).rename(columns={'Organizer name': 'Organiser'})
+    uniques = {column: sorted(set(df[column].dropna())) for column in COLUMNS}
+    filter_index = FilterIndex(df)
+    facet_index = FacetIndex(filter_index)
+
+    rng = random.Random(0)
+    seconds_legacy = []
+    seconds = []
+    for interaction_idx in range(args.interactions):
+        filters, dates_range = get_filters(df, uniques, rng)
+
+        time_start = perf_counter()
+        counts_legacy = get_counts_legacy(df, filters, dates_range)
+        seconds_legacy.append(perf_counter() - time_start)
+
+        time_start = perf_counter()
+        counts = facet_index.get_counts_adaptive(filter_index.get_masks(filters, dates_range))
+        for column in COLUMNS:
+            options = facet_index.get_options(column, selected=filters[column], counts=counts[column])
+            facet_index.get_labels(column, options, counts[column])
+        seconds.append(perf_counter() - time_start)
+
+        check_equal(counts_legacy, counts, facet_index)
+
+    print(f'{len(df):,} rows, {args.interactions} interactions, options and counts recomputed for {len(COLUMNS)} filters per interaction')
+    print(f"{'':>10} {'mean ms':>9} {'max ms':>9}")
+    for name,seconds_name in [('legacy', seconds_legacy), ('bitmaps', seconds)]:
+        print(f'{name:>10} {sum(seconds_name) / len(seconds_name) * 1000:>9.1f} {max(seconds_name) * 1000:>9.1f}')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from profiling import get_rss_bytes
+from server import FeedServer
+from synthetic import get_items, get_superevents
+
+# --------------------------------------------------------------------------------------------------
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+SECONDS_TIMEOUT = 1800
+SECONDS_SAMPLE_MEMORY = 0.05
+
+# --------------------------------------------------------------------------------------------------
+
+# Runs the feed server in its own process, so that generating and serving the feeds doesn't compete
+# with the app for the CPU or count towards its memory. The collection URL is sent back once the server
+# is ready, and the server runs until the stop event is set.
+def serve(args, collection_urls, stopped):
+    feeds = {'scheduled-sessions': list(get_items(args['items'], num_locations=args['locations'], num_superevents=args['superevents'], paired=args['paired']).values())}
+    if (args['paired']):
+        feeds['session-series'] = list(get_superevents(args['superevents'], num_locations=args['locations']).values())
+
+    with FeedServer(num_catalogues=1, num_datasets=1, feeds=feeds, items_per_page=args['items_per_page'], seconds_latency=args['latency']) as feed_server:
+        collection_urls.put(feed_server.collection_url)
+        stopped.wait()
+
+# --------------------------------------------------------------------------------------------------
+
+# Samples the resident memory of this process in a background thread, to find the peak over a period
+class MemorySampler():
+    def __init__(self):
+        self.num_bytes_start = get_rss_bytes()
+        self.num_bytes_peak = self.num_bytes_start
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while (not self.stopped.wait(SECONDS_SAMPLE_MEMORY)):
+            self.num_bytes_peak = max(self.num_bytes_peak, get_rss_bytes())
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.num_bytes_peak = max(self.num_bytes_peak, get_rss_bytes())
+        return self.num_bytes_peak - self.num_bytes_start
+
+# --------------------------------------------------------------------------------------------------
+
+# The app waits between pages so as not to overload real feed servers, which would dominate the time
+# taken to read a local feed, so the wait is replaced here
+def set_seconds_wait_next(seconds_wait_next):
+    import ingest
+    import join
+
+    get_opportunities_pages = ingest.get_opportunities_pages
+    def get_opportunities_pages_patched(arg, **kwargs):
+        return get_opportunities_pages(arg, **{**kwargs, 'seconds_wait_next': seconds_wait_next})
+    ingest.get_opportunities_pages = get_opportunities_pages_patched
+    join.get_opportunities_pages = get_opportunities_pages_patched
+
+# --------------------------------------------------------------------------------------------------
+
+def run_timed(at, latencies, name):
+    time_start = perf_counter()
+    at.run()
+    latencies[name] = (perf_counter() - time_start) * 1000
+    if (at.exception):
+        raise Exception(f'{name}: {at.exception[0].value}')
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads the feed in the app, as a user would by choosing it in the sidebar and clicking "Go", and then
+# goes through a series of filter and table interactions, timing each rerun of the app script
+def run_app(feeds, feed_url):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=SECONDS_TIMEOUT)
+    at.run()
+    dataset_url = list(feeds.keys())[0]
+    at.sidebar.selectbox(key='dataset_url_name').set_value((dataset_url, feeds[dataset_url][0]['publisherName'])).run()
+    at.sidebar.selectbox(key='feed_url').set_value(feed_url).run()
+
+    latencies = {}
+    sampler = MemorySampler()
+    at.sidebar.button(key='button_go').click()
+    run_timed(at, latencies, 'load')
+    num_bytes_peak = sampler.stop()
+    num_items = len(at.session_state.df)
+
+    at.sidebar.multiselect(key='filtered_organizers').set_value(at.session_state.facet_index.get_options('Organiser', top_n=1))
+    run_timed(at, latencies, 'filter organiser')
+    at.sidebar.multiselect(key='filtered_locations').set_value(at.session_state.facet_index.get_options('Location', top_n=3))
+    run_timed(at, latencies, 'filter location')
+    date_start = at.session_state.unique_dates_range[0]
+    at.sidebar.date_input(key='filtered_dates_range').set_value((date_start, date_start + timedelta(days=7)))
+    run_timed(at, latencies, 'filter dates')
+    at.sidebar.text_input(key='filtered_text').set_value('swim')
+    run_timed(at, latencies, 'search')
+    at.sidebar.button(key='button_clear_filters').click()
+    run_timed(at, latencies, 'clear filters')
+    if ('table_page' in at.session_state):
+        at.selectbox(key='table_sort_column').set_value('Name')
+        run_timed(at, latencies, 'sort table')
+        at.number_input(key='table_page').set_value(2)
+        run_timed(at, latencies, 'next page')
+    run_timed(at, latencies, 'rerun')
+
+    return num_items, num_bytes_peak, latencies
+
+# --------------------------------------------------------------------------------------------------
+
+def get_violations(results, thresholds):
+    violations = []
+    if (results['items_per_second'] < thresholds.get('items_per_second_min', 0)):
+        violations.append('items/s {:,.0f} below {:,.0f}'.format(results['items_per_second'], thresholds['items_per_second_min']))
+    if (results['peak_mb'] > thresholds.get('peak_mb_max', float('inf'))):
+        violations.append('peak memory {:,.1f} MB above {:,.1f} MB'.format(results['peak_mb'], thresholds['peak_mb_max']))
+    for name,latency_ms in results['latencies_ms'].items():
+        if (name == 'load'):
+            continue
+        latency_ms_max = thresholds.get('latencies_ms_max', {}).get(name, thresholds.get('latency_ms_max', float('inf')))
+        if (latency_ms > latency_ms_max):
+            violations.append('{} latency {:,.0f} ms above {:,.0f} ms'.format(name, latency_ms, latency_ms_max))
+    return violations
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Read a synthetic feed from a local server in the app, run headlessly, and measure throughput, memory and interaction latency')
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--items-per-page', type=int, default=500)
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--superevents', type=int, default=5000)
+    parser.add_argument('--paired', action='store_true', help='Leave the series details out of the sessions, and serve a partner Session Series feed to join them from')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every response')
+    parser.add_argument('--wait-next', type=float, default=0, help='Seconds waited by the app between pages')
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH, help='JSON file of limits to check the results against')
+    parser.add_argument('--check', action='store_true', help='Exit with an error if any limit is broken')
+    parser.add_argument('--output', default=None, help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    collection_urls = context.Queue()
+    stopped = context.Event()
+    server_process = context.Process(target=serve, args=(vars(args), collection_urls, stopped), daemon=True)
+    server_process.start()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ['OPENACTIVE_CACHE_PATH'] = os.path.join(cache_dir, 'feeds.sqlite')
+        try:
+            collection_url = collection_urls.get(timeout=SECONDS_TIMEOUT)
+            os.environ['OPENACTIVE_COLLECTION_URL'] = collection_url
+
+            import harvest
+            feeds = harvest.get_feeds(collection_url)
+            set_seconds_wait_next(args.wait_next)
+
+            feed_url = [feed['url'] for feeds_dataset in feeds.values() for feed in feeds_dataset if (feed['url'].endswith('scheduled-sessions'))][0]
+            num_items, num_bytes_peak, latencies = run_app(feeds, feed_url)
+        finally:
+            stopped.set()
+            server_process.join()
+
+    results = {
+        'items': num_items,
+        'items_per_second': num_items / (latencies['load'] / 1000),
+        'peak_mb': num_bytes_peak / 1024**2,
+        'latencies_ms': latencies,
+    }
+
+    print(f"{num_items:,} items loaded in {latencies['load'] / 1000:.2f} s, {results['items_per_second']:,.0f} items/s, peak memory +{results['peak_mb']:,.1f} MB")
+    print(f"{'interaction':>18} {'ms':>9}")
+    for name,latency_ms in latencies.items():
+        print(f'{name:>18} {latency_ms:>9.1f}')
+
+    if (args.output):
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    with open(args.thresholds) as f:
+        violations = get_violations(results, json.load(f))
+    for violation in violations:
+        print(f'Threshold broken: {violation}')
+    if (    (violations)
+        and (args.check)
+    ):
+        sys.exit(1)
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import pandas as pd
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from export import export_feeds, get_feed_highlights
+from profiling import get_rss_bytes
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# Saves a feed as RPDE pages, followed by pages that update some of the items again with a later
+# modified value and delete others, so that the export has to supersede rows in parts already written
+def save_pages(pages_dir, items, items_per_page, fraction_changed, seed):
+    rng = random.Random(seed)
+    items = list(items.values())
+    modified = len(items)
+    changes = []
+    for item in rng.sample(items, int(len(items) * fraction_changed)):
+        modified += 1
+        if (rng.random() < 0.5):
+            changes.append({**item, 'modified': modified, 'data': {**item['data'], 'name': item['data']['name'] + ' (updated)'}})
+        else:
+            changes.append({'id': item['id'], 'kind': item['kind'], 'state': 'deleted', 'modified': modified})
+
+    os.makedirs(pages_dir)
+    items_all = items + changes
+    for page_idx,item_idx in enumerate(range(0, len(items_all), items_per_page)):
+        with open(os.path.join(pages_dir, f'page-{page_idx}.json'), 'w') as f:
+            json.dump({'items': items_all[item_idx:item_idx + items_per_page], 'next': f'page-{page_idx + 1}'}, f)
+
+# --------------------------------------------------------------------------------------------------
+
+def check_equal(df_expected, df):
+    df_expected = df_expected.assign(ID=df_expected['ID'].astype(str)).sort_values('ID', ignore_index=True)
+    df = df.sort_values('ID', ignore_index=True)
+    if (len(df_expected) != len(df)):
+        raise Exception(f'Row count mismatch: {len(df_expected)} expected, {len(df)} exported')
+    for column in df_expected.columns:
+        values_expected = [None if pd.isna(x) else x for x in df_expected[column]]
+        values = [None if pd.isna(x) else x for x in df[column]]
+        if (values_expected != values):
+            raise Exception(f'Column mismatch: {column}')
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the export of directories of saved feed pages to partitioned Parquet, and check the output')
+    parser.add_argument('--items', type=int, default=50000, help='Items per feed')
+    parser.add_argument('--feeds', type=int, default=4)
+    parser.add_argument('--items-per-page', type=int, default=500)
+    parser.add_argument('--rows-per-part', type=int, default=20000)
+    parser.add_argument('--changed', type=float, default=0.1, help='Fraction of items updated again or deleted in later pages')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pages_dir = os.path.join(temp_dir, 'pages')
+        for feed_idx in range(args.feeds):
+            save_pages(os.path.join(pages_dir, f'feed-{feed_idx}'), get_items(args.items, seed=feed_idx), args.items_per_page, args.changed, feed_idx)
+
+        time_start = perf_counter()
+        df_expected = get_feed_highlights(os.path.join(pages_dir, 'feed-0'))
+        seconds_expected = perf_counter() - time_start
+        print(f'In memory, one feed: {args.items / seconds_expected:,.0f} items/s')
+
+        print(f"{'workers':>8} {'rows':>9} {'parts':>6} {'seconds':>8} {'items/s':>9} {'MB':>7}")
+        for num_workers in args.workers:
+            output_dir = os.path.join(temp_dir, f'output-{num_workers}')
+            num_bytes_start = get_rss_bytes()
+            time_start = perf_counter()
+            summaries = export_feeds([pages_dir], output_dir, rows_part=args.rows_per_part, max_workers=num_workers)
+            seconds = perf_counter() - time_start
+            num_bytes = get_rss_bytes() - num_bytes_start
+
+            for summary in summaries:
+                if (summary['status'] != 'COMPLETE'):
+                    raise Exception(f"{summary['feed']}: {summary['status']}")
+            check_equal(df_expected, pd.read_parquet(os.path.join(output_dir, 'feed=feed-0')))
+
+            num_rows = sum([summary['rows'] for summary in summaries])
+            num_parts = sum([summary['parts'] for summary in summaries])
+            print(f'{num_workers:>8} {num_rows:>9,} {num_parts:>6} {seconds:>8.2f} {args.items * args.feeds / seconds:>9,.0f} {num_bytes / 1024**2:>7.1f}')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import pandas as pd
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import get_highlights, set_datetime, set_location
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# The original extraction loop from app.py, kept here as the reference for comparison
+def get_highlights_legacy(items):
+    num_items = len(items.keys())
+
+    df = pd.DataFrame({
+        'JSON': [False] * num_items,
+        'ID': items.keys(),
+        'Super-event ID': [None] * num_items,
+        'Organizer name': [None] * num_items,
+        'Organizer logo': [None] * num_items,
+        'Name': [None] * num_items,
+        'Location': [None] * num_items,
+        'Lat': [None] * num_items,
+        'Lon': [None] * num_items,
+        'Date/time start': [None] * num_items,
+        'Date/time end': [None] * num_items,
+        'URL': [None] * num_items,
+    }, dtype=object)
+
+    for item_idx,item in enumerate(items.values()):
+        if ('data' in item.keys()):
+            try: df.at[item_idx, 'Super-event ID'] = item['data']['superEvent'].split('/')[-1]
+            except: pass
+            try: df.at[item_idx, 'Organizer name'] = item['data']['organizer']['name'].strip()
+            except:
+                try: df.at[item_idx, 'Organizer name'] = item['data']['superEvent']['organizer']['name'].strip()
+                except: pass
+            try: df.at[item_idx, 'Organizer logo'] = item['data']['organizer']['logo']['url'].strip()
+            except:
+                try: df.at[item_idx, 'Organizer logo'] = item['data']['superEvent']['organizer']['logo']['url'].strip()
+                except: pass
+            try: df.at[item_idx, 'Name'] = item['data']['name'].strip()
+            except: pass
+            try: df.at[item_idx, 'Location'] = set_location(item['data']['location'])
+            except: pass
+            try: df.at[item_idx, 'Lat'] = float(item['data']['location']['geo']['latitude'])
+            except: pass
+            try: df.at[item_idx, 'Lon'] = float(item['data']['location']['geo']['longitude'])
+            except: pass
+            try: df.at[item_idx, 'Date/time start'] = set_datetime(item['data']['startDate'].strip())
+            except: pass
+            try: df.at[item_idx, 'Date/time end'] = set_datetime(item['data']['endDate'].strip())
+            except: pass
+            try: df.at[item_idx, 'URL'] = item['data']['url'].strip()
+            except: pass
+
+    df.index = range(1, num_items+1)
+
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+def check_equal(df_legacy, df):
+    for column in df.columns:
+        values_legacy = [None if pd.isna(x) else x for x in df_legacy[column]]
+        values = [None if pd.isna(x) else x for x in df[column]]
+        if (column.startswith('Date/time')):
+            values_legacy = [x.replace(tzinfo=None) if x else None for x in values_legacy]
+            values = [x.to_pydatetime() if x else None for x in values]
+        if (values_legacy != values):
+            raise Exception(f'Column mismatch: {column}')
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the columnar highlight extraction with the original per-cell loop')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--skip-legacy-above', type=int, default=None, help='Skip the original loop for feeds larger than this')
+    args = parser.parse_args()
+
+    print(f"{'items':>10} {'legacy (s)':>12} {'columnar (s)':>14} {'speedup':>9}")
+    for num_items in args.sizes:
+        items = get_items(num_items)
+
+        time_start = perf_counter()
+        df = get_highlights(items)
+        seconds = perf_counter() - time_start
+
+        if (    (args.skip_legacy_above is not None)
+            and (num_items > args.skip_legacy_above)
+        ):
+            print(f'{num_items:>10} {"-":>12} {seconds:>14.3f} {"-":>9}')
+            continue
+
+        time_start = perf_counter()
+        df_legacy = get_highlights_legacy(items)
+        seconds_legacy = perf_counter() - time_start
+
+        check_equal(df_legacy, df)
+        print(f'{num_items:>10} {seconds_legacy:>12.3f} {seconds:>14.3f} {seconds_legacy/seconds:>8.1f}x')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import json
+import numpy as np
+import os
+import random
+import re
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import get_highlights
+from facets import TEXT_COLUMNS, FacetIndex, get_tokens
+from filters import COLUMNS, FilterIndex
+from synthetic import ACTIVITIES, TOWNS, get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# A scan of the text columns for words that start with each search word, as the reference for the
+# search through the token index
+def get_rows_text_legacy(df, text):
+    rows = np.ones(len(df), dtype=bool)
+    for word in get_tokens(text):
+        rows_word = np.zeros(len(df), dtype=bool)
+        for column in TEXT_COLUMNS:
+            rows_word |= df[column].astype(object).str.contains(r'(?<!\w)' + re.escape(word), case=False, na=False).to_numpy()
+        rows &= rows_word
+    return rows
+
+# --------------------------------------------------------------------------------------------------
+
+def get_unique(iterable):
+    return sorted(set([x for x in iterable if (x) and (x == x)]))
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the facet counts and text search for the sidebar filters, compared with sending every distinct value and scanning the text columns')
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--superevents', type=int, default=50000, help='Distinct names')
+    parser.add_argument('--locations', type=int, default=10000)
+    parser.add_argument('--searches', type=int, default=20)
+    args = parser.parse_args()
+
+    df = get_highlights(get_items(args.items, num_locations=args.locations, num_superevents=args.superevents)).drop(columns=['Organizer logo']).rename(columns={'Organizer name': 'Organiser'})
+
+    time_start = perf_counter()
+    uniques = {column: get_unique(df[column]) for column in COLUMNS}
+    seconds_uniques = perf_counter() - time_start
+    num_bytes_uniques = sum([len(json.dumps(values, default=str)) for values in uniques.values()])
+
+    filter_index = FilterIndex(df)
+    time_start = perf_counter()
+    facet_index = FacetIndex(filter_index)
+    seconds_build = perf_counter() - time_start
+
+    time_start = perf_counter()
+    options = {column: list(facet_index.get_labels(column, facet_index.get_options(column)).values()) for column in COLUMNS}
+    seconds_options = perf_counter() - time_start
+    num_bytes_options = sum([len(json.dumps(values)) for values in options.values()])
+
+    print(f'{len(df):,} rows, facets built in {seconds_build:.3f} s, {facet_index.num_bytes / 1024**2:.1f} MB, compared with {seconds_uniques:.3f} s for all distinct values')
+    print(f'Options sent: all distinct values {num_bytes_uniques / 1024**2:.2f} MB, top options with counts {num_bytes_options / 1024**2:.3f} MB in {seconds_options * 1000:.1f} ms')
+
+    rng = random.Random(0)
+    words = [word.lower() for word in ACTIVITIES + TOWNS] + [str(x) for x in range(100)]
+    print(f"{'search':>24} {'rows':>9} {'scan ms':>9} {'index ms':>9} {'options ms':>11}")
+    for search_idx in range(args.searches):
+        text = ' '.join(rng.sample(words, rng.choice([1, 1, 2]))) if (search_idx > 0) else 'swi'
+        text = text if (rng.random() < 0.5) else text[:max(2, len(text) - 2)]
+
+        time_start = perf_counter()
+        rows_legacy = get_rows_text_legacy(df, text)
+        seconds_legacy = perf_counter() - time_start
+
+        time_start = perf_counter()
+        rows = facet_index.get_rows_text(text)
+        seconds = perf_counter() - time_start
+
+        time_start = perf_counter()
+        for column in COLUMNS:
+            facet_index.get_options(column, text)
+        seconds_options = perf_counter() - time_start
+
+        if (not np.array_equal(rows, rows_legacy)):
+            raise Exception(f'Row mismatch for search: {text}')
+        print(f'{text:>24} {int(rows.sum()):>9,} {seconds_legacy * 1000:>9.1f} {seconds * 1000:>9.1f} {seconds_options * 1000:>11.1f}')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
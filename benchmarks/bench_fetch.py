@@ -0,0 +1,87 @@
+import argparse
+import copy
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cache
+from ingest import fetch_stats_template, get_opportunities_pages
+from server import FeedServer
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads a feed as the app does, continuing from the cache if there is an entry for the feed, and
+# returns the fetch stats of the read along with the time taken
+def read_feed(feed_url, cache_path, use_validators=True):
+    fetch_stats = dict(fetch_stats_template)
+    opportunities, num_bytes = cache.get_opportunities(feed_url, cache_path=cache_path)
+    if (opportunities is None):
+        opportunities = feed_url
+    elif (not use_validators):
+        opportunities['last_page'] = None
+
+    time_start = perf_counter()
+    for opportunities, items_updated, ids_deleted in get_opportunities_pages(opportunities, seconds_wait_next=0, fetch_stats=fetch_stats):
+        cache.set_page(feed_url, opportunities, items_updated, ids_deleted, cache_path=cache_path)
+    if (opportunities['status'] != 'COMPLETE'):
+        raise Exception(f"Read failed: {opportunities['status']}")
+
+    return fetch_stats, perf_counter() - time_start, len(opportunities['items'])
+
+# --------------------------------------------------------------------------------------------------
+
+def print_stats(name, fetch_stats, seconds, num_items):
+    print(f"{name:>34} {num_items:>8,} {fetch_stats['num_fetched']:>8} {fetch_stats['num_revalidated']:>12} {fetch_stats['num_retries']:>8} {fetch_stats['num_bytes'] / 1024**2:>9.3f} {fetch_stats['num_bytes_decoded'] / 1024**2:>9.3f} {seconds:>8.2f}")
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the data transferred when reading a feed from a local server, with and without compression, when reading it again from the cache with and without conditional requests, and when the server throttles requests')
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--items-per-page', type=int, default=500)
+    parser.add_argument('--items-added', type=int, default=300, help='Items added to the feed before the read after a change')
+    parser.add_argument('--throttle-every', type=int, default=5, help='Every nth page request is answered with 429 in the throttled read')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Seconds given in the Retry-After header of throttled responses')
+    args = parser.parse_args()
+
+    items = list(get_items(args.items).values())
+    print(f"{'read':>34} {'items':>8} {'fetched':>8} {'revalidated':>12} {'retries':>8} {'MB':>9} {'MB raw':>9} {'seconds':>8}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with FeedServer(num_catalogues=1, num_datasets=1, feeds={'scheduled-sessions': copy.copy(items)}, items_per_page=args.items_per_page, compress=False) as feed_server:
+            feed_url = feed_server.get_feed_url(0, 'scheduled-sessions')
+            print_stats('uncompressed', *read_feed(feed_url, os.path.join(cache_dir, 'uncompressed.sqlite')))
+
+        with FeedServer(num_catalogues=1, num_datasets=1, feeds={'scheduled-sessions': copy.copy(items)}, items_per_page=args.items_per_page) as feed_server:
+            feed_url = feed_server.get_feed_url(0, 'scheduled-sessions')
+            cache_path = os.path.join(cache_dir, 'compressed.sqlite')
+            print_stats('compressed', *read_feed(feed_url, cache_path))
+            print_stats('again from cache, unconditional', *read_feed(feed_url, cache_path, use_validators=False))
+            print_stats('again from cache, conditional', *read_feed(feed_url, cache_path))
+
+            modified = len(items)
+            for item in items[:args.items_added]:
+                modified += 1
+                feed_server.feeds['scheduled-sessions'].append({**item, 'modified': modified})
+            print_stats('again after a change, conditional', *read_feed(feed_url, cache_path))
+            num_not_modified = feed_server.num_not_modified
+
+        if (num_not_modified != 1):
+            raise Exception(f'Expected 1 page not modified, server sent {num_not_modified}')
+
+        with FeedServer(num_catalogues=1, num_datasets=1, feeds={'scheduled-sessions': copy.copy(items)}, items_per_page=args.items_per_page, throttle_every=args.throttle_every, seconds_retry_after=args.retry_after) as feed_server:
+            feed_url = feed_server.get_feed_url(0, 'scheduled-sessions')
+            fetch_stats, seconds, num_items = read_feed(feed_url, os.path.join(cache_dir, 'throttled.sqlite'))
+            print_stats('throttled', fetch_stats, seconds, num_items)
+            if (fetch_stats['num_retries'] != feed_server.num_throttled):
+                raise Exception(f"Expected {feed_server.num_throttled} retries, made {fetch_stats['num_retries']}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import sys
+from datetime import timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import get_highlights
+from filters import COLUMNS, FilterIndex
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# The original filter chain from app.py, kept here as the reference for comparison
+def get_filtered_legacy(df, filters, dates_range):
+    for column,values in filters.items():
+        if (values):
+            df = df.loc[df[column].isin(values)]
+    if (dates_range):
+        df = df.loc[
+                (df['Date/time start'].dt.date >= dates_range[0])
+            &   (df['Date/time end'].dt.date <= dates_range[-1])
+        ]
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+def get_filters(df, uniques, rng):
+    filters = {column: rng.sample(uniques[column], min(len(uniques[column]), rng.choice([0, 0, 1, 5]))) for column in COLUMNS}
+    dates = sorted(df['Date/time start'].dropna().dt.date.unique())
+    date_min = rng.choice(dates)
+    dates_range = rng.choice([(), (date_min,), (date_min, date_min + timedelta(days=rng.randint(0, 30)))])
+    return filters, dates_range
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare indexed filtering with the original filter chain')
+    parser.add_argument('--items', type=int, default=500000)
+    parser.add_argument('--interactions', type=int, default=20)
+    args = parser.parse_args()
+
+    df = get_highlights(get_items(args.items, num_superevents=5000)).drop(columns=['Organizer logo']).rename(columns={'Organizer name': 'Organiser'})
+    uniques = {column: sorted(set(df[column].dropna())) for column in COLUMNS}
+
+    time_start = perf_counter()
+    filter_index = FilterIndex(df)
+    seconds_build = perf_counter() - time_start
+
+    rng = random.Random(0)
+    seconds_legacy = 0
+    seconds = 0
+    for interaction_idx in range(args.interactions):
+        filters, dates_range = get_filters(df, uniques, rng)
+
+        time_start = perf_counter()
+        df_legacy = get_filtered_legacy(df, filters, dates_range)
+        seconds_legacy += perf_counter() - time_start
+
+        time_start = perf_counter()
+        positions = filter_index.get_positions(filters, dates_range)
+        df_filtered = df if (positions is None) else df.take(positions)
+        seconds += perf_counter() - time_start
+
+        if (not df_filtered.index.equals(df_legacy.index)):
+            raise Exception(f'Row mismatch for filters: {filters}, {dates_range}')
+
+    print(f'{args.items} rows, index built in {seconds_build:.3f} s, {filter_index.num_bytes / 1024**2:.1f} MB')
+    print(f'Mean per interaction: legacy {seconds_legacy / args.interactions * 1000:.1f} ms, indexed {seconds / args.interactions * 1000:.1f} ms')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harvest import get_feeds
+from server import FeedServer
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare concurrent and serial reads of the feed catalogue from a local server')
+    parser.add_argument('--datasets', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 16, 32])
+    args = parser.parse_args()
+
+    with FeedServer(num_catalogues=4, num_datasets=args.datasets, seconds_latency=args.latency) as feed_server:
+        time_start = perf_counter()
+        feeds_serial = get_feeds(feed_server.collection_url, max_workers=1)
+        seconds_serial = perf_counter() - time_start
+
+        if (len(feeds_serial) != args.datasets):
+            raise Exception(f'Expected {args.datasets} datasets, got {len(feeds_serial)}')
+
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>9}")
+        print(f'{1:>8} {seconds_serial:>9.3f} {"1.0x":>9}')
+        for max_workers in args.workers:
+            time_start = perf_counter()
+            feeds = get_feeds(feed_server.collection_url, max_workers=max_workers)
+            seconds = perf_counter() - time_start
+
+            if (feeds != feeds_serial):
+                raise Exception(f'Output with {max_workers} workers differs from serial output')
+            print(f'{max_workers:>8} {seconds:>9.3f} {seconds_serial/seconds:>8.1f}x')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from items import ItemStore
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# Items are passed through JSON as they would be when read from a feed, so that every item has its own
+# nested objects rather than sharing those made by the generator
+def get_items_json(num_items):
+    return [json.dumps(item) for item in get_items(num_items).values()]
+
+# --------------------------------------------------------------------------------------------------
+
+# Time is measured separately from memory, as tracing memory allocations slows everything down
+def get_memory(function, items_json):
+    time_start = perf_counter()
+    function(items_json)
+    seconds = perf_counter() - time_start
+
+    tracemalloc.start()
+    items = function(items_json)
+    num_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return items, num_bytes, seconds
+
+# --------------------------------------------------------------------------------------------------
+
+def set_dict(items_json):
+    items = {}
+    for item_json in items_json:
+        item = json.loads(item_json)
+        items[item['id']] = item
+    return items
+
+# --------------------------------------------------------------------------------------------------
+
+def set_item_store(items_json):
+    items = ItemStore()
+    for item_json in items_json:
+        item = json.loads(item_json)
+        items[item['id']] = item
+    return items
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory used by feed items held as Python objects and in an ItemStore')
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+
+    items_json = get_items_json(args.items)
+    items_dict, num_bytes_dict, seconds_dict = get_memory(set_dict, items_json)
+    items_store, num_bytes_store, seconds_store = get_memory(set_item_store, items_json)
+
+    item_ids = list(items_dict.keys())[::max(1, args.items // 1000)]
+    time_start = perf_counter()
+    for item_id in item_ids:
+        if (items_store[item_id] != items_dict[item_id]):
+            raise Exception(f'Item mismatch: {item_id}')
+    seconds_get = (perf_counter() - time_start) / len(item_ids)
+
+    print(f'{args.items} items, {sum([len(x) for x in items_json]) / 1024**2:.1f} MB of JSON')
+    print(f"{'':>10} {'MB':>9} {'seconds':>9}")
+    print(f"{'dict':>10} {num_bytes_dict / 1024**2:>9.1f} {seconds_dict:>9.3f}")
+    print(f"{'ItemStore':>10} {num_bytes_store / 1024**2:>9.1f} {seconds_store:>9.3f}")
+    print(f'{num_bytes_dict / num_bytes_store:.1f}x less memory, {seconds_get * 1e6:.0f} us to decode one item')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import pandas as pd
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import concat_highlights, get_highlights
+from ingest import get_opportunities_pages
+from join import JOIN_COLUMNS, SuperEventIndex, SuperEventReader, get_superevents_df, join_superevents
+from server import FeedServer
+from synthetic import get_items, get_superevents
+
+# --------------------------------------------------------------------------------------------------
+
+def read_sessions(feed_url):
+    dfs = []
+    for opportunities, items_updated, ids_deleted in get_opportunities_pages(feed_url, seconds_wait_next=0):
+        if (items_updated):
+            dfs.append(get_highlights(items_updated))
+    return concat_highlights(dfs, opportunities['items'].keys())
+
+# --------------------------------------------------------------------------------------------------
+
+def read_superevents(feed_url):
+    superevent_index = SuperEventIndex()
+    for opportunities, items_updated, ids_deleted in get_opportunities_pages(feed_url, seconds_wait_next=0):
+        superevent_index.add_page(items_updated, ids_deleted)
+    return superevent_index.get_df()
+
+# --------------------------------------------------------------------------------------------------
+
+# A merge on the super-event ID, as the straightforward alternative to the index lookup
+def join_superevents_merge(df, superevents):
+    df = df.merge(superevents[JOIN_COLUMNS], how='left', left_on='Super-event ID', right_index=True, suffixes=('', ' (series)'))
+    for column in JOIN_COLUMNS:
+        df[column] = df[column].astype(object).fillna(df.pop(column + ' (series)').astype(object))
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+def check_equal(df_expected, df):
+    for column in df_expected.columns:
+        values_expected = [None if pd.isna(x) else x for x in df_expected[column]]
+        values = [None if pd.isna(x) else x for x in df[column]]
+        if (values_expected != values):
+            raise Exception(f'Column mismatch: {column}')
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the reading and joining of paired Scheduled Sessions and Session Series feeds')
+    parser.add_argument('--items', type=int, default=50000, help='Sessions in the feeds read from the local server')
+    parser.add_argument('--superevents', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every response')
+    parser.add_argument('--join-items', type=int, default=1000000, help='Sessions in the in-memory join')
+    args = parser.parse_args()
+
+    feeds = {
+        'scheduled-sessions': list(get_items(args.items, num_superevents=args.superevents, paired=True).values()),
+        'session-series': list(get_superevents(args.superevents).values()),
+    }
+    with FeedServer(num_catalogues=1, num_datasets=1, feeds=feeds, seconds_latency=args.latency) as feed_server:
+        sessions_url = feed_server.get_feed_url(0, 'scheduled-sessions')
+        superevents_url = feed_server.get_feed_url(0, 'session-series')
+
+        time_start = perf_counter()
+        df_serial = join_superevents(read_sessions(sessions_url), read_superevents(superevents_url))
+        seconds_serial = perf_counter() - time_start
+
+        time_start = perf_counter()
+        superevent_reader = SuperEventReader(superevents_url, use_cache=False, seconds_wait_next=0)
+        df = read_sessions(sessions_url)
+        superevent_reader.wait()
+        df = join_superevents(df, superevent_reader.index.get_df())
+        seconds = perf_counter() - time_start
+
+    check_equal(df_serial, df)
+    check_equal(get_highlights(get_items(args.items, num_superevents=args.superevents)), df)
+    print(f'Read {args.items} sessions and {args.superevents} series: serial {seconds_serial:.3f} s, concurrent {seconds:.3f} s, {seconds_serial/seconds:.1f}x')
+
+    df = get_highlights(get_items(args.join_items, num_superevents=args.superevents, paired=True))
+    superevents = get_superevents_df(get_superevents(args.superevents)).set_index('Super-event ID')
+
+    time_start = perf_counter()
+    df_merge = join_superevents_merge(df, superevents)
+    seconds_merge = perf_counter() - time_start
+
+    time_start = perf_counter()
+    df_joined = join_superevents(df, superevents)
+    seconds_join = perf_counter() - time_start
+
+    check_equal(df_merge, df_joined)
+    print(f'Join {args.join_items} sessions: merge {seconds_merge:.3f} s, index lookup {seconds_join:.3f} s, {seconds_merge/seconds_join:.1f}x')
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import pydeck as pdk
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import get_highlights
+from geo import get_map_layer_data
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+def get_payload_num_bytes(layer_data):
+    return len(pdk.Deck(layers=[pdk.Layer('ScatterplotLayer', layer_data, get_position=['Lon', 'Lat'])]).to_json())
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the size of the map data sent to the browser with one point per row and per venue')
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--locations', type=int, nargs='+', default=[100, 1000, 20000])
+    args = parser.parse_args()
+
+    print(f"{'locations':>10} {'rows MB':>9} {'points':>8} {'grid':>5} {'MB':>7} {'seconds':>8}")
+    for num_locations in args.locations:
+        df = get_highlights(get_items(args.items, num_locations=num_locations, num_superevents=max(1000, num_locations)))
+        map_data = df.loc[df['Lon'].notna() & df['Lat'].notna(), ['Lon', 'Lat', 'Location']]
+
+        time_start = perf_counter()
+        layer_data, aggregated = get_map_layer_data(map_data)
+        seconds = perf_counter() - time_start
+
+        num_bytes_rows = get_payload_num_bytes(map_data)
+        num_bytes = get_payload_num_bytes(layer_data)
+        print(f"{num_locations:>10} {num_bytes_rows / 1024**2:>9.2f} {len(layer_data):>8} {'yes' if aggregated else 'no':>5} {num_bytes / 1024**2:>7.2f} {seconds:>8.3f}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
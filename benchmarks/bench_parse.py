@@ -0,0 +1,123 @@
+import argparse
+import os
+import pandas as pd
+import random
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract import get_datetimes, get_location_text, get_parse_stats, set_datetime, set_location
+from synthetic import get_items
+
+# --------------------------------------------------------------------------------------------------
+
+# The original location and date/time parsing from extract.py, kept here as the reference for
+# comparison
+def set_location_legacy(location_in):
+    try: location_out = [location_in['name'].strip()]
+    except: location_out = []
+
+    if ('address' in location_in.keys()):
+        for address_parts_type in ['streetAddress', 'addressLocality', 'addressRegion', 'postalCode', 'addressCountry']:
+            try: address_parts = location_in['address'][address_parts_type].strip().split(',')
+            except: address_parts = []
+            for address_part in address_parts:
+                if (address_part not in location_out):
+                    location_out.append(address_part)
+
+    return ',\n'.join(location_out) or None
+
+# --------------------------------------------------------------------------------------------------
+
+def get_datetimes_legacy(datetimes_isoformat):
+    datetimes = [set_datetime(x) if x else None for x in datetimes_isoformat]
+    return pd.to_datetime(
+        pd.Series([x.replace(tzinfo=None) if x else None for x in datetimes], dtype=object),
+    ).astype('datetime64[us]')
+
+# --------------------------------------------------------------------------------------------------
+
+# Awkward inputs seen in real feeds, which have to give the same results as the original functions
+LOCATIONS_EDGE_CASES = [
+    {},
+    {'name': ''},
+    {'name': ' Pool '},
+    {'name': 5, 'address': {'streetAddress': '1 Road'}},
+    {'name': 'Hall', 'address': 'Hall, 1 Road'},
+    {'name': 'Hall', 'address': {'streetAddress': 'Hall,Hall, 1 Road', 'addressLocality': ' Leeds', 'postalCode': None}},
+    {'name': 'Leeds', 'address': {'streetAddress': 'Leeds', 'addressLocality': 'Leeds,', 'addressCountry': 'GB'}},
+    {'address': {'streetAddress': '', 'addressRegion': ' , '}},
+]
+DATETIMES_EDGE_CASES = [
+    None,
+    '',
+    'soon',
+    '2024-02-30T10:00:00',
+    '2024-01-01',
+    '2024-01-31',
+    '2024-01-01T10:00',
+    '2024-01-01T10:00:00Z',
+    '2024-01-01T10:00:00.5+01:00',
+    '2024-01-01T10:00:00.123456-05:30',
+    '2024-01-01 10:00:00+0100',
+    '2024-06-01T23:30:00-11:00',
+    '9999-12-31T23:59:59Z',
+    '2300-01-01',
+    '0001-01-01T00:00:00',
+]
+
+# --------------------------------------------------------------------------------------------------
+
+def check_equal(values_legacy, values):
+    values_legacy = [None if pd.isna(x) else x for x in values_legacy]
+    values = [None if pd.isna(x) else x for x in values]
+    if (values_legacy != values):
+        raise Exception('Mismatch: {}'.format([(x, y) for x,y in zip(values_legacy, values) if (x != y)][:5]))
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare cached location and date/time parsing with the original functions')
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--locations', type=int, default=1000)
+    args = parser.parse_args()
+
+    check_equal([set_location_legacy(x) for x in LOCATIONS_EDGE_CASES], [set_location(x) for x in LOCATIONS_EDGE_CASES])
+    check_equal(get_datetimes_legacy(DATETIMES_EDGE_CASES), get_datetimes(DATETIMES_EDGE_CASES))
+
+    items = get_items(args.items, num_locations=args.locations, num_superevents=max(1000, args.locations))
+    rng = random.Random(0)
+    locations = [item['data']['location'] for item in items.values()]
+    datetimes_isoformat = [item['data']['startDate'] for item in items.values()]
+    datetimes_isoformat = [x if (rng.random() > 0.01) else rng.choice(DATETIMES_EDGE_CASES) for x in datetimes_isoformat]
+
+    time_start = perf_counter()
+    locations_legacy = [set_location_legacy(x) for x in locations]
+    seconds_locations_legacy = perf_counter() - time_start
+
+    get_location_text.cache_clear()
+    time_start = perf_counter()
+    locations_cached = [set_location(x) for x in locations]
+    seconds_locations = perf_counter() - time_start
+    check_equal(locations_legacy, locations_cached)
+
+    time_start = perf_counter()
+    datetimes_legacy = get_datetimes_legacy(datetimes_isoformat)
+    seconds_datetimes_legacy = perf_counter() - time_start
+
+    time_start = perf_counter()
+    datetimes = get_datetimes(datetimes_isoformat)
+    seconds_datetimes = perf_counter() - time_start
+    check_equal(datetimes_legacy, datetimes)
+
+    stats = get_parse_stats()
+    print(f"{'':>10} {'legacy (s)':>12} {'cached (s)':>12} {'speedup':>9} {'hit rate':>9}")
+    print(f"{'locations':>10} {seconds_locations_legacy:>12.3f} {seconds_locations:>12.3f} {seconds_locations_legacy/seconds_locations:>8.1f}x {stats['locations']['hit_rate']:>9.1%}")
+    print(f"{'datetimes':>10} {seconds_datetimes_legacy:>12.3f} {seconds_datetimes:>12.3f} {seconds_datetimes_legacy/seconds_datetimes:>8.1f}x {stats['datetimes']['hit_rate']:>9.1%}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
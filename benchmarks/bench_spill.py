@@ -0,0 +1,176 @@
+import argparse
+import json
+import multiprocessing
+import numpy as np
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_export import save_pages
+from export import get_page_paths
+from extract import concat_highlights, get_highlights
+from facets import FacetIndex
+from geo import get_map_layer_data
+from filters import COLUMNS, FilterIndex
+from ingest import set_items
+from items import ItemStore
+from profiling import get_rss_bytes
+from spill import HighlightsBuffer, MemoryBudget
+from synthetic import get_items
+from table import SortIndex
+
+# --------------------------------------------------------------------------------------------------
+
+PAGE_SIZE = 100
+# The synthetic items start on 1 January 2024, with one day's items for each full set of super-events
+SEARCHES = [
+    ('', {}, ()),
+    ('swim', {}, ()),
+    ('yoga 1', {}, (date(2024, 1, 1),)),
+    ('leeds', {'Organiser': ['Organiser 3']}, ()),
+    ('pilates york', {}, (date(2024, 1, 2), date(2024, 2, 5))),
+    ('', {'Organiser': ['Organiser 1', 'Organiser 2']}, (date(2024, 1, 1),)),
+]
+
+# --------------------------------------------------------------------------------------------------
+
+def get_table(df):
+    return df.drop(columns=['Organizer logo']).rename(columns={'Organizer name': 'Organiser'})
+
+# Some items have their location given only by its coordinates, as in real feeds, so that the map has
+# venues with rows both with and without location text
+def set_locations_unnamed(items):
+    for item_idx,item in enumerate(items.values()):
+        if (item_idx % 20 == 0):
+            item['data']['location'] = {'geo': item['data']['location']['geo']}
+    return items
+
+# The map layer is made as in the app, and summarised by the number of items at each point, as the
+# order of the location text differs with the order of the rows
+def get_map_summary(df_map):
+    df_map = df_map.loc[df_map['Lon'].notna() & df_map['Lat'].notna()]
+    if (len(df_map) == 0):
+        return None
+    layer_data, aggregated = get_map_layer_data(df_map)
+    return {
+        'aggregated': aggregated,
+        'counts': sorted(zip(layer_data['Lon'].round(6), layer_data['Lat'].round(6), layer_data['Count'].astype(int))),
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+# Peak memory is the peak resident set size of the process, so each read is run in a new process of
+# its own
+def get_rss_peak_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if (os.uname().sysname == 'Darwin') else rss * 1024
+
+# The memory held afterwards leaves out the pages of mapped files, such as a spilled table, as the OS
+# can drop these when it's short of memory and read them again later. This is only given separately on
+# Linux, and elsewhere it's the whole resident set size.
+def get_rss_anon_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if (line.startswith('RssAnon:')):
+                    return int(line.split()[1]) * 1024
+    except:
+        pass
+    return get_rss_bytes()
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads the saved pages of a feed as the app does, and then runs the searches and date ranges,
+# reading the IDs of the rows found, the first page of them sorted by name, and their map
+def run_read(pages_dir, session_max_bytes, spill_dir):
+    num_bytes_start = get_rss_bytes()
+    num_bytes_anon_start = get_rss_anon_bytes()
+    opportunities = {'items': ItemStore()}
+    highlights = HighlightsBuffer(MemoryBudget(session_max_bytes, 0), spill_dir)
+
+    time_start = perf_counter()
+    for page_path in get_page_paths(pages_dir):
+        with open(page_path) as f:
+            items_updated, ids_deleted = set_items(opportunities, json.load(f)['items'])
+        highlights.add(opportunities, get_highlights(items_updated) if (items_updated) else None, ids_deleted)
+    seconds_read = perf_counter() - time_start
+
+    time_start = perf_counter()
+    spilled = highlights.spilled
+    if (spilled):
+        df = highlights.get_spilled_table(get_table)
+    else:
+        df = get_table(concat_highlights(highlights.dfs, opportunities['items'].keys()))
+    highlights = None
+    filter_index = FilterIndex(df)
+    facet_index = FacetIndex(filter_index)
+    sort_index = SortIndex(df)
+    seconds_table = perf_counter() - time_start
+
+    results = []
+    seconds_searches = []
+    for text,filters,dates_range in SEARCHES:
+        time_start = perf_counter()
+        filters = {column: filters.get(column, []) for column in COLUMNS}
+        positions = filter_index.get_positions(filters, dates_range, facet_index.get_rows_text(text))
+        positions = np.arange(len(df)) if (positions is None) else positions
+        df_page = df.take(sort_index.get_positions(positions, 'Name')[:PAGE_SIZE]).copy(deep=False)
+        df_map = df.take(positions)[['Lon', 'Lat', 'Location']]
+        seconds_searches.append(perf_counter() - time_start)
+        results.append({
+            'ids': sorted(df.take(positions)['ID'].astype(str)),
+            'names': list(df_page['Name']),
+            'num_located': int(df_map['Lon'].notna().sum()),
+            'map': get_map_summary(df_map),
+        })
+
+    return {
+        'spilled': spilled,
+        'num_items': len(opportunities['items']),
+        'seconds_read': seconds_read,
+        'seconds_table': seconds_table,
+        'seconds_search': sum(seconds_searches) / len(seconds_searches),
+        'num_bytes_peak': get_rss_peak_bytes() - num_bytes_start,
+        'num_bytes_held': get_rss_anon_bytes() - num_bytes_anon_start,
+        'num_bytes_disk': getattr(df, 'num_bytes_disk', 0) + getattr(opportunities['items'], 'num_bytes_disk', 0),
+        'results': results,
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the peak memory and times of reading a feed within a memory budget, with the rows and items spilled to disk, compared with holding them in memory, and check that searches give the same results')
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--items-per-page', type=int, default=500)
+    parser.add_argument('--changed', type=float, default=0.05, help='Fraction of items updated again or deleted in later pages')
+    parser.add_argument('--budgets', type=float, nargs='+', default=[64, 16], help='Session memory budgets in MB to read within, as well as reading in memory')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pages_dir = os.path.join(temp_dir, 'pages')
+        save_pages(pages_dir, set_locations_unnamed(get_items(args.items, num_locations=5000, num_superevents=20000)), args.items_per_page, args.changed, 0)
+
+        print(f"{'budget MB':>10} {'items':>9} {'spilled':>8} {'read s':>8} {'table s':>8} {'search ms':>10} {'peak MB':>8} {'held MB':>8} {'disk MB':>8}")
+        results_expected = None
+        for session_max_mb in [None] + args.budgets:
+            session_max_bytes = 2**62 if (session_max_mb is None) else int(session_max_mb * 1024**2)
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                stats = executor.submit(run_read, pages_dir, session_max_bytes, os.path.join(temp_dir, 'spill')).result()
+
+            if (results_expected is None):
+                results_expected = stats['results']
+            elif (stats['results'] != results_expected):
+                raise Exception(f'Search results differ with a budget of {session_max_mb} MB')
+            print(f"{'none' if (session_max_mb is None) else session_max_mb:>10} {stats['num_items']:>9,} {str(stats['spilled']):>8} {stats['seconds_read']:>8.2f} {stats['seconds_table']:>8.2f} {stats['seconds_search'] * 1000:>10.1f} {stats['num_bytes_peak'] / 1024**2:>8.1f} {stats['num_bytes_held'] / 1024**2:>8.1f} {stats['num_bytes_disk'] / 1024**2:>8.1f}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
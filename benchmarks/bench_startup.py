@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from server import FeedServer
+
+# --------------------------------------------------------------------------------------------------
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+SECONDS_TIMEOUT = 600
+
+# --------------------------------------------------------------------------------------------------
+
+# Run in a new process for each measurement, so that nothing is already imported or cached. The time
+# is from before Streamlit is imported until the first run of the app script has finished, at which
+# point the sidebar can be used.
+def run_app():
+    time_start = perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=SECONDS_TIMEOUT)
+    at.run()
+    if (at.exception):
+        raise Exception(at.exception[0].value)
+
+    print(json.dumps({
+        'seconds': perf_counter() - time_start,
+        'num_providers': len(at.session_state.providers),
+        'pydeck_imported': ('pydeck' in sys.modules),
+    }))
+
+# --------------------------------------------------------------------------------------------------
+
+def get_startup(env):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-app'], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().split('\n')[-1])
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time for the app to become usable after a restart, with and without a snapshot of the feed catalogue')
+    parser.add_argument('--run-app', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--datasets', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds added to every response')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if (args.run_app):
+        run_app()
+        return
+
+    with FeedServer(num_catalogues=4, num_datasets=args.datasets, seconds_latency=args.latency) as feed_server:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = {
+                **os.environ,
+                'OPENACTIVE_CACHE_PATH': os.path.join(cache_dir, 'feeds.sqlite'),
+                'OPENACTIVE_COLLECTION_URL': feed_server.collection_url,
+            }
+            catalogue_path = os.path.join(cache_dir, 'catalogue.json')
+
+            print(f"{'snapshot':>10} {'seconds':>9} {'providers':>10} {'pydeck':>7}")
+            for snapshot in ['none', 'fresh', 'stale']:
+                startups = []
+                for repeat_idx in range(args.repeats):
+                    if (snapshot == 'none'):
+                        if (os.path.exists(catalogue_path)):
+                            os.remove(catalogue_path)
+                    elif (snapshot == 'stale'):
+                        with open(catalogue_path) as f:
+                            catalogue = json.load(f)
+                        catalogue['time_created'] = 0
+                        with open(catalogue_path, 'w') as f:
+                            json.dump(catalogue, f)
+                    startups.append(get_startup(env))
+                seconds = statistics.median([startup['seconds'] for startup in startups])
+                print(f"{snapshot:>10} {seconds:>9.2f} {startups[-1]['num_providers']:>10} {'yes' if startups[-1]['pydeck_imported'] else 'no':>7}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
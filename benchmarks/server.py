@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qs, urlparse
+
+# --------------------------------------------------------------------------------------------------
+
+# A local stand-in for the OpenActive catalogue, dataset sites and RPDE feeds, so that the app's
+# network code can be measured offline. Every response is delayed by seconds_latency to imitate a
+# remote host. Feed pages have an ETag, are answered with 304 Not Modified when requested with a
+# matching If-None-Match, and are gzipped when the client accepts it and compress is set. If
+# throttle_every is set, then every nth feed page request is answered with 429 Too Many Requests and a
+# Retry-After of seconds_retry_after. Routes are:
+#   /collection.jsonld                       the data catalogue collection
+#   /catalogues/<catalogue_idx>.jsonld       a data catalogue listing dataset sites
+#   /datasets/<dataset_idx>/                 a dataset site page with JSON-LD feed distributions
+#   /datasets/<dataset_idx>/<feed_type>      an RPDE feed, paged with ?page=<page_idx>
+class FeedServer():
+    def __init__(self, num_catalogues=2, num_datasets=20, feeds=None, items_per_page=500, seconds_latency=0, compress=True, throttle_every=0, seconds_retry_after=0):
+        self.num_catalogues = num_catalogues
+        self.num_datasets = num_datasets
+        self.feeds = feeds or {}
+        self.items_per_page = items_per_page
+        self.seconds_latency = seconds_latency
+        self.compress = compress
+        self.throttle_every = throttle_every
+        self.seconds_retry_after = seconds_retry_after
+        self.num_requests = 0
+        self.num_feed_requests = 0
+        self.num_not_modified = 0
+        self.num_throttled = 0
+        self.num_bytes_sent = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), get_handler(self))
+        self.server.daemon_threads = True
+        self.origin = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.collection_url = self.origin + '/collection.jsonld'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_feed_url(self, dataset_idx, feed_type):
+        return '{}/datasets/{}/{}'.format(self.origin, dataset_idx, feed_type)
+
+    def get_catalogue(self, catalogue_idx):
+        return {
+            'dataset': [
+                '{}/datasets/{}/'.format(self.origin, dataset_idx)
+                for dataset_idx in range(self.num_datasets)
+                if (dataset_idx % self.num_catalogues == catalogue_idx)
+            ],
+        }
+
+    def get_dataset_page(self, dataset_idx):
+        jsonld = {
+            '@type': 'Dataset',
+            'name': 'Dataset {}'.format(dataset_idx),
+            'license': 'https://creativecommons.org/licenses/by/4.0/',
+            'discussionUrl': 'https://github.com/example/dataset-{}'.format(dataset_idx),
+            'publisher': {'name': 'Publisher {}'.format(dataset_idx)},
+            'distribution': [
+                {'name': feed_type, 'contentUrl': self.get_feed_url(dataset_idx, feed_type)}
+                for feed_type in (self.feeds.keys() or ['scheduled-sessions'])
+            ],
+        }
+        return '<html><head><script type="application/ld+json">{}</script></head><body></body></html>'.format(json.dumps(jsonld))
+
+    # The final page has no items and a "next" URL pointing to itself, as per the RPDE specification
+    def get_feed_page(self, dataset_idx, feed_type, page_idx):
+        items = self.feeds.get(feed_type, [])
+        page_items = items[page_idx*self.items_per_page:(page_idx+1)*self.items_per_page]
+        return {
+            'items': page_items,
+            'next': '{}?page={}'.format(self.get_feed_url(dataset_idx, feed_type), page_idx+1 if page_items else page_idx),
+            'license': 'https://creativecommons.org/licenses/by/4.0/',
+        }
+
+# --------------------------------------------------------------------------------------------------
+
+def get_handler(feed_server):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with feed_server.lock:
+                feed_server.num_requests += 1
+            sleep(feed_server.seconds_latency)
+
+            url = urlparse(self.path)
+            path_parts = [x for x in url.path.split('/') if x]
+            content_type = 'application/json'
+            feed_page = False
+            try:
+                if (path_parts == ['collection.jsonld']):
+                    body = json.dumps({'hasPart': [
+                        '{}/catalogues/{}.jsonld'.format(feed_server.origin, catalogue_idx)
+                        for catalogue_idx in range(feed_server.num_catalogues)
+                    ]})
+                elif (path_parts[0] == 'catalogues'):
+                    body = json.dumps(feed_server.get_catalogue(int(path_parts[1].split('.')[0])))
+                elif (  (path_parts[0] == 'datasets')
+                    and (len(path_parts) == 2)
+                ):
+                    body = feed_server.get_dataset_page(int(path_parts[1]))
+                    content_type = 'text/html'
+                elif (path_parts[0] == 'datasets'):
+                    page_idx = int(parse_qs(url.query).get('page', ['0'])[0])
+                    body = json.dumps(feed_server.get_feed_page(int(path_parts[1]), '/'.join(path_parts[2:]), page_idx))
+                    feed_page = True
+                else:
+                    raise Exception()
+            except:
+                self.send_error(404)
+                return
+
+            body = body.encode()
+            headers = {'Content-Type': content_type}
+            if (feed_page):
+                with feed_server.lock:
+                    feed_server.num_feed_requests += 1
+                    throttled = (feed_server.throttle_every > 0) and (feed_server.num_feed_requests % feed_server.throttle_every == 0)
+                    if (throttled):
+                        feed_server.num_throttled += 1
+                if (throttled):
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(feed_server.seconds_retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                headers['ETag'] = '"{}"'.format(hashlib.sha1(body).hexdigest())
+                if (self.headers.get('If-None-Match') == headers['ETag']):
+                    with feed_server.lock:
+                        feed_server.num_not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', headers['ETag'])
+                    self.end_headers()
+                    return
+                if (    (feed_server.compress)
+                    and ('gzip' in self.headers.get('Accept-Encoding', ''))
+                ):
+                    body = gzip.compress(body, compresslevel=6)
+                    headers['Content-Encoding'] = 'gzip'
+
+            with feed_server.lock:
+                feed_server.num_bytes_sent += len(body)
+            self.send_response(200)
+            for key,value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
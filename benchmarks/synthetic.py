@@ -0,0 +1,114 @@
+import random
+from datetime import datetime, timedelta
+
+# --------------------------------------------------------------------------------------------------
+
+ORIGIN = 'https://example.openactive.io'
+ACTIVITIES = ['Yoga', 'Pilates', 'Swimming', 'Badminton', 'Football', 'Netball', 'Running', 'Boxing', 'Spin', 'Zumba']
+TOWNS = ['Leeds', 'York', 'Bristol', 'Bath', 'Derby', 'Exeter', 'Oxford', 'Lincoln', 'Durham', 'Norwich']
+
+# --------------------------------------------------------------------------------------------------
+
+def get_location(location_idx, rng):
+    town = TOWNS[location_idx % len(TOWNS)]
+    return {
+        '@type': 'Place',
+        'name': f'{town} Leisure Centre {location_idx}',
+        'address': {
+            '@type': 'PostalAddress',
+            'streetAddress': f'{location_idx} High Street, Old Town',
+            'addressLocality': town,
+            'addressRegion': 'England',
+            'postalCode': f'AB{location_idx % 100} {location_idx % 10}CD',
+            'addressCountry': 'GB',
+        },
+        'geo': {
+            '@type': 'GeoCoordinates',
+            'latitude': round(rng.uniform(50.0, 55.0), 6),
+            'longitude': round(rng.uniform(-4.0, 1.0), 6),
+        },
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+def get_organizer(organizer_idx):
+    return {
+        '@type': 'Organization',
+        'name': f'Organiser {organizer_idx}',
+        'logo': {
+            '@type': 'ImageObject',
+            'url': f'{ORIGIN}/logos/{organizer_idx}.png',
+        },
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+# Items follow the shape of a Scheduled Sessions feed, with a string superEvent reference to a parent
+# Session Series, and a limited number of distinct locations and start times so that values repeat
+# across items as they do in real feeds. If paired is True, then the organiser, name and location are
+# left out, as these are given by the parent Session Series in the partner feed from get_superevents().
+def get_items(num_items, num_locations=100, num_superevents=1000, num_organizers=10, seed=0, paired=False):
+    rng = random.Random(seed)
+    locations = [get_location(location_idx, rng) for location_idx in range(num_locations)]
+    organizers = [get_organizer(organizer_idx) for organizer_idx in range(num_organizers)]
+    date_start = datetime(2024, 1, 1, 6, 0)
+
+    items = {}
+    for item_idx in range(num_items):
+        superevent_idx = item_idx % num_superevents
+        datetime_start = date_start + timedelta(days=(item_idx // num_superevents) % 60, hours=superevent_idx % 14)
+        datetime_end = datetime_start + timedelta(hours=1)
+        item_id = f'{item_idx}'
+        items[item_id] = {
+            'id': item_id,
+            'state': 'updated',
+            'kind': 'ScheduledSession',
+            'modified': item_idx,
+            'data': {
+                '@context': 'https://openactive.io/',
+                '@type': 'ScheduledSession',
+                '@id': f'{ORIGIN}/scheduled-sessions/{item_id}',
+                'superEvent': f'{ORIGIN}/session-series/{superevent_idx}',
+                'organizer': organizers[superevent_idx % num_organizers],
+                'name': f'{ACTIVITIES[superevent_idx % len(ACTIVITIES)]} {superevent_idx}',
+                'location': locations[superevent_idx % num_locations],
+                'startDate': datetime_start.isoformat() + '+01:00',
+                'endDate': datetime_end.isoformat() + '+01:00',
+                'url': f'{ORIGIN}/sessions/{item_id}',
+            },
+        }
+        if (paired):
+            for key in ['organizer', 'name', 'location']:
+                del(items[item_id]['data'][key])
+
+    return items
+
+# --------------------------------------------------------------------------------------------------
+
+# Items follow the shape of a Session Series feed, with one item per super-event referenced by the
+# items from get_items(), and the same organisers, names and locations for the same arguments
+def get_superevents(num_superevents=1000, num_locations=100, num_organizers=10, seed=0):
+    rng = random.Random(seed)
+    locations = [get_location(location_idx, rng) for location_idx in range(num_locations)]
+    organizers = [get_organizer(organizer_idx) for organizer_idx in range(num_organizers)]
+
+    items = {}
+    for superevent_idx in range(num_superevents):
+        item_id = f'{superevent_idx}'
+        items[item_id] = {
+            'id': item_id,
+            'state': 'updated',
+            'kind': 'SessionSeries',
+            'modified': superevent_idx,
+            'data': {
+                '@context': 'https://openactive.io/',
+                '@type': 'SessionSeries',
+                '@id': f'{ORIGIN}/session-series/{superevent_idx}',
+                'organizer': organizers[superevent_idx % num_organizers],
+                'name': f'{ACTIVITIES[superevent_idx % len(ACTIVITIES)]} {superevent_idx}',
+                'location': locations[superevent_idx % num_locations],
+                'url': f'{ORIGIN}/session-series/{superevent_idx}',
+            },
+        }
+
+    return items
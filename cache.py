@@ -0,0 +1,170 @@
+import copy
+import json
+import os
+import sqlite3
+from contextlib import closing
+from time import time
+
+from ingest import opportunities_template
+from items import ItemStore
+
+# --------------------------------------------------------------------------------------------------
+
+CACHE_PATH = os.environ.get('OPENACTIVE_CACHE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'feeds.sqlite')
+CATALOGUE_PATH = os.path.join(os.path.dirname(CACHE_PATH), 'catalogue.json')
+MAX_BYTES_DEFAULT = 2 * 1024**3
+SECONDS_TTL_DEFAULT = 7 * 24 * 60 * 60
+
+# --------------------------------------------------------------------------------------------------
+
+# Feed items are stored against their feed URL along with the RPDE "next" URL of the last page read,
+# which is the high-water mark for that feed. On a repeat read we start from this URL rather than the
+# start of the feed, so only changes since the last read are downloaded. Items are upserted so that
+# they keep their original row order, which matches the order of the opportunities items dictionary.
+# The ETag and Last-Modified validators of the last page read are kept too, as JSON, so that the page
+# is only downloaded again if it has changed. This column is added to caches made before it existed.
+def get_connection(cache_path=CACHE_PATH):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    connection = sqlite3.connect(cache_path, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS feeds (
+            feed_url TEXT PRIMARY KEY,
+            next_url TEXT,
+            first_url_origin TEXT,
+            num_urls INTEGER,
+            num_bytes INTEGER,
+            time_created REAL,
+            time_accessed REAL,
+            last_page TEXT
+        )
+    ''')
+    try: connection.execute('ALTER TABLE feeds ADD COLUMN last_page TEXT')
+    except: pass
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            feed_url TEXT,
+            item_id TEXT,
+            item TEXT,
+            PRIMARY KEY (feed_url, item_id)
+        )
+    ''')
+
+    return connection
+
+# --------------------------------------------------------------------------------------------------
+
+# Returns the cached opportunities dictionary for a feed and its size in bytes, or None and 0 if the
+# feed isn't cached or has expired
+def get_opportunities(feed_url, seconds_ttl=SECONDS_TTL_DEFAULT, cache_path=CACHE_PATH):
+    with closing(get_connection(cache_path)) as connection:
+        with connection:
+            feed = connection.execute(
+                'SELECT next_url, first_url_origin, num_urls, num_bytes, time_created, last_page FROM feeds WHERE feed_url = ?',
+                (feed_url,),
+            ).fetchone()
+
+            if (feed is None):
+                return None, 0
+            elif (time() - feed[4] > seconds_ttl):
+                delete_feed(connection, feed_url)
+                return None, 0
+
+            connection.execute('UPDATE feeds SET time_accessed = ? WHERE feed_url = ?', (time(), feed_url))
+
+        opportunities = copy.deepcopy(opportunities_template)
+        opportunities['items'] = ItemStore()
+        opportunities['next_url'] = feed[0]
+        opportunities['first_url_origin'] = feed[1]
+        opportunities['num_urls'] = feed[2]
+        opportunities['last_page'] = json.loads(feed[5]) if (feed[5]) else None
+        for item_id,item in connection.execute('SELECT item_id, item FROM items WHERE feed_url = ? ORDER BY rowid', (feed_url,)):
+            opportunities['items'].set_raw(json.loads(item_id), item.encode())
+
+    return opportunities, feed[3]
+
+# --------------------------------------------------------------------------------------------------
+
+# Saves the changes from one feed page along with the new high-water mark, so that the cache is
+# always consistent with the pages read so far, even if a read is cancelled part way through
+def set_page(feed_url, opportunities, items_updated, ids_deleted, cache_path=CACHE_PATH):
+    rows = [(feed_url, json.dumps(item_id), json.dumps(item, separators=(',', ':'))) for item_id,item in items_updated.items()]
+    ids = [row[1] for row in rows] + [json.dumps(item_id) for item_id in ids_deleted]
+
+    with closing(get_connection(cache_path)) as connection:
+        with connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO feeds VALUES (?, ?, ?, ?, 0, ?, ?, NULL)',
+                (feed_url, '', '', 0, time(), time()),
+            )
+            num_bytes_old = 0
+            for ids_chunk in [ids[idx:idx+500] for idx in range(0, len(ids), 500)]:
+                num_bytes_old += connection.execute(
+                    'SELECT COALESCE(SUM(LENGTH(item)), 0) FROM items WHERE feed_url = ? AND item_id IN ({})'.format(','.join(['?'] * len(ids_chunk))),
+                    [feed_url] + ids_chunk,
+                ).fetchone()[0]
+            connection.executemany(
+                'INSERT INTO items VALUES (?, ?, ?) ON CONFLICT (feed_url, item_id) DO UPDATE SET item = excluded.item',
+                rows,
+            )
+            connection.executemany(
+                'DELETE FROM items WHERE feed_url = ? AND item_id = ?',
+                [(feed_url, json.dumps(item_id)) for item_id in ids_deleted],
+            )
+            connection.execute(
+                'UPDATE feeds SET next_url = ?, first_url_origin = ?, num_urls = ?, num_bytes = num_bytes + ?, time_accessed = ?, last_page = ? WHERE feed_url = ?',
+                (
+                    opportunities['next_url'],
+                    opportunities['first_url_origin'],
+                    opportunities['num_urls'],
+                    sum([len(row[2]) for row in rows]) - num_bytes_old,
+                    time(),
+                    json.dumps(opportunities.get('last_page')) if (opportunities.get('last_page')) else None,
+                    feed_url,
+                ),
+            )
+
+# --------------------------------------------------------------------------------------------------
+
+def delete_feed(connection, feed_url):
+    connection.execute('DELETE FROM items WHERE feed_url = ?', (feed_url,))
+    connection.execute('DELETE FROM feeds WHERE feed_url = ?', (feed_url,))
+
+# --------------------------------------------------------------------------------------------------
+
+# Removes expired feeds, and then the least recently used feeds until the total size is within max_bytes
+def evict(max_bytes=MAX_BYTES_DEFAULT, seconds_ttl=SECONDS_TTL_DEFAULT, cache_path=CACHE_PATH):
+    with closing(get_connection(cache_path)) as connection:
+        with connection:
+            feeds = connection.execute('SELECT feed_url, num_bytes, time_created FROM feeds ORDER BY time_accessed').fetchall()
+            num_bytes_total = sum([feed[1] for feed in feeds])
+            for feed_url,num_bytes,time_created in feeds:
+                if (    (time() - time_created > seconds_ttl)
+                    or  (num_bytes_total > max_bytes)
+                ):
+                    delete_feed(connection, feed_url)
+                    num_bytes_total -= num_bytes
+
+# --------------------------------------------------------------------------------------------------
+
+# The feeds found by the last read of the OpenActive data catalogue are kept with the time they were
+# read, so that the app can start with them straight away after a restart rather than waiting for the
+# catalogue to be read again. Returns None and None if there is no snapshot.
+def get_catalogue(catalogue_path=CATALOGUE_PATH):
+    try:
+        with open(catalogue_path) as f:
+            catalogue = json.load(f)
+        return catalogue['feeds'], catalogue['time_created']
+    except:
+        return None, None
+
+# --------------------------------------------------------------------------------------------------
+
+# The snapshot is written to a temporary file that then replaces the old one in a single step, so that
+# another process never reads a partly written snapshot
+def set_catalogue(feeds, time_created, catalogue_path=CATALOGUE_PATH):
+    os.makedirs(os.path.dirname(catalogue_path), exist_ok=True)
+    catalogue_path_temp = '{}.{}.tmp'.format(catalogue_path, os.getpid())
+    with open(catalogue_path_temp, 'w') as f:
+        json.dump({'time_created': time_created, 'feeds': feeds}, f)
+    os.replace(catalogue_path_temp, catalogue_path)
@@ -0,0 +1,376 @@
+import argparse
+import copy
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import re
+import shutil
+import tempfile
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from extract import COLUMNS, concat_highlights, get_highlights
+from ingest import get_next_url, get_opportunities_pages, opportunities_template, set_items
+
+# --------------------------------------------------------------------------------------------------
+
+FORMATS = ['parquet', 'csv']
+ROWS_PART_DEFAULT = 100000
+MAX_WORKERS_DEFAULT = os.cpu_count() or 1
+NUM_PAGES_AHEAD_PER_WORKER = 4
+SECONDS_TIMEOUT_DEFAULT = None # Feed URLs are read to the end however long they take, unless a timeout is given
+
+# Every part file has the same schema, even if a column is empty in one part but not in another, so
+# that all of the parts can be read back as one dataset
+SCHEMA = pa.schema([
+    ('ID', pa.string()),
+    ('Super-event ID', pa.string()),
+    ('Organizer name', pa.string()),
+    ('Organizer logo', pa.string()),
+    ('Name', pa.string()),
+    ('Location', pa.string()),
+    ('Lat', pa.float64()),
+    ('Lon', pa.float64()),
+    ('Date/time start', pa.timestamp('us')),
+    ('Date/time end', pa.timestamp('us')),
+    ('URL', pa.string()),
+])
+
+# --------------------------------------------------------------------------------------------------
+
+# Stands in for the items dictionary of an opportunities dictionary, but only keeps the "modified"
+# value of each item, which is all that set_items() needs to apply the RPDE update and delete rules.
+# This lets a feed be streamed through the same ingestion code as the app without holding its items.
+class ModifiedStore(MutableMapping):
+    def __init__(self):
+        self.modified = {}
+
+    def __getitem__(self, item_id):
+        return {'modified': self.modified[item_id]}
+
+    def __setitem__(self, item_id, item):
+        self.modified[item_id] = item['modified']
+
+    def __delitem__(self, item_id):
+        del(self.modified[item_id])
+
+    def __iter__(self):
+        return iter(self.modified)
+
+    def __len__(self):
+        return len(self.modified)
+
+    def __contains__(self, item_id):
+        return item_id in self.modified
+
+# --------------------------------------------------------------------------------------------------
+
+def get_feed_name(source):
+    name = source.rstrip('/').split('://')[-1] if ('://' in source) else os.path.basename(os.path.abspath(source))
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or 'feed'
+
+# --------------------------------------------------------------------------------------------------
+
+# Saved pages are read in natural order of their file names, so that e.g. page-2.json comes before
+# page-10.json
+def get_page_paths(pages_dir):
+    return sorted(
+        [os.path.join(pages_dir, x) for x in os.listdir(pages_dir) if (x.endswith('.json'))],
+        key=lambda x: [int(part) if (part.isdigit()) else part for part in re.split(r'(\d+)', os.path.basename(x))],
+    )
+
+# --------------------------------------------------------------------------------------------------
+
+# A directory source may either hold the saved pages of one feed, or subdirectories that each hold the
+# saved pages of one feed
+def get_sources(sources):
+    sources_out = []
+    for source in sources:
+        if (    (os.path.isdir(source))
+            and (not get_page_paths(source))
+        ):
+            sources_out.extend(sorted([os.path.join(source, x) for x in os.listdir(source) if (os.path.isdir(os.path.join(source, x)))]))
+        else:
+            sources_out.append(source)
+    return sources_out
+
+# --------------------------------------------------------------------------------------------------
+
+# Decodes one saved page and extracts the highlights of its updated items, which is the slow part of
+# reading saved pages, and so is run in worker processes. Each item is given by its position in the
+# page, along with the fields needed to apply the RPDE rules, which has to be done in page order.
+def extract_page(page_path):
+    with open(page_path, 'rb') as f:
+        page = json.load(f)
+
+    records = []
+    items_updated = {}
+    for position,item in enumerate(page['items']):
+        if (    (type(item) == dict)
+            and (all([key in item.keys() for key in ['id', 'state', 'modified']]))
+        ):
+            records.append({'id': item['id'], 'state': item['state'], 'modified': item['modified'], 'position': position})
+            if (item['state'] == 'updated'):
+                items_updated[position] = item
+
+    return records, get_highlights(items_updated)
+
+# --------------------------------------------------------------------------------------------------
+
+# Like executor.map(), but with no more than num_ahead calls queued or finished and not yet taken, so
+# that memory doesn't grow when the results are used more slowly than they are made
+def map_bounded(executor, function, args, num_ahead):
+    futures = deque()
+    for arg in args:
+        futures.append(executor.submit(function, arg))
+        if (len(futures) >= num_ahead):
+            yield futures.popleft().result()
+    while (futures):
+        yield futures.popleft().result()
+
+# --------------------------------------------------------------------------------------------------
+
+# A page that can't be fetched ends the feed without being yielded, so this is raised as an error
+# rather than the feed looking as if it had ended there
+def get_pages_url(feed_url, seconds_timeout=SECONDS_TIMEOUT_DEFAULT):
+    opportunities = copy.deepcopy(opportunities_template)
+    opportunities['items'] = ModifiedStore()
+    opportunities['next_url'] = get_next_url(feed_url, opportunities)
+
+    for opportunities, items_updated, ids_deleted in get_opportunities_pages(opportunities, seconds_timeout=seconds_timeout):
+        yield (get_highlights(items_updated) if (items_updated) else None), ids_deleted, opportunities
+
+    if (opportunities['status'] == 'ERROR'):
+        raise Exception(f"{opportunities['next_url']}: Page could not be read")
+
+# --------------------------------------------------------------------------------------------------
+
+def get_pages_dir(pages_dir, executor=None, max_workers=MAX_WORKERS_DEFAULT):
+    opportunities = copy.deepcopy(opportunities_template)
+    opportunities['items'] = ModifiedStore()
+
+    page_paths = get_page_paths(pages_dir)
+    if (executor is None):
+        pages = map(extract_page, page_paths)
+    else:
+        pages = map_bounded(executor, extract_page, page_paths, max_workers * NUM_PAGES_AHEAD_PER_WORKER)
+
+    for records, df in pages:
+        items_updated, ids_deleted = set_items(opportunities, records)
+        opportunities['num_urls'] += 1
+        df_page = None
+        if (items_updated):
+            rows = pd.Index(df['ID']).get_indexer([record['position'] for record in items_updated.values()])
+            df_page = df.take(rows)
+            df_page['ID'] = pd.Series(list(items_updated.keys()), dtype=object, index=df_page.index)
+        yield df_page, ids_deleted, opportunities
+
+    opportunities['status'] = 'COMPLETE'
+
+# --------------------------------------------------------------------------------------------------
+
+# Yields the highlights of the items updated by each page of a feed, along with the IDs of the items
+# deleted by the page and the opportunities dictionary so far, whose items only hold the "modified"
+# value of each item. The source is a feed URL or a directory of saved feed pages. A feed URL that
+# takes longer than seconds_timeout to read ends with the status TIMEOUT.
+def get_highlights_pages(source, executor=None, max_workers=MAX_WORKERS_DEFAULT, seconds_timeout=SECONDS_TIMEOUT_DEFAULT):
+    if (os.path.isdir(source)):
+        return get_pages_dir(source, executor, max_workers)
+    return get_pages_url(source, seconds_timeout)
+
+# --------------------------------------------------------------------------------------------------
+
+# Returns the highlights of a whole feed as one DataFrame, the same as the table in the app before its
+# display changes. Memory grows with the size of the feed, so use export_feed() for large feeds.
+def get_feed_highlights(source):
+    dfs = []
+    for df_page, ids_deleted, opportunities in get_highlights_pages(source):
+        if (df_page is not None):
+            dfs.append(df_page)
+    if (not dfs):
+        return pd.DataFrame(columns=COLUMNS)
+    return concat_highlights(dfs, opportunities['items'].keys())
+
+# --------------------------------------------------------------------------------------------------
+
+# Writes the highlights of one feed as a series of part files of up to rows_part rows each, so that
+# only one part is held in memory at a time. Rows are buffered until there are enough for a part, and
+# an item that is updated again or deleted after its part is written has that part marked as stale.
+# Stale parts are rewritten without their out-of-date rows once the whole feed has been read.
+class PartWriter():
+    def __init__(self, output_dir, file_format='parquet', rows_part=ROWS_PART_DEFAULT):
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.rows_part = rows_part
+        self.dfs = []
+        self.num_rows_buffered = 0
+        self.ids_deleted_buffered = set()
+        self.part_idxs = {}
+        self.ids_stale = {}
+        self.num_parts = 0
+        self.num_rows = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def get_part_path(self, part_idx):
+        return os.path.join(self.output_dir, 'part-{:05d}.{}'.format(part_idx, self.file_format))
+
+    def set_stale(self, item_id):
+        part_idx = self.part_idxs.pop(str(item_id), None)
+        if (part_idx is not None):
+            self.ids_stale.setdefault(part_idx, set()).add(str(item_id))
+            self.num_rows -= 1
+
+    # Deletions are applied before updates, as an item deleted and then updated again in the same page
+    # is in both
+    def add_page(self, df_page, ids_deleted):
+        for item_id in ids_deleted:
+            self.set_stale(item_id)
+            self.ids_deleted_buffered.add(item_id)
+        if (df_page is not None):
+            for item_id in df_page['ID']:
+                self.set_stale(item_id)
+            self.ids_deleted_buffered.difference_update(df_page['ID'])
+            self.dfs.append(df_page)
+            self.num_rows_buffered += len(df_page)
+        if (self.num_rows_buffered >= self.rows_part):
+            self.flush()
+
+    def write(self, df, part_path):
+        if (self.file_format == 'parquet'):
+            df.to_parquet(part_path, schema=SCHEMA, index=False)
+        else:
+            df.to_csv(part_path, index=False)
+
+    def flush(self):
+        if (not self.dfs):
+            return
+        df = pd.concat(self.dfs, ignore_index=True).drop_duplicates('ID', keep='last')
+        df = df.loc[~df['ID'].isin(self.ids_deleted_buffered)]
+        df['ID'] = df['ID'].astype(str)
+        df['Organizer name'] = df['Organizer name'].astype(object)
+        if (len(df) > 0):
+            self.write(df, self.get_part_path(self.num_parts))
+            self.part_idxs.update(dict.fromkeys(df['ID'], self.num_parts))
+            self.num_parts += 1
+            self.num_rows += len(df)
+        self.dfs = []
+        self.num_rows_buffered = 0
+        self.ids_deleted_buffered = set()
+
+    # CSV parts are read back as text, so that the rows that are kept are written out exactly as before
+    def close(self):
+        self.flush()
+        for part_idx,ids_stale in self.ids_stale.items():
+            part_path = self.get_part_path(part_idx)
+            if (self.file_format == 'parquet'):
+                df = pd.read_parquet(part_path)
+            else:
+                df = pd.read_csv(part_path, dtype=str, keep_default_na=False)
+            df = df.loc[~df['ID'].isin(ids_stale)]
+            if (len(df) > 0):
+                self.write(df, part_path)
+            else:
+                os.remove(part_path)
+        self.ids_stale = {}
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads one feed, from its URL or a directory of its saved pages, and writes its highlights to
+# output_dir/feed=<name>/ as numbered part files, so that the output of many feeds can be read back
+# as one partitioned dataset, e.g. with pd.read_parquet(output_dir). The parts are written to a hidden
+# temporary directory, which only replaces the feed's directory from any earlier export once the whole
+# feed has been read, so that a re-run never leaves parts from an earlier run behind, and a failed or
+# timed out read leaves the earlier export as it was. Returns a summary of the export, whose status is
+# COMPLETE, TIMEOUT or the error, with no rows or parts unless it's COMPLETE.
+def export_feed(source, output_dir, file_format='parquet', rows_part=ROWS_PART_DEFAULT, executor=None, max_workers=MAX_WORKERS_DEFAULT, seconds_timeout=SECONDS_TIMEOUT_DEFAULT):
+    time_start = perf_counter()
+    feed_name = get_feed_name(source)
+    feed_dir = os.path.join(output_dir, 'feed={}'.format(feed_name))
+    os.makedirs(output_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix='.feed={}-'.format(feed_name), dir=output_dir)
+    part_writer = PartWriter(temp_dir, file_format, rows_part)
+
+    num_pages = 0
+    status = 'COMPLETE'
+    try:
+        for df_page, ids_deleted, opportunities in get_highlights_pages(source, executor, max_workers, seconds_timeout):
+            part_writer.add_page(df_page, ids_deleted)
+            num_pages += 1
+            status = opportunities['status'] or 'COMPLETE'
+        if (status == 'COMPLETE'):
+            part_writer.close()
+            replace_dir(temp_dir, feed_dir)
+    except Exception as e:
+        status = 'ERROR: {}'.format(e)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        'source': source,
+        'feed': feed_name,
+        'status': status,
+        'pages': num_pages,
+        'rows': part_writer.num_rows if (status == 'COMPLETE') else 0,
+        'parts': part_writer.num_parts if (status == 'COMPLETE') else 0,
+        'seconds': perf_counter() - time_start,
+    }
+
+# A directory can't be renamed over one that isn't empty, so the old one is moved aside first
+def replace_dir(source_dir, target_dir):
+    old_dir = None
+    if (os.path.exists(target_dir)):
+        old_dir = tempfile.mkdtemp(prefix='.old-', dir=os.path.dirname(target_dir))
+        os.replace(target_dir, os.path.join(old_dir, 'feed'))
+    os.replace(source_dir, target_dir)
+    if (old_dir is not None):
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+# --------------------------------------------------------------------------------------------------
+
+# Exports many feeds using a pool of worker processes. Feed URLs have to be read one page after
+# another, so each one is exported by a single worker, with the feeds shared out across the workers.
+# Saved pages can be read in any order, so each directory of saved pages is exported in turn, with its
+# pages decoded and extracted by all of the workers and the results put back in page order.
+def export_feeds(sources, output_dir, file_format='parquet', rows_part=ROWS_PART_DEFAULT, max_workers=MAX_WORKERS_DEFAULT, seconds_timeout=SECONDS_TIMEOUT_DEFAULT):
+    sources = get_sources(sources)
+    summaries = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            source: executor.submit(export_feed, source, output_dir, file_format, rows_part, seconds_timeout=seconds_timeout)
+            for source in sources
+            if (not os.path.isdir(source))
+        }
+        for source in sources:
+            if (os.path.isdir(source)):
+                summaries[source] = export_feed(source, output_dir, file_format, rows_part, executor, max_workers)
+        for source,future in futures.items():
+            summaries[source] = future.result()
+
+    return [summaries[source] for source in sources]
+
+# --------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the table highlights of OpenActive feeds, read from their URLs or from directories of saved feed pages, as partitioned Parquet or CSV files')
+    parser.add_argument('sources', nargs='+', help='Feed URLs, directories of saved feed pages as JSON files, or directories of such directories')
+    parser.add_argument('--output', required=True, help='Directory to write to, with a feed=<name> subdirectory per feed')
+    parser.add_argument('--format', choices=FORMATS, default='parquet')
+    parser.add_argument('--rows-per-part', type=int, default=ROWS_PART_DEFAULT)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS_DEFAULT)
+    parser.add_argument('--timeout', type=float, default=SECONDS_TIMEOUT_DEFAULT, help='Seconds after which to stop reading a feed URL and report it as TIMEOUT, with no limit by default')
+    args = parser.parse_args()
+
+    summaries = export_feeds(args.sources, args.output, args.format, args.rows_per_part, args.workers, args.timeout)
+
+    print(f"{'rows':>10} {'pages':>7} {'parts':>6} {'seconds':>9}  {'status':<10} feed")
+    for summary in summaries:
+        print(f"{summary['rows']:>10} {summary['pages']:>7} {summary['parts']:>6} {summary['seconds']:>9.2f}  {summary['status']:<10} {summary['feed']}")
+
+# --------------------------------------------------------------------------------------------------
+
+if (__name__ == '__main__'):
+    main()
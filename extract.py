@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+# --------------------------------------------------------------------------------------------------
+
+COLUMNS = [
+    'ID',
+    'Super-event ID',
+    'Organizer name',
+    'Organizer logo',
+    'Name',
+    'Location',
+    'Lat',
+    'Lon',
+    'Date/time start',
+    'Date/time end',
+    'URL',
+]
+ADDRESS_PARTS_TYPES = ['streetAddress', 'addressLocality', 'addressRegion', 'postalCode', 'addressCountry']
+LOCATIONS_CACHE_SIZE = 100000
+DATETIMES_CACHE_SIZE = 100000
+
+# Matches a UTC offset at the end of a date/time, keeping the time before it as the first group. The
+# time has to be matched too, so that the day of a date on its own isn't taken for a negative offset.
+DATETIME_OFFSET_PATTERN = r'([T ][\d:.,]+)(?:Z|[+-]\d{2}(?::?\d{2})?)$'
+
+# --------------------------------------------------------------------------------------------------
+
+# Locations are shared by many items in a feed, typically one per venue, so the address text is built
+# once per distinct location and then reused. The location is reduced to a key of just the fields that
+# go into the text, and the text is cached against this key in a bounded LRU cache, which also counts
+# the hits and misses. Fields that aren't strings are skipped when building the text, as before, and
+# the rare key that can't be hashed, because a field is a list or a dict, isn't cached.
+def get_location_key(location_in):
+    address = location_in.get('address')
+    if (type(address) != dict):
+        address = {}
+    return (location_in.get('name'),) + tuple([address.get(address_parts_type) for address_parts_type in ADDRESS_PARTS_TYPES])
+
+# --------------------------------------------------------------------------------------------------
+
+def get_location_text_uncached(location_key):
+    name = location_key[0]
+    location_out = [name.strip()] if (type(name) == str) else []
+
+    for address_parts in location_key[1:]:
+        if (type(address_parts) == str):
+            location_out.extend(address_parts.strip().split(','))
+
+    return ',\n'.join(dict.fromkeys(location_out)) or None
+
+# --------------------------------------------------------------------------------------------------
+
+get_location_text = lru_cache(maxsize=LOCATIONS_CACHE_SIZE)(get_location_text_uncached)
+
+# --------------------------------------------------------------------------------------------------
+
+def set_location(location_in):
+    location_key = get_location_key(location_in)
+    try: return get_location_text(location_key)
+    except TypeError: return get_location_text_uncached(location_key)
+
+# --------------------------------------------------------------------------------------------------
+
+def set_datetime(datetime_isoformat):
+    try: return datetime.fromisoformat(datetime_isoformat)
+    except: return None
+
+# --------------------------------------------------------------------------------------------------
+
+# A simple thread-safe LRU cache that is read and written in batches, for values that are computed in
+# bulk rather than one at a time
+class LRUCache():
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_many(self, keys):
+        values = {}
+        with self.lock:
+            for key in keys:
+                if (key in self.values):
+                    self.values.move_to_end(key)
+                    values[key] = self.values[key]
+        return values
+
+    def set_many(self, values):
+        with self.lock:
+            self.values.update(values)
+            while (len(self.values) > self.max_size):
+                self.values.popitem(last=False)
+
+# --------------------------------------------------------------------------------------------------
+
+datetimes_cache = LRUCache(DATETIMES_CACHE_SIZE)
+
+# --------------------------------------------------------------------------------------------------
+
+# Each highlight field is read once per item and appended to a plain list for its column, and the
+# DataFrame is then built in one go from these lists. This is much faster than pre-allocating a
+# DataFrame and setting it one cell at a time, which has a large overhead per call.
+def get_highlights(items):
+    columns = {column: [] for column in COLUMNS}
+
+    for item_id,item in items.items():
+        columns['ID'].append(item_id)
+
+        try: data = item['data']
+        except: data = None
+        try: superevent = data['superEvent']
+        except: superevent = None
+        try: location = data['location']
+        except: location = None
+
+        # This may be type str or dict, depending on context. We are currently only looking for the
+        # str version, and the dict version should be passed over.
+        try: columns['Super-event ID'].append(superevent.split('/')[-1])
+        except: columns['Super-event ID'].append(None)
+        try: columns['Organizer name'].append(data['organizer']['name'].strip())
+        except:
+            try: columns['Organizer name'].append(superevent['organizer']['name'].strip())
+            except: columns['Organizer name'].append(None)
+        try: columns['Organizer logo'].append(data['organizer']['logo']['url'].strip())
+        except:
+            try: columns['Organizer logo'].append(superevent['organizer']['logo']['url'].strip())
+            except: columns['Organizer logo'].append(None)
+        try: columns['Name'].append(data['name'].strip())
+        except: columns['Name'].append(None)
+        try: columns['Location'].append(set_location(location))
+        except: columns['Location'].append(None)
+        try: columns['Lat'].append(float(location['geo']['latitude']))
+        except: columns['Lat'].append(None)
+        try: columns['Lon'].append(float(location['geo']['longitude']))
+        except: columns['Lon'].append(None)
+        try: columns['Date/time start'].append(data['startDate'].strip())
+        except: columns['Date/time start'].append(None)
+        try: columns['Date/time end'].append(data['endDate'].strip())
+        except: columns['Date/time end'].append(None)
+        try: columns['URL'].append(data['url'].strip())
+        except: columns['URL'].append(None)
+
+    return get_highlights_df(columns)
+
+# --------------------------------------------------------------------------------------------------
+
+def get_highlights_df(columns):
+    num_items = len(columns['ID'])
+
+    df = pd.DataFrame({
+        'ID': pd.Series(columns['ID'], dtype=object),
+        'Super-event ID': pd.Series(columns['Super-event ID'], dtype=object),
+        'Organizer name': pd.Series(columns['Organizer name'], dtype='category'),
+        'Organizer logo': pd.Series(columns['Organizer logo'], dtype=object),
+        'Name': pd.Series(columns['Name'], dtype=object),
+        'Location': pd.Series(columns['Location'], dtype=object),
+        'Lat': pd.Series(columns['Lat'], dtype='float64'),
+        'Lon': pd.Series(columns['Lon'], dtype='float64'),
+        'Date/time start': get_datetimes(columns['Date/time start']),
+        'Date/time end': get_datetimes(columns['Date/time end']),
+        'URL': pd.Series(columns['URL'], dtype=object),
+    })
+    df.index = range(1, num_items+1)
+
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+# Feeds can mix UTC offsets between items, which pandas can't hold in a single datetime64 column
+# without converting everything to UTC. We instead keep the local wall-clock time as given in the
+# feed, which is what is shown in the table and used for the date filter. The offsets are removed and
+# the date/times are then parsed together in one call, which is much faster than parsing them one at a
+# time. Anything that pandas can't parse is tried again with datetime.fromisoformat, as before. They
+# are held to the microsecond, as datetime is, rather than to the nanosecond, which only reaches from
+# 1677 to 2262 and so can't hold open-ended dates such as 9999-12-31.
+def parse_datetimes(datetimes_isoformat):
+    datetimes = pd.to_datetime(
+        pd.Series(datetimes_isoformat, dtype=object).str.replace(DATETIME_OFFSET_PATTERN, r'\1', regex=True),
+        format='ISO8601',
+        errors='coerce',
+    ).astype('datetime64[us]')
+
+    for idx in np.flatnonzero(datetimes.isna().to_numpy()):
+        datetime_parsed = set_datetime(datetimes_isoformat[idx])
+        if (datetime_parsed):
+            datetimes.iat[idx] = datetime_parsed.replace(tzinfo=None)
+
+    return datetimes.to_numpy()
+
+# --------------------------------------------------------------------------------------------------
+
+# Items in a feed often share the same few start and end times, so each distinct date/time string is
+# only parsed once per call, and also cached between calls, as a feed is extracted a page at a time.
+# Hits and misses are counted per item.
+def get_datetimes(datetimes_isoformat):
+    datetimes_isoformat = pd.Series(datetimes_isoformat, dtype=object)
+    keys = datetimes_isoformat.dropna().unique()
+
+    datetimes = datetimes_cache.get_many(keys)
+    keys_missed = [key for key in keys if (key not in datetimes)]
+    if (keys_missed):
+        datetimes_missed = dict(zip(keys_missed, parse_datetimes(keys_missed)))
+        datetimes_cache.set_many(datetimes_missed)
+        datetimes.update(datetimes_missed)
+
+    datetimes_cache.misses += len(keys_missed)
+    datetimes_cache.hits += int(datetimes_isoformat.notna().sum()) - len(keys_missed)
+
+    return datetimes_isoformat.map(datetimes).astype('datetime64[us]')
+
+# --------------------------------------------------------------------------------------------------
+
+def get_hit_rate(hits, misses):
+    return (hits / (hits + misses)) if (hits + misses) else None
+
+# --------------------------------------------------------------------------------------------------
+
+# Hits, misses and sizes of the location and date/time parsing caches since the process started
+def get_parse_stats():
+    locations_info = get_location_text.cache_info()
+    return {
+        'locations': {
+            'hits': locations_info.hits,
+            'misses': locations_info.misses,
+            'hit_rate': get_hit_rate(locations_info.hits, locations_info.misses),
+            'size': locations_info.currsize,
+        },
+        'datetimes': {
+            'hits': datetimes_cache.hits,
+            'misses': datetimes_cache.misses,
+            'hit_rate': get_hit_rate(datetimes_cache.hits, datetimes_cache.misses),
+            'size': len(datetimes_cache),
+        },
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+# Combines highlights extracted from successive feed pages. An item can be updated on a later page,
+# in which case its latest row is kept, or deleted, in which case it won't be in item_ids. Rows are
+# returned in the order of item_ids, which is the order of the opportunities items dictionary.
+def concat_highlights(dfs, item_ids):
+    df = pd.concat(dfs, ignore_index=True).drop_duplicates('ID', keep='last')
+    df = df.set_index('ID').reindex(pd.Index(list(item_ids), dtype=object)).reset_index(names='ID')
+    df = df[COLUMNS]
+    df['Organizer name'] = df['Organizer name'].astype('category')
+    df.index = range(1, len(df)+1)
+
+    return df
@@ -0,0 +1,182 @@
+import bisect
+import numpy as np
+import pandas as pd
+import re
+from collections import defaultdict
+from itertools import chain
+from sys import getsizeof
+
+# --------------------------------------------------------------------------------------------------
+
+TEXT_COLUMNS = ['Organiser', 'Name', 'Location']
+TOP_N_DEFAULT = 1000
+TOKEN_PATTERN = r'\w+'
+
+# --------------------------------------------------------------------------------------------------
+
+def get_tokens(text):
+    return re.findall(TOKEN_PATTERN, str(text).lower())
+
+# --------------------------------------------------------------------------------------------------
+
+# Value counts and text search for the sidebar filters, built once when a feed is loaded from the
+# codes of a FilterIndex, so that the filter widgets only need to be sent the most common options
+# rather than every distinct value. The count of each value is the length of its slice of rows in the
+# filter index, and the values are ranked by count once. For the text columns, each distinct value is
+# split into lowercase word tokens, and each token is mapped to the codes of the values that contain
+# it, as an inverted index held in flat arrays. A search word matches any token that it's the start of,
+# which is a binary search in the sorted tokens, so that words are matched as they're typed. The other
+# columns, such as the IDs, have their values sorted instead, to be searched by how they start.
+class FacetIndex():
+    def __init__(self, filter_index, text_columns=TEXT_COLUMNS):
+        self.filter_index = filter_index
+        self.text_columns = text_columns
+        self.facets = {}
+        for column,column_index in filter_index.columns.items():
+            counts = np.diff(column_index['offsets']).astype(np.int32)
+            self.facets[column] = {
+                'values': column_index['values'],
+                'counts': counts,
+                'ranked': np.argsort(-counts, kind='stable').astype(np.int32),
+            }
+            if (column in text_columns):
+                self.facets[column].update(self.get_token_index(column_index['values']))
+            else:
+                self.facets[column].update(self.get_sorted_index(column_index['values']))
+
+    @staticmethod
+    def get_token_index(values):
+        postings = defaultdict(list)
+        for code,value in enumerate(values):
+            for token in set(get_tokens(value)):
+                postings[token].append(code)
+        tokens = sorted(postings.keys())
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(postings[token]) for token in tokens], out=offsets[1:])
+        return {
+            'tokens': tokens,
+            'postings_offsets': offsets,
+            'postings': np.fromiter(chain.from_iterable([postings[token] for token in tokens]), dtype=np.int32, count=offsets[-1]),
+        }
+
+    @staticmethod
+    def get_sorted_index(values):
+        values = values.astype(str)
+        codes_sorted = np.argsort(values.to_numpy(dtype=object), kind='stable').astype(np.int32)
+        return {
+            'values_sorted': list(values[codes_sorted]),
+            'codes_sorted': codes_sorted,
+        }
+
+    @property
+    def num_bytes(self):
+        num_bytes = 0
+        for facet in self.facets.values():
+            num_bytes += facet['counts'].nbytes + facet['ranked'].nbytes
+            if ('tokens' in facet):
+                num_bytes += getsizeof(facet['tokens']) + sum([getsizeof(token) for token in facet['tokens']])
+                num_bytes += facet['postings_offsets'].nbytes + facet['postings'].nbytes
+            else:
+                num_bytes += getsizeof(facet['values_sorted']) + facet['codes_sorted'].nbytes
+        return num_bytes
+
+    def get_num_values(self, column):
+        return len(self.facets[column]['values'])
+
+    # Returns a label for each value with its count, as a dictionary to look up the labels of the
+    # options shown in a filter. counts is an optional array of counts by code in place of the counts in
+    # the whole dataset, as from get_counts_adaptive().
+    def get_labels(self, column, values, counts=None):
+        facet = self.facets[column]
+        counts = facet['counts'] if (counts is None) else counts
+        codes = facet['values'].get_indexer(pd.Index(values, dtype=object))
+        counts = np.where(codes >= 0, counts[codes], 0)
+        return {value: '{} ({:,})'.format(value, count) for value,count in zip(values, counts)}
+
+    # Returns the counts of the values of each column in the rows that pass the other filters, for
+    # adaptive filters, given the filter masks from FilterIndex.get_masks(). A column's own selection is
+    # left out, so that more of its values can still be chosen. The masks of the other filters are
+    # intersected, and the codes of the column in the remaining rows are counted with a bincount, rather
+    # than finding the distinct values of a filtered DataFrame. Columns without a selection of their own
+    # share the intersection of all of the masks.
+    def get_counts_adaptive(self, masks):
+        counts = {}
+        rows_all = None
+        for column,facet in self.facets.items():
+            masks_other = [rows_mask for key,rows_mask in masks.items() if (key != column)]
+            if (not masks_other):
+                counts[column] = facet['counts']
+                continue
+            if (column not in masks):
+                if (rows_all is None):
+                    rows_all = np.logical_and.reduce(masks_other)
+                rows = rows_all
+            else:
+                rows = np.logical_and.reduce(masks_other)
+            codes = self.filter_index.columns[column]['codes'][rows]
+            counts[column] = np.bincount(codes[codes >= 0], minlength=len(facet['values'])).astype(np.int32)
+        return counts
+
+    # The codes of the values with a token that starts with the word, with a spare False at the end, so
+    # that the code -1 of a missing value can index the mask directly
+    def get_codes_mask(self, column, word):
+        facet = self.facets[column]
+        mask = np.zeros(len(facet['values']) + 1, dtype=bool)
+        idx_start = bisect.bisect_left(facet['tokens'], word)
+        idx_end = bisect.bisect_left(facet['tokens'], word + chr(0x10ffff))
+        mask[facet['postings'][facet['postings_offsets'][idx_start]:facet['postings_offsets'][idx_end]]] = True
+        return mask
+
+    # Columns without a token index, such as the IDs, are searched for values that start with the text,
+    # in a sorted copy of the values
+    def get_codes_prefix(self, column, text):
+        facet = self.facets[column]
+        idx_start = bisect.bisect_left(facet['values_sorted'], text)
+        idx_end = bisect.bisect_left(facet['values_sorted'], text + chr(0x10ffff))
+        return facet['codes_sorted'][idx_start:idx_end]
+
+    # Returns the options to show for a filter, which are the values already selected followed by up to
+    # top_n others. Without search text these are the most common values. With search text, for the text
+    # columns these are the values that match the most search words, and then the most common of those,
+    # and for other columns these are the most common values that start with the text. For adaptive
+    # filters, counts is the array of counts in the rows that pass the other filters, which already
+    # include the search, and the options are the most common values with any of these rows. Only the top
+    # values are partitioned out and sorted, as a column can have as many values as there are rows.
+    def get_options(self, column, text='', selected=[], top_n=TOP_N_DEFAULT, counts=None):
+        facet = self.facets[column]
+        words = get_tokens(text)
+        if (counts is not None):
+            codes = np.flatnonzero(counts)
+            num_codes = top_n + len(selected)
+            if (len(codes) > num_codes):
+                codes = codes[np.argpartition(-counts[codes], num_codes - 1)[:num_codes]]
+            codes = codes[np.lexsort((codes, -counts[codes]))]
+        elif (not words):
+            codes = facet['ranked'][:top_n + len(selected)]
+        elif (column in self.text_columns):
+            num_words = np.sum([self.get_codes_mask(column, word)[:-1] for word in words], axis=0, dtype=np.int32)
+            codes = np.flatnonzero(num_words)
+            codes = codes[np.lexsort((-facet['counts'][codes], -num_words[codes]))][:top_n + len(selected)]
+        else:
+            codes = self.get_codes_prefix(column, text.strip())
+            codes = codes[np.argsort(-facet['counts'][codes], kind='stable')][:top_n + len(selected)]
+
+        options = list(selected)
+        selected = set(selected)
+        for value in facet['values'][codes]:
+            if (len(options) - len(selected) >= top_n):
+                break
+            if (value not in selected):
+                options.append(value)
+        return options
+
+    # Returns a boolean array of the rows that have every search word in at least one of the text
+    # columns, or None if there are no search words
+    def get_rows_text(self, text):
+        rows = None
+        for word in get_tokens(text):
+            rows_word = np.zeros(self.filter_index.num_rows, dtype=bool)
+            for column in self.text_columns:
+                rows_word |= self.get_codes_mask(column, word)[self.filter_index.columns[column]['codes']]
+            rows = rows_word if (rows is None) else (rows & rows_word)
+        return rows
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------------------------
+
+COLUMNS = ['ID', 'Super-event ID', 'Organiser', 'Name', 'Location']
+
+# --------------------------------------------------------------------------------------------------
+
+# Row lookups for the sidebar filters, built once when a feed is loaded, so that changing a filter
+# doesn't mean scanning and copying the whole DataFrame for each one. For each filter column, every
+# distinct value is given an integer code, and the row positions are sorted by code so that the rows
+# for any value are one contiguous slice. For the dates, the row positions are sorted by start and by
+# end date/time, so that the rows in a date range are found by binary search. Each active filter then
+# marks its rows in a boolean array, and the arrays are combined to give the final rows to take.
+class FilterIndex():
+    def __init__(self, df):
+        self.num_rows = len(df)
+        self.columns = {}
+        for column in COLUMNS:
+            codes, values = pd.factorize(df[column], use_na_sentinel=True)
+            codes = codes.astype(np.int32)
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            self.columns[column] = {
+                'values': pd.Index(values, dtype=object),
+                'codes': codes,
+                'order': order,
+                'offsets': offsets,
+            }
+        self.datetimes = {}
+        for column in ['Date/time start', 'Date/time end']:
+            datetimes = df[column].to_numpy(dtype='datetime64[us]')
+            order = np.argsort(datetimes, kind='stable').astype(np.int32)
+            datetimes_sorted = datetimes[order]
+            self.datetimes[column] = {
+                'order': order,
+                'datetimes_sorted': datetimes_sorted,
+                'num_nat': int(np.isnat(datetimes_sorted).sum()),
+            }
+
+    @property
+    def num_bytes(self):
+        num_bytes = 0
+        for column in self.columns.values():
+            num_bytes += column['codes'].nbytes + column['order'].nbytes + column['offsets'].nbytes
+        for column in self.datetimes.values():
+            num_bytes += column['order'].nbytes + column['datetimes_sorted'].nbytes
+        return num_bytes
+
+    def get_rows(self, column, values):
+        column = self.columns[column]
+        codes = [code for code in column['values'].get_indexer(pd.Index(values, dtype=object)) if (code >= 0)]
+        return np.concatenate([column['order'][column['offsets'][code]:column['offsets'][code+1]] for code in codes] or [np.array([], dtype=np.int32)])
+
+    # NaT sorts after all other values, so is excluded from the end rows by the binary search, but has
+    # to be skipped explicitly for the start rows
+    def get_rows_dates(self, date_min, date_max):
+        start = self.datetimes['Date/time start']
+        end = self.datetimes['Date/time end']
+        idx_start = np.searchsorted(start['datetimes_sorted'], np.datetime64(date_min, 'us'), side='left')
+        idx_end = np.searchsorted(end['datetimes_sorted'], np.datetime64(date_max, 'us') + np.timedelta64(1, 'D'), side='left')
+
+        rows = np.zeros(self.num_rows, dtype=bool)
+        rows[start['order'][idx_start:self.num_rows-start['num_nat']]] = True
+        rows_end = np.zeros(self.num_rows, dtype=bool)
+        rows_end[end['order'][:idx_end]] = True
+
+        return rows & rows_end
+
+    # Returns a boolean array of rows for each active filter, by column for the value filters, and as
+    # 'Date/time' for the dates. filters maps each column to its selected values, and dates_range is a
+    # tuple of one or two dates, which are the first and last dates to include. rows is an optional
+    # boolean array of the rows already chosen in some other way, such as by a text search, and is kept
+    # as 'Rows'. The arrays are kept apart so that the rows of all but one filter can be found too.
+    def get_masks(self, filters, dates_range, rows=None):
+        masks = {}
+
+        if (rows is not None):
+            masks['Rows'] = rows
+
+        for column,values in filters.items():
+            if (values):
+                rows_column = np.zeros(self.num_rows, dtype=bool)
+                rows_column[self.get_rows(column, values)] = True
+                masks[column] = rows_column
+
+        if (dates_range):
+            masks['Date/time'] = self.get_rows_dates(dates_range[0], dates_range[-1])
+
+        return masks
+
+    # Returns the positions of the rows that pass all of the given filter masks, or None if there are none
+    @staticmethod
+    def get_positions_masks(masks):
+        rows = None
+        for rows_mask in masks.values():
+            rows = rows_mask if (rows is None) else (rows & rows_mask)
+        return None if (rows is None) else np.flatnonzero(rows)
+
+    # Returns the positions of the rows that pass all of the given filters, or None if no filters are
+    # active, with the arguments as for get_masks()
+    def get_positions(self, filters, dates_range, rows=None):
+        return self.get_positions_masks(self.get_masks(filters, dates_range, rows))
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------------------------
+
+VENUES_AGGREGATE = 5000
+GRID_CELLS_ACROSS = 200
+NUM_LOCATIONS_TOOLTIP = 5
+
+# --------------------------------------------------------------------------------------------------
+
+def get_locations_text(locations):
+    locations = [x for x in locations if x]
+    text = '\n\n'.join(locations[:NUM_LOCATIONS_TOOLTIP])
+    if (len(locations) > NUM_LOCATIONS_TOOLTIP):
+        text += '\n\n+{} more'.format(len(locations) - NUM_LOCATIONS_TOOLTIP)
+    return text
+
+# --------------------------------------------------------------------------------------------------
+
+# Many feed items share the same venue, so the map only needs one point per distinct pair of
+# coordinates, with a count of the items there and the location names and addresses for the tooltip
+def get_venues(map_data):
+    counts = map_data.groupby(['Lon', 'Lat'], sort=False).size().rename('Count')
+    locations = map_data.drop_duplicates().groupby(['Lon', 'Lat'], sort=False)['Location'].agg(get_locations_text).rename('Locations')
+
+    return pd.concat([counts, locations], axis=1).reset_index()
+
+# --------------------------------------------------------------------------------------------------
+
+# With very many venues, they are grouped into the cells of a regular grid across the extent of the
+# data, with one point per cell at the mean position of its venues, sized by the number of items. The
+# cells start at 1/GRID_CELLS_ACROSS of the extent, and are doubled in size until there are no more
+# than VENUES_AGGREGATE of them.
+def get_grid(venues):
+    cell_size = max(
+        venues['Lon'].max() - venues['Lon'].min(),
+        venues['Lat'].max() - venues['Lat'].min(),
+        1e-6,
+    ) / GRID_CELLS_ACROSS
+
+    while (True):
+        cells = venues.groupby([
+            np.floor(venues['Lon'] / cell_size).rename('x'),
+            np.floor(venues['Lat'] / cell_size).rename('y'),
+        ]).agg(
+            Lon=('Lon', 'mean'),
+            Lat=('Lat', 'mean'),
+            Count=('Count', 'sum'),
+            Venues=('Count', 'size'),
+        ).reset_index(drop=True)
+        if (len(cells) <= VENUES_AGGREGATE):
+            break
+        cell_size *= 2
+
+    cells['Radius'] = 4 + 16 * np.sqrt(cells['Count'] / cells['Count'].max())
+
+    return cells
+
+# --------------------------------------------------------------------------------------------------
+
+# Returns the points to plot, and whether they are grid cells rather than venues, so that the size of
+# the map data depends on the number of venues rather than the number of feed items
+def get_map_layer_data(map_data):
+    venues = get_venues(map_data)
+    aggregated = (len(venues) > VENUES_AGGREGATE)
+    layer_data = get_grid(venues) if (aggregated) else venues
+
+    return layer_data, aggregated
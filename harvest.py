@@ -0,0 +1,172 @@
+import json
+import os
+import requests
+import threading
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from requests.adapters import HTTPAdapter
+from time import time
+from urllib3.util.retry import Retry
+
+import cache
+
+# --------------------------------------------------------------------------------------------------
+
+COLLECTION_URL = os.environ.get('OPENACTIVE_COLLECTION_URL') or 'https://openactive.io/data-catalogs/data-catalog-collection.jsonld'
+MAX_WORKERS_DEFAULT = 16
+SECONDS_TIMEOUT_DEFAULT = 30
+SECONDS_REFRESH_DEFAULT = 60 * 60
+
+# --------------------------------------------------------------------------------------------------
+
+# One session is shared by all workers, with a connection pool per host that is large enough for every
+# worker to hold a connection at once. Many dataset sites are served from the same few hosts, so this
+# saves a new connection and TLS handshake per page.
+def get_session(max_workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max_workers,
+        pool_maxsize=max_workers,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'OpenActive user'
+
+    return session
+
+# --------------------------------------------------------------------------------------------------
+
+def get_urls(session, url, key, seconds_timeout):
+    try:
+        r = session.get(url, timeout=seconds_timeout)
+        urls = r.json()[key]
+        if (    (r.status_code != 200)
+            or  (any([type(i) != str for i in urls]))
+        ):
+            raise Exception()
+        return urls
+    except:
+        return []
+
+# --------------------------------------------------------------------------------------------------
+
+# The feed dictionaries have the same content as those from oa.get_feeds(), which is what the app was
+# originally built around
+def get_dataset_feeds(session, dataset_url, seconds_timeout):
+    feeds = []
+
+    try:
+        r = session.get(dataset_url, timeout=seconds_timeout)
+        if (r.status_code != 200):
+            raise Exception()
+
+        soup = BeautifulSoup(r.text, 'html.parser')
+        for script in soup.head.find_all('script'):
+            if (    ('type' in script.attrs.keys())
+                and (script['type'] == 'application/ld+json')
+            ):
+                jsonld = json.loads(script.string)
+                if ('distribution' in jsonld.keys()):
+                    for feed_in in jsonld['distribution']:
+                        feed_out = {}
+
+                        try: feed_out['name'] = jsonld['name']
+                        except: feed_out['name'] = ''
+                        try: feed_out['type'] = feed_in['name']
+                        except: feed_out['type'] = ''
+                        try: feed_out['url'] = feed_in['contentUrl']
+                        except: feed_out['url'] = ''
+                        feed_out['datasetUrl'] = dataset_url
+                        try: feed_out['discussionUrl'] = jsonld['discussionUrl']
+                        except: feed_out['discussionUrl'] = ''
+                        try: feed_out['licenseUrl'] = jsonld['license']
+                        except: feed_out['licenseUrl'] = ''
+                        try: feed_out['publisherName'] = jsonld['publisher']['name']
+                        except: feed_out['publisherName'] = ''
+
+                        feeds.append(feed_out)
+    except:
+        pass
+
+    return feeds
+
+# --------------------------------------------------------------------------------------------------
+
+# A concurrent version of oa.get_feeds(). Catalogue and dataset site pages are fetched by a bounded pool
+# of worker threads, and results are collected in the original page order, so the output is the same
+# as when reading each page in turn. Setting max_workers to 1 gives the serial behaviour.
+def get_feeds(collection_url=COLLECTION_URL, max_workers=MAX_WORKERS_DEFAULT, seconds_timeout=SECONDS_TIMEOUT_DEFAULT):
+    session = get_session(max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        catalogue_urls = get_urls(session, collection_url, 'hasPart', seconds_timeout)
+        dataset_urls = list(chain.from_iterable(executor.map(
+            lambda catalogue_url: get_urls(session, catalogue_url, 'dataset', seconds_timeout),
+            catalogue_urls,
+        )))
+        feeds_datasets = list(executor.map(
+            lambda dataset_url: get_dataset_feeds(session, dataset_url, seconds_timeout),
+            dataset_urls,
+        ))
+
+    session.close()
+
+    return {
+        dataset_url: feeds_dataset
+        for dataset_url,feeds_dataset in zip(dataset_urls, feeds_datasets)
+        if (feeds_dataset)
+    }
+
+# --------------------------------------------------------------------------------------------------
+
+# The feeds to offer in the app, shared by all sessions. These are taken from the snapshot on disk
+# from the last read of the catalogue if there is one, so that the app is usable straight away after a
+# restart, and are then read again in a background thread if the snapshot is older than
+# seconds_refresh. The catalogue is only read while waiting if there is no snapshot at all. A fresh
+# read replaces the feeds and the snapshot when it finishes, unless it found no feeds, e.g. because
+# the network is down, in which case the old ones are kept.
+class Catalogue():
+    def __init__(self, collection_url=COLLECTION_URL, seconds_refresh=SECONDS_REFRESH_DEFAULT, catalogue_path=cache.CATALOGUE_PATH):
+        self.collection_url = collection_url
+        self.seconds_refresh = seconds_refresh
+        self.catalogue_path = catalogue_path
+        self.lock = threading.Lock()
+        self.thread = None
+        self.time_attempted = 0
+        self.feeds, self.time_created = cache.get_catalogue(catalogue_path)
+        if (self.feeds is None):
+            self.refresh()
+        else:
+            self.get_feeds()
+
+    def refresh(self):
+        self.time_attempted = time()
+        feeds = get_feeds(self.collection_url)
+        time_created = time()
+        if (feeds):
+            cache.set_catalogue(feeds, time_created, self.catalogue_path)
+        with self.lock:
+            if (    (feeds)
+                or  (self.feeds is None)
+            ):
+                self.feeds = feeds
+                self.time_created = time_created
+            self.thread = None
+
+    @property
+    def refreshing(self):
+        return (self.thread is not None)
+
+    # Returns the current feeds and the time they were read, and starts a background refresh if they
+    # are out of date and one isn't already running. After a failed refresh, the next one waits for
+    # another seconds_refresh.
+    def get_feeds(self):
+        with self.lock:
+            if (    (self.thread is None)
+                and (time() - max(self.time_created, self.time_attempted) >= self.seconds_refresh)
+            ):
+                self.thread = threading.Thread(target=self.refresh, daemon=True)
+                self.thread.start()
+            return self.feeds, self.time_created
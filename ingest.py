@@ -0,0 +1,279 @@
+import copy
+import requests
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from time import perf_counter, sleep
+from urllib.parse import unquote, urlparse
+from urllib3.util import make_headers
+
+from items import ItemStore
+
+# --------------------------------------------------------------------------------------------------
+
+SECONDS_TIMEOUT_DEFAULT = 600
+SECONDS_TIMEOUT_REQUEST_DEFAULT = 30
+SECONDS_WAIT_NEXT_DEFAULT = 0.2
+SECONDS_WAIT_RETRY_DEFAULT = 1
+SECONDS_WAIT_RETRY_MAX = 60
+NUM_TRIES_MAX_DEFAULT = 10
+NUM_CONNECTIONS = 16
+STATUS_CODES_RETRY_BACKOFF = [429, 500, 502, 503, 504]
+
+# This matches the opportunities dictionary returned by oa.get_opportunities(), so that either can be
+# used interchangeably in the app, except that the items are held in an ItemStore to save memory, and
+# the validators of the last page read are kept so that it can be re-requested conditionally
+opportunities_template = {
+    'items': {},
+    'num_urls': 0,
+    'first_url_origin': '',
+    'next_url': '',
+    'status': '',
+    'last_page': None,
+}
+
+# Totals for the pages fetched by one or more reads, where num_bytes is the data actually transferred,
+# which is compressed if the server supports it, and num_bytes_decoded is the size after decompression
+fetch_stats_template = {
+    'num_bytes': 0,
+    'num_bytes_decoded': 0,
+    'num_fetched': 0,
+    'num_revalidated': 0,
+    'num_retries': 0,
+}
+
+# --------------------------------------------------------------------------------------------------
+
+# One session is shared by all reads, with a connection pool per host that is large enough for the app
+# sessions and background readers reading from the same host at once. Compressed responses are asked
+# for in every encoding that urllib3 can decode here, which includes Brotli if it's installed.
+def get_session(num_connections=NUM_CONNECTIONS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=num_connections, pool_maxsize=num_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'OpenActive user'
+    session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+
+    return session
+
+session = get_session()
+
+# --------------------------------------------------------------------------------------------------
+
+# Retry-After is either a number of seconds or an HTTP date
+def get_seconds_retry_after(r, seconds_default):
+    retry_after = r.headers.get('Retry-After')
+    if (not retry_after):
+        return seconds_default
+    try: seconds = float(retry_after)
+    except:
+        try: seconds = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+        except: return seconds_default
+    return min(max(seconds, 0), SECONDS_WAIT_RETRY_MAX)
+
+# --------------------------------------------------------------------------------------------------
+
+# The bytes read from the connection, before any decompression
+def get_num_bytes_transferred(r):
+    try: return r.raw.tell()
+    except: return len(r.content)
+
+# --------------------------------------------------------------------------------------------------
+
+# Fetches a page, sending the validators from an earlier fetch of the same URL if given, so that the
+# server can answer with 304 Not Modified and no body if the page hasn't changed. Returns the page, or
+# None if it hasn't changed, along with the validators to send next time. Responses of 429 Too Many
+# Requests and 5xx server errors are retried after the time in their Retry-After header if there is
+# one, and otherwise after a wait that doubles with each try, as are failed connections, responses
+# that take longer than seconds_timeout_request and pages that can't be decoded. Any other response,
+# such as 404 Not Found, won't change on retrying and fails straight away. If a profiler is given, then
+# the download and the JSON decode of the page are recorded separately, and if a fetch stats
+# dictionary is given, then the totals in it are added to.
+def get_page_conditional(url, validators=None, num_tries_max=NUM_TRIES_MAX_DEFAULT, seconds_wait_retry=SECONDS_WAIT_RETRY_DEFAULT, profiler=None, fetch_stats=None, seconds_timeout_request=SECONDS_TIMEOUT_REQUEST_DEFAULT):
+    headers = {}
+    if (validators):
+        if (validators.get('etag')):
+            headers['If-None-Match'] = validators['etag']
+        if (validators.get('last_modified')):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    r = None
+    seconds_wait = seconds_wait_retry
+    for num_tries in range(num_tries_max):
+        if (num_tries > 0):
+            sleep(seconds_wait)
+            seconds_wait = min(seconds_wait_retry * 2**num_tries, SECONDS_WAIT_RETRY_MAX)
+            if (fetch_stats is not None):
+                fetch_stats['num_retries'] += 1
+        try:
+            time_start = perf_counter()
+            r = session.get(url, headers=headers, timeout=seconds_timeout_request)
+            num_bytes = get_num_bytes_transferred(r)
+            if (    (r.status_code == 304)
+                and (headers)
+            ):
+                if (profiler is not None):
+                    profiler.add('fetch', perf_counter() - time_start, url=url, num_bytes=num_bytes, num_tries=num_tries+1, revalidated=True)
+                if (fetch_stats is not None):
+                    fetch_stats['num_bytes'] += num_bytes
+                    fetch_stats['num_revalidated'] += 1
+                return None, {'etag': validators.get('etag'), 'last_modified': validators.get('last_modified')}
+            elif (r.status_code == 200):
+                if (profiler is not None):
+                    profiler.add('fetch', perf_counter() - time_start, url=url, num_bytes=num_bytes, num_tries=num_tries+1)
+                    time_start = perf_counter()
+                page = r.json()
+                if (profiler is not None):
+                    profiler.add('decode', perf_counter() - time_start, url=url)
+                if (fetch_stats is not None):
+                    fetch_stats['num_bytes'] += num_bytes
+                    fetch_stats['num_bytes_decoded'] += len(r.content)
+                    fetch_stats['num_fetched'] += 1
+                return page, {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+            elif (r.status_code in STATUS_CODES_RETRY_BACKOFF):
+                seconds_wait = get_seconds_retry_after(r, seconds_wait)
+            else:
+                break
+        except:
+            pass
+
+    if (    (r is not None)
+        and (r.status_code not in [200] + STATUS_CODES_RETRY_BACKOFF)
+    ):
+        raise Exception(f'{url}: Call failed with status {r.status_code}')
+
+    raise Exception(f'{url}: Call failed after {num_tries_max} tries')
+
+# --------------------------------------------------------------------------------------------------
+
+def get_page(url, num_tries_max=NUM_TRIES_MAX_DEFAULT, seconds_wait_retry=SECONDS_WAIT_RETRY_DEFAULT, profiler=None):
+    return get_page_conditional(url, None, num_tries_max, seconds_wait_retry, profiler)[0]
+
+# --------------------------------------------------------------------------------------------------
+
+def get_next_url(next_url_original, opportunities):
+    next_url = ''
+
+    next_url_original_unquoted = unquote(next_url_original)
+    next_url_original_parsed = urlparse(next_url_original_unquoted)
+
+    if (    (next_url_original_parsed.scheme != '')
+        and (next_url_original_parsed.netloc != '')
+    ):
+        if (opportunities['num_urls'] == 0):
+            opportunities['first_url_origin'] = '://'.join([next_url_original_parsed.scheme, next_url_original_parsed.netloc])
+        next_url = next_url_original_unquoted
+    elif (  (next_url_original_parsed.path != '')
+        or  (next_url_original_parsed.query != '')
+    ):
+        next_url = opportunities['first_url_origin']
+        if (next_url_original_parsed.path != ''):
+            next_url += ('/' if (next_url_original_parsed.path[0] != '/') else '') + next_url_original_parsed.path
+        if (next_url_original_parsed.query != ''):
+            next_url += ('?' if (next_url_original_parsed.query[0] != '?') else '') + next_url_original_parsed.query
+
+    return next_url
+
+# --------------------------------------------------------------------------------------------------
+
+# Applies the RPDE update and delete rules for one page of items, and returns the items that were
+# actually updated along with the IDs of items that were actually deleted, so that the caller only
+# has to process the changes.
+def set_items(opportunities, page_items):
+    items_updated = {}
+    ids_deleted = []
+
+    for item in page_items:
+        if (all([key in item.keys() for key in ['id', 'state', 'modified']])):
+            if (item['state'] == 'updated'):
+                if (    (item['id'] not in opportunities['items'].keys())
+                    or  (item['modified'] > opportunities['items'][item['id']]['modified'])
+                ):
+                    opportunities['items'][item['id']] = item
+                    items_updated[item['id']] = item
+            elif (  (item['state'] == 'deleted')
+                and (item['id'] in opportunities['items'].keys())
+            ):
+                del(opportunities['items'][item['id']])
+                items_updated.pop(item['id'], None)
+                ids_deleted.append(item['id'])
+
+    return items_updated, ids_deleted
+
+# --------------------------------------------------------------------------------------------------
+
+# A new opportunities dictionary to read a feed into from its first page. Pass this rather than the
+# feed URL to get_opportunities_pages() to be able to see its status even if no page is read.
+def get_opportunities_empty(feed_url):
+    opportunities = copy.deepcopy(opportunities_template)
+    opportunities['items'] = ItemStore()
+    opportunities['next_url'] = get_next_url(feed_url, opportunities)
+
+    return opportunities
+
+# --------------------------------------------------------------------------------------------------
+
+# A generator version of oa.get_opportunities(), which yields after each page of the feed so that the
+# caller can show partial results as they arrive, and can stop at any point between pages. The
+# argument is either a feed URL or an opportunities dictionary from a previous call to continue from.
+# When continuing from the last page read, which is usually the empty final page of the feed, the page
+# is requested conditionally, and if the server says it hasn't changed then there are no new items and
+# the page's "next" URL from before is used, without the page being downloaded again.
+def get_opportunities_pages(arg, seconds_timeout=SECONDS_TIMEOUT_DEFAULT, seconds_wait_next=SECONDS_WAIT_NEXT_DEFAULT, profiler=None, fetch_stats=None):
+    if (type(arg) == str):
+        opportunities = get_opportunities_empty(arg)
+    else:
+        opportunities = arg
+        opportunities['status'] = opportunities_template['status']
+
+    if (not opportunities['next_url']):
+        opportunities['status'] = 'COMPLETE'
+        return
+
+    time_start = datetime.now()
+    while (True):
+        feed_url = opportunities['next_url']
+
+        last_page = opportunities.get('last_page')
+        validators = last_page if ((last_page) and (last_page['url'] == feed_url)) else None
+        try:
+            page, validators = get_page_conditional(feed_url, validators, profiler=profiler, fetch_stats=fetch_stats)
+            if (page is None):
+                page = {'items': [], 'next': last_page['next']}
+            items_updated, ids_deleted = set_items(opportunities, page['items'])
+        except:
+            opportunities['status'] = 'ERROR'
+            break
+
+        if (    ('next' in page.keys())
+            and (type(page['next']) == str)
+            and (len(page['next']) > 0)
+        ):
+            opportunities['next_url'] = get_next_url(page['next'], opportunities)
+        else:
+            opportunities['next_url'] = ''
+
+        if (opportunities['next_url'] != feed_url):
+            opportunities['num_urls'] += 1
+
+        opportunities['last_page'] = None
+        if (    (validators['etag'])
+            or  (validators['last_modified'])
+        ):
+            opportunities['last_page'] = {'url': feed_url, 'next': page.get('next'), **validators}
+
+        done = opportunities['next_url'] in [feed_url, '']
+        if (done):
+            opportunities['status'] = 'COMPLETE'
+        elif (  (seconds_timeout is not None)
+            and ((datetime.now() - time_start).total_seconds() >= seconds_timeout)
+        ):
+            opportunities['status'] = 'TIMEOUT'
+
+        yield opportunities, items_updated, ids_deleted
+
+        if (opportunities['status']):
+            break
+
+        sleep(seconds_wait_next)
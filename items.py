@@ -0,0 +1,153 @@
+import json
+import os
+import sqlite3
+import threading
+import weakref
+import zlib
+from collections.abc import MutableMapping
+
+# --------------------------------------------------------------------------------------------------
+
+COMPRESSION_LEVEL = 1
+ZDICT_NUM_BYTES_MAX = 32 * 1024
+ROWS_ITER = 10000
+
+# --------------------------------------------------------------------------------------------------
+
+# A dictionary of feed items which holds each item as compressed JSON bytes rather than as nested Python
+# objects, which take several times more memory. Items are only decoded when they're accessed, e.g. when
+# shown in a JSON tab. Items from the same feed have a lot of text in common, so the first item set is
+# used as a preset dictionary for compressing all of the items, which compresses small items far better
+# than compressing each one on its own.
+class ItemStore(MutableMapping):
+    def __init__(self):
+        self.items_compressed = {}
+        self.zdict = None
+        self.num_bytes = 0
+
+    def __getitem__(self, item_id):
+        decompressor = zlib.decompressobj(zdict=self.zdict)
+        return json.loads(decompressor.decompress(self.items_compressed[item_id]) + decompressor.flush())
+
+    def __setitem__(self, item_id, item):
+        self.set_raw(item_id, json.dumps(item, separators=(',', ':')).encode())
+
+    def __delitem__(self, item_id):
+        self.num_bytes -= len(self.items_compressed.pop(item_id))
+
+    def __iter__(self):
+        return iter(self.items_compressed)
+
+    def __len__(self):
+        return len(self.items_compressed)
+
+    def __contains__(self, item_id):
+        return item_id in self.items_compressed
+
+    def set_raw(self, item_id, item_json):
+        if (self.zdict is None):
+            self.zdict = item_json[-ZDICT_NUM_BYTES_MAX:]
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=self.zdict)
+        item_compressed = compressor.compress(item_json) + compressor.flush()
+        if (item_id in self.items_compressed):
+            self.num_bytes -= len(self.items_compressed[item_id])
+        self.items_compressed[item_id] = item_compressed
+        self.num_bytes += len(item_compressed)
+
+# --------------------------------------------------------------------------------------------------
+
+# A dictionary of feed items like ItemStore, but held in a SQLite file on disk rather than in memory,
+# for feeds that go over the memory budget while they're read (see spill.py). Items are compressed in
+# the same way, with the preset dictionary of the ItemStore that they're moved from. IDs are stored as
+# text, to match the IDs in the table of a spilled feed, whatever their type in the feed itself. The
+# store can be read from any session's thread, and its file is removed when it's garbage collected.
+# Nothing else opens the file and it needn't survive a crash, so there's no journal, and changes are
+# left in one open transaction rather than committed item by item, which makes writes much faster.
+class DiskItemStore(MutableMapping):
+    def __init__(self, path, zdict=None):
+        self.path = path
+        self.zdict = zdict
+        self.num_bytes = 0 # Nothing is held in memory
+        self.num_items = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS items (item_id TEXT PRIMARY KEY, item BLOB)')
+        self.connection.execute('DELETE FROM items')
+        weakref.finalize(self, remove_database, self.connection, path)
+
+    @classmethod
+    def from_item_store(cls, item_store, path):
+        store = cls(path, item_store.zdict)
+        with store.lock:
+            with store.connection:
+                store.connection.executemany(
+                    'INSERT OR REPLACE INTO items VALUES (?, ?)',
+                    [(str(item_id), item_compressed) for item_id,item_compressed in item_store.items_compressed.items()],
+                )
+            store.num_items = store.connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        return store
+
+    @property
+    def num_bytes_disk(self):
+        try:
+            return os.path.getsize(self.path)
+        except:
+            return 0
+
+    def __getitem__(self, item_id):
+        with self.lock:
+            row = self.connection.execute('SELECT item FROM items WHERE item_id = ?', (str(item_id),)).fetchone()
+        if (row is None):
+            raise KeyError(item_id)
+        decompressor = zlib.decompressobj(zdict=self.zdict)
+        return json.loads(decompressor.decompress(row[0]) + decompressor.flush())
+
+    def __setitem__(self, item_id, item):
+        self.set_raw(item_id, json.dumps(item, separators=(',', ':')).encode())
+
+    def __delitem__(self, item_id):
+        with self.lock:
+            if (self.connection.execute('DELETE FROM items WHERE item_id = ?', (str(item_id),)).rowcount == 0):
+                raise KeyError(item_id)
+            self.num_items -= 1
+
+    # IDs are read in chunks, so that the store can still be changed while it's iterated over
+    def __iter__(self):
+        rowid = 0
+        while (True):
+            with self.lock:
+                rows = self.connection.execute('SELECT rowid, item_id FROM items WHERE rowid > ? ORDER BY rowid LIMIT ?', (rowid, ROWS_ITER)).fetchall()
+            if (not rows):
+                return
+            for rowid,item_id in rows:
+                yield item_id
+
+    def __len__(self):
+        return self.num_items
+
+    def __contains__(self, item_id):
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM items WHERE item_id = ?', (str(item_id),)).fetchone() is not None
+
+    # Updates keep the item in its place, as with a dictionary, so new items are only inserted if there
+    # was nothing to update
+    def set_raw(self, item_id, item_json):
+        if (self.zdict is None):
+            self.zdict = item_json[-ZDICT_NUM_BYTES_MAX:]
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=self.zdict)
+        item_compressed = compressor.compress(item_json) + compressor.flush()
+        with self.lock:
+            if (self.connection.execute('UPDATE items SET item = ? WHERE item_id = ?', (item_compressed, str(item_id))).rowcount == 0):
+                self.connection.execute('INSERT INTO items VALUES (?, ?)', (str(item_id), item_compressed))
+                self.num_items += 1
+
+# --------------------------------------------------------------------------------------------------
+
+def remove_database(connection, path):
+    connection.close()
+    try:
+        os.remove(path)
+    except:
+        pass
@@ -0,0 +1,128 @@
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------------------------------------------------------------------------------
+
+MAX_JOBS_DEFAULT = int(os.environ.get('OPENACTIVE_MAX_JOBS') or 4) # Jobs beyond this are queued until one finishes
+
+# --------------------------------------------------------------------------------------------------
+
+# One piece of work run in the background, such as reading a feed, which is shared by all of the
+# sessions attached to it. The target is called in a worker thread with the job as its first argument,
+# followed by args. It reports its progress with set_progress(), which sessions read with
+# get_progress(), and it should check cancelled between steps and return early if it's set. Its return
+# value is kept as the result. If the job replaces a cancelled job with the same key, then it waits for
+# that job to stop first, so that the two are never working on the same thing at once.
+class Job():
+    def __init__(self, key, target, args, previous=None):
+        self.key = key
+        self.target = target
+        self.args = args
+        self.previous = previous
+        self.status = 'queued'
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.num_sessions = 0
+        self.future = None
+        self.cancelled_event = threading.Event()
+        self.finished_event = threading.Event()
+
+    def run(self):
+        try:
+            if (self.previous is not None):
+                self.previous.wait()
+                self.previous = None
+            if (not self.cancelled):
+                self.status = 'running'
+                self.result = self.target(self, *self.args)
+            self.status = 'cancelled' if (self.cancelled) else 'done'
+        except Exception as e:
+            self.error = e
+            self.status = 'failed'
+        finally:
+            self.finished_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancelled_event.is_set()
+
+    @property
+    def running(self):
+        return (not self.finished_event.is_set())
+
+    # A job that hasn't started yet is taken out of the queue straight away, and otherwise it stops at
+    # the next point at which it checks
+    def cancel(self):
+        self.cancelled_event.set()
+        if (    (self.future is not None)
+            and (self.future.cancel())
+        ):
+            self.status = 'cancelled'
+            self.finished_event.set()
+
+    # Returns True if the job has finished, or False if it's still going after seconds_timeout
+    def wait(self, seconds_timeout=None):
+        return self.finished_event.wait(seconds_timeout)
+
+    # The progress is replaced rather than updated, so that a session always reads a consistent copy
+    def set_progress(self, **fields):
+        self.progress = {**self.progress, **fields}
+
+    def get_progress(self):
+        return self.progress
+
+# --------------------------------------------------------------------------------------------------
+
+# A session's attachment to a job. The session is detached when release() is called, or otherwise when
+# the handle is garbage collected, as with a DatasetHandle.
+class JobHandle():
+    def __init__(self, manager, job):
+        self.job = job
+        self.finalizer = weakref.finalize(self, manager.detach, job)
+
+    def release(self):
+        self.finalizer()
+
+# --------------------------------------------------------------------------------------------------
+
+# Runs jobs for the whole process in a pool of max_jobs worker threads, so that work such as reading a
+# feed carries on between the reruns of a session's script, and a session only has to check on it.
+# Sessions asking for a job with the same key as one that's queued, running or finished but still held
+# are attached to that job rather than starting another, so a feed that's opened in several sessions
+# is only read once. A job is cancelled when the last session attached to it detaches, e.g. when
+# "Clear" is clicked, and finished jobs are dropped once no session holds them.
+class JobManager():
+    def __init__(self, max_jobs=MAX_JOBS_DEFAULT):
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='job')
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def attach(self, key, target, *args):
+        with self.lock:
+            self.jobs = {key_job: job for key_job,job in self.jobs.items() if ((job.num_sessions > 0) or (job.running))}
+            job = self.jobs.get(key)
+            if (    (job is None)
+                or  (job.cancelled)
+                or  (job.status == 'failed')
+            ):
+                job = Job(key, target, args, previous=job if ((job is not None) and (job.running)) else None)
+                job.future = self.executor.submit(job.run)
+                self.jobs[key] = job
+            job.num_sessions += 1
+            return JobHandle(self, job)
+
+    def detach(self, job):
+        with self.lock:
+            job.num_sessions -= 1
+            if (job.num_sessions > 0):
+                return
+            if (job.running):
+                job.cancel()
+            if (    (self.jobs.get(job.key) is job)
+                and (not job.running)
+            ):
+                del(self.jobs[job.key])
@@ -0,0 +1,156 @@
+import pandas as pd
+import threading
+from openactive import get_partner_feed_url
+
+import cache
+from extract import get_highlights
+from ingest import SECONDS_WAIT_NEXT_DEFAULT, fetch_stats_template, get_opportunities_pages
+from profiling import profile
+
+# --------------------------------------------------------------------------------------------------
+
+SUBEVENT_FEED_URL_PARTS = ['scheduled-sessions', 'scheduledsessions', 'scheduled-session', 'scheduledsession']
+JOIN_COLUMNS = ['Organizer name', 'Organizer logo', 'Name', 'Location', 'Lat', 'Lon']
+
+# --------------------------------------------------------------------------------------------------
+
+# Returns the URL of the Session Series feed to join to a Scheduled Sessions feed, or None if the feed
+# isn't a Scheduled Sessions feed or its partner isn't in the same dataset. The partner is found in the
+# same way as in the OpenActive package, by swapping the feed type in the URL.
+def get_superevent_feed_url(feed_url, feed_urls):
+    if (not any([feed_url_part in feed_url for feed_url_part in SUBEVENT_FEED_URL_PARTS])):
+        return None
+    return get_partner_feed_url(feed_url, feed_urls)
+
+# --------------------------------------------------------------------------------------------------
+
+# Super-events are matched on the last part of their @id, which is what a sub-event's superEvent URL
+# is reduced to in the "Super-event ID" column
+def get_superevent_key(item_id, item):
+    try: return item['data']['@id'].split('/')[-1]
+    except:
+        try: return item['data']['id'].split('/')[-1]
+        except: return item_id
+
+# --------------------------------------------------------------------------------------------------
+
+def get_superevents_df(items):
+    df = get_highlights(items)[['ID'] + JOIN_COLUMNS]
+    df.insert(0, 'Super-event ID', pd.Series([get_superevent_key(item_id, item) for item_id,item in items.items()], dtype=object, index=df.index))
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+# The highlights of the super-events read so far, with one row per super-event indexed by its key, to
+# be looked up by the sub-events. Pages are added as they arrive, in the same way as in
+# concat_highlights(), and the rows are only combined when next asked for after a change. Deleted
+# items are tracked by ID, and brought back if they are updated again later.
+class SuperEventIndex():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dfs = []
+        self.ids_deleted = set()
+        self.df = None
+
+    def add_page(self, items_updated, ids_deleted):
+        df_page = get_superevents_df(items_updated) if (items_updated) else None
+        # Deletions are applied before updates, as an item deleted and then updated again in the same
+        # page is in both
+        with self.lock:
+            self.ids_deleted.update(ids_deleted)
+            if (df_page is not None):
+                self.dfs.append(df_page)
+                self.ids_deleted.difference_update(items_updated.keys())
+            self.df = None
+
+    def get_df(self):
+        with self.lock:
+            if (    (self.df is None)
+                and (self.dfs)
+            ):
+                df = pd.concat(self.dfs, ignore_index=True).drop_duplicates('ID', keep='last')
+                df = df.loc[~df['ID'].isin(self.ids_deleted)]
+                self.df = df.drop_duplicates('Super-event ID', keep='last').set_index('Super-event ID')
+            return self.df
+
+# --------------------------------------------------------------------------------------------------
+
+# Fills the fields that are missing from sub-event rows with those of their super-events, through a
+# hash lookup of each row's super-event ID in the super-event index. The filled values are references
+# to the same objects as in the super-event rows, so a super-event's data isn't copied for each of its
+# sub-events.
+def join_superevents(df, superevents):
+    if (    (superevents is None)
+        or  (len(superevents) == 0)
+        or  (len(df) == 0)
+    ):
+        return df
+
+    positions = superevents.index.get_indexer(pd.Index(df['Super-event ID'], dtype=object))
+    matched = (positions >= 0)
+    if (not matched.any()):
+        return df
+
+    df = df.copy(deep=False)
+    for column in JOIN_COLUMNS:
+        rows = matched & df[column].isna().to_numpy()
+        if (rows.any()):
+            categorical = (df[column].dtype == 'category')
+            values = df[column].to_numpy(dtype=object if (categorical) else None, copy=True)
+            values[rows] = superevents[column].to_numpy()[positions[rows]]
+            df[column] = pd.Series(values, index=df.index, dtype='category' if (categorical) else df[column].dtype)
+
+    return df
+
+# --------------------------------------------------------------------------------------------------
+
+# Reads a super-event feed in a background thread, so that it downloads at the same time as its
+# sub-event feed is read in the app script. Each page is added to the super-event index as it arrives,
+# so that sub-events can be joined with the super-events read so far at any point. The read stops
+# after the current page if stop() is called, e.g. when the app script is interrupted.
+class SuperEventReader():
+    def __init__(self, feed_url, use_cache=True, seconds_wait_next=SECONDS_WAIT_NEXT_DEFAULT, profiler=None):
+        self.feed_url = feed_url
+        self.use_cache = use_cache
+        self.seconds_wait_next = seconds_wait_next
+        self.profiler = profiler
+        self.index = SuperEventIndex()
+        self.opportunities = None
+        self.num_pages = 0
+        self.fetch_stats = dict(fetch_stats_template)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        opportunities = None
+        if (self.use_cache):
+            opportunities, num_bytes = cache.get_opportunities(self.feed_url)
+        if (opportunities is not None):
+            self.opportunities = opportunities
+            if (opportunities['items']):
+                self.index.add_page(opportunities['items'], [])
+
+        for opportunities, items_updated, ids_deleted in get_opportunities_pages(self.feed_url if (opportunities is None) else opportunities, seconds_wait_next=self.seconds_wait_next, profiler=self.profiler, fetch_stats=self.fetch_stats):
+            if (self.use_cache):
+                cache.set_page(self.feed_url, opportunities, items_updated, ids_deleted)
+            with profile(self.profiler, 'extract super-events', num_items=len(items_updated)):
+                self.index.add_page(items_updated, ids_deleted)
+            self.opportunities = opportunities
+            self.num_pages += 1
+            if (self.stopped.is_set()):
+                break
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    @property
+    def num_items(self):
+        return 0 if (self.opportunities is None) else len(self.opportunities['items'])
+
+    def stop(self):
+        self.stopped.set()
+
+    def wait(self, seconds_timeout=None):
+        self.thread.join(seconds_timeout)
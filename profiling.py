@@ -0,0 +1,109 @@
+import json
+import os
+import pandas as pd
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, time
+
+# --------------------------------------------------------------------------------------------------
+
+MAX_RECORDS_DEFAULT = 100000
+
+# --------------------------------------------------------------------------------------------------
+
+# The current resident set size of the process, from /proc where available, or otherwise the peak
+# resident set size, which is all that the resource module gives. Neither is available on Windows, where
+# 0 is returned.
+def get_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if (os.uname().sysname == 'Darwin') else rss * 1024
+    except:
+        return 0
+
+# --------------------------------------------------------------------------------------------------
+
+# Records the wall time of each stage of reading and showing a feed, as one record per call with the
+# process memory at the end of the stage and any extra fields given, such as the bytes downloaded or
+# the number of items. Records are kept in memory up to max_records, and are also appended to a JSON
+# lines file at log_path if given. A profiler is only created when profiling is switched on, and None
+# is passed around in its place otherwise, so the only cost when off is a check for None.
+class Profiler():
+    def __init__(self, log_path=None, max_records=MAX_RECORDS_DEFAULT):
+        self.log_path = log_path
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, **fields):
+        record = {
+            'time': time(),
+            'stage': stage,
+            'seconds': seconds,
+            'rss_bytes': get_rss_bytes(),
+            **fields,
+        }
+        with self.lock:
+            self.records.append(record)
+            if (self.log_path):
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+
+    @contextmanager
+    def stage(self, stage, **fields):
+        time_start = perf_counter()
+        try:
+            yield fields
+        finally:
+            self.add(stage, perf_counter() - time_start, **fields)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def get_records(self):
+        with self.lock:
+            return list(self.records)
+
+    def get_jsonl(self):
+        return ''.join([json.dumps(record, default=str) + '\n' for record in self.get_records()])
+
+    # Totals per stage, in the order that the stages were first recorded
+    def get_summary(self):
+        df = pd.DataFrame(self.get_records(), columns=['stage', 'seconds', 'num_bytes', 'num_items'])
+        if (len(df) == 0):
+            return None
+        summary = df.groupby('stage', sort=False).agg(
+            calls=('seconds', 'size'),
+            seconds_total=('seconds', 'sum'),
+            ms_mean=('seconds', 'mean'),
+            ms_max=('seconds', 'max'),
+            num_bytes=('num_bytes', 'sum'),
+            num_items=('num_items', 'sum'),
+        )
+        summary['ms_mean'] *= 1000
+        summary['ms_max'] *= 1000
+        summary['num_bytes'] /= 1024**2
+        return summary.rename(columns={
+            'calls': 'Calls',
+            'seconds_total': 'Total (s)',
+            'ms_mean': 'Mean (ms)',
+            'ms_max': 'Max (ms)',
+            'num_bytes': 'MB',
+            'num_items': 'Items',
+        })
+
+# --------------------------------------------------------------------------------------------------
+
+# Times a block as a stage of the given profiler, or does nothing if the profiler is None. The block
+# can add fields to the record through the dictionary it is given.
+def profile(profiler, stage, **fields):
+    if (profiler is None):
+        return nullcontext(fields)
+    return profiler.stage(stage, **fields)
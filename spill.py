@@ -0,0 +1,202 @@
+import numpy as np
+import os
+import pandas as pd
+import pyarrow as pa
+import shutil
+import tempfile
+import weakref
+
+from cache import CACHE_PATH
+from export import PartWriter
+from items import DiskItemStore
+from profiling import get_rss_bytes
+
+# --------------------------------------------------------------------------------------------------
+
+SPILL_PATH = os.environ.get('OPENACTIVE_SPILL_PATH') or os.path.join(os.path.dirname(CACHE_PATH), 'spill')
+SESSION_MAX_MB_DEFAULT = 1024
+PROCESS_MAX_FRACTION_DEFAULT = 0.5
+ROWS_PART_DEFAULT = 10000
+
+# --------------------------------------------------------------------------------------------------
+
+def get_max_bytes(env_var, default_mb):
+    try:
+        return int(float(os.environ[env_var]) * 1024**2)
+    except:
+        return None if (default_mb is None) else int(default_mb * 1024**2)
+
+# By default the process budget is a fraction of the machine's memory, so that a feed is spilled to
+# disk well before the process is at risk of being killed for running out of memory
+def get_memory_bytes():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except:
+        return None
+
+# --------------------------------------------------------------------------------------------------
+
+# Limits on the memory used while reading a feed, as the data held for the feed by one session, and
+# as the resident memory of the whole process, which is shared by all sessions. Either can be given in
+# bytes, or otherwise set in MB by environment variable, and a process limit of 0 turns it off.
+class MemoryBudget():
+    def __init__(self, session_max_bytes=None, process_max_bytes=None):
+        memory_bytes = get_memory_bytes()
+        if (session_max_bytes is None):
+            session_max_bytes = get_max_bytes('OPENACTIVE_SESSION_MAX_MB', SESSION_MAX_MB_DEFAULT)
+        if (process_max_bytes is None):
+            process_max_bytes = get_max_bytes(
+                'OPENACTIVE_PROCESS_MAX_MB',
+                None if (memory_bytes is None) else memory_bytes * PROCESS_MAX_FRACTION_DEFAULT / 1024**2,
+            )
+        self.session_max_bytes = session_max_bytes
+        self.process_max_bytes = process_max_bytes
+
+    def is_exceeded(self, num_bytes_session):
+        return (
+                (num_bytes_session > self.session_max_bytes)
+            or  ((bool(self.process_max_bytes)) and (get_rss_bytes() > self.process_max_bytes))
+        )
+
+# --------------------------------------------------------------------------------------------------
+
+# Every part of a spilled table has the same Arrow types, even where a column is empty in one part, and
+# categorical columns are written as plain text, as the categories differ from part to part
+def get_arrow_table(df):
+    fields = []
+    for column in df.columns:
+        if (pd.api.types.is_float_dtype(df[column].dtype)):
+            fields.append((column, pa.float64()))
+        elif (pd.api.types.is_datetime64_any_dtype(df[column].dtype)):
+            fields.append((column, pa.timestamp('us')))
+        else:
+            fields.append((column, pa.string()))
+    df = df.astype({column: object for column in df.columns if (isinstance(df[column].dtype, pd.CategoricalDtype))})
+    return pa.Table.from_pandas(df, schema=pa.schema(fields), preserve_index=False)
+
+# --------------------------------------------------------------------------------------------------
+
+# The table of a feed that has been spilled to disk, which stands in for the table DataFrame in the
+# parts of the app that use it. The table is an Arrow file mapped into memory, so only the pages of it
+# that are read are loaded, and they can be dropped again by the OS when memory is short. take() gives
+# a view of some rows without reading anything, and rows are only read into a DataFrame when columns
+# are selected or a copy is made, e.g. for the current page of the table or for the map. Rows are
+# labelled from 1 as in the DataFrame, so that row labels and positions work the same way.
+class SpilledTable():
+    def __init__(self, table, positions=None):
+        self.table = table
+        self.positions = positions
+        self.columns = pd.Index(table.column_names)
+        self.index = pd.RangeIndex(1, table.num_rows + 1) if (positions is None) else pd.Index(positions + 1)
+        self.num_bytes = 0 # Mapped from disk rather than held in memory
+        self.num_bytes_disk = table.nbytes
+
+    def __len__(self):
+        return len(self.index)
+
+    # Text columns are read as objects with None for missing values, as in the DataFrame, rather than
+    # as the str dtype with NaN that Arrow gives by default
+    def __getitem__(self, key):
+        table = self.table.select([key] if (type(key) == str) else list(key))
+        if (self.positions is not None):
+            table = table.take(self.positions)
+        df = table.to_pandas()
+        for column in table.column_names:
+            if (pa.types.is_string(table.schema.field(column).type)):
+                df[column] = pd.Series(table.column(column).to_numpy(zero_copy_only=False), dtype=object)
+        df.index = self.index
+        return df[key]
+
+    def take(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        return SpilledTable(self.table, positions if (self.positions is None) else self.positions[positions])
+
+    def copy(self, deep=True):
+        return self[list(self.columns)]
+
+# --------------------------------------------------------------------------------------------------
+
+# The file is removed as soon as it's mapped, so that its space is freed when the table is, and isn't
+# left behind if the process exits. Where an open file can't be removed, it's left in the spill
+# directory.
+def read_spilled_table(table_path):
+    table = pa.ipc.open_file(pa.memory_map(table_path)).read_all()
+    try:
+        os.remove(table_path)
+    except:
+        pass
+    return SpilledTable(table)
+
+# --------------------------------------------------------------------------------------------------
+
+# The highlights of a feed as it's read, kept in memory as one DataFrame per page until the data held
+# for the feed goes over the memory budget. From then on, the raw items are moved to a DiskItemStore,
+# and the rows are written to Parquet part files as they arrive, with updated and deleted items
+# superseded as in an export. When the read is finished, the parts are joined and converted one at a
+# time into a single Arrow file to be mapped as a SpilledTable, so that the whole table is never in
+# memory at once. The part files are removed when the table is made, or when the buffer is garbage
+# collected if the read is cancelled. A spilled table has its rows in the order in which the items were
+# last updated, rather than the order in which they were first read.
+class HighlightsBuffer():
+    def __init__(self, budget=None, spill_dir=SPILL_PATH, rows_part=ROWS_PART_DEFAULT):
+        self.budget = budget or MemoryBudget()
+        self.spill_dir = spill_dir
+        self.rows_part = rows_part
+        self.dfs = []
+        self.num_bytes = 0
+        self.parts_dir = None
+        self.part_writer = None
+        self.finalizer = None
+
+    @property
+    def spilled(self):
+        return (self.part_writer is not None)
+
+    def add(self, opportunities, df, ids_deleted=[]):
+        if (self.spilled):
+            self.part_writer.add_page(df, ids_deleted)
+            return
+        if (df is not None):
+            self.dfs.append(df)
+            self.num_bytes += int(df.memory_usage(deep=True).sum())
+        if (self.budget.is_exceeded(self.num_bytes + opportunities['items'].num_bytes)):
+            self.spill(opportunities)
+
+    def spill(self, opportunities):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.parts_dir = tempfile.mkdtemp(dir=self.spill_dir)
+        self.finalizer = weakref.finalize(self, shutil.rmtree, self.parts_dir, ignore_errors=True)
+        self.part_writer = PartWriter(self.parts_dir, rows_part=self.rows_part)
+        if (self.dfs):
+            df = pd.concat(self.dfs, ignore_index=True).drop_duplicates('ID', keep='last')
+            df = df.loc[[item_id in opportunities['items'] for item_id in df['ID']]]
+            self.dfs = []
+            for idx in range(0, len(df), self.rows_part):
+                self.part_writer.add_page(df.iloc[idx:idx+self.rows_part], [])
+        file_descriptor, items_path = tempfile.mkstemp(suffix='.sqlite', dir=self.spill_dir)
+        os.close(file_descriptor)
+        opportunities['items'] = DiskItemStore.from_item_store(opportunities['items'], items_path)
+        self.num_bytes = 0
+
+    # transform is applied to each part as it's read back, e.g. to join it with its super-events, and
+    # its result is what goes into the table
+    def get_spilled_table(self, transform):
+        self.part_writer.close()
+        table_path = os.path.join(self.parts_dir, 'table.arrow')
+        writer = None
+        try:
+            for part_idx in range(self.part_writer.num_parts):
+                part_path = self.part_writer.get_part_path(part_idx)
+                if (not os.path.exists(part_path)):
+                    continue
+                table = get_arrow_table(transform(pd.read_parquet(part_path)))
+                os.remove(part_path)
+                if (writer is None):
+                    writer = pa.ipc.new_file(table_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if (writer is not None):
+                writer.close()
+        table = None if (writer is None) else read_spilled_table(table_path)
+        self.finalizer()
+        return table
@@ -0,0 +1,151 @@
+import threading
+import weakref
+from sys import getsizeof
+from time import time
+
+# --------------------------------------------------------------------------------------------------
+
+MAX_BYTES_DEFAULT = 4 * 1024**3
+
+# --------------------------------------------------------------------------------------------------
+
+# Approximate size in memory of nested dicts, lists and values, such as the raw feed items
+def get_num_bytes(arg):
+    num_bytes = 0
+
+    args = [arg]
+    while (args):
+        arg = args.pop()
+        num_bytes += getsizeof(arg)
+        if (type(arg) == dict):
+            args.extend(arg.keys())
+            args.extend(arg.values())
+        elif (type(arg) in [list, tuple]):
+            args.extend(arg)
+
+    return num_bytes
+
+# --------------------------------------------------------------------------------------------------
+
+# The unique values lists aren't counted, as their values are the same objects as in the DataFrame
+def get_data_num_bytes(data):
+    num_bytes = 0
+
+    for key in ['df', 'superevents']:
+        if (data.get(key) is None):
+            continue
+        if (hasattr(data[key], 'num_bytes')):
+            num_bytes += data[key].num_bytes
+        else:
+            num_bytes += int(data[key].memory_usage(deep=True).sum())
+
+    for key in ['filter_index', 'facet_index', 'sort_index']:
+        if (key in data.keys()):
+            num_bytes += data[key].num_bytes
+
+    for key in ['opportunities', 'superevent_opportunities']:
+        if (data.get(key) is None):
+            continue
+        if (hasattr(data[key]['items'], 'num_bytes')):
+            num_bytes += data[key]['items'].num_bytes
+        else:
+            num_bytes += get_num_bytes(data[key]['items'])
+
+    return num_bytes
+
+# --------------------------------------------------------------------------------------------------
+
+# The size on disk of a feed that went over the memory budget while it was read (see spill.py)
+def get_data_num_bytes_disk(data):
+    num_bytes = 0
+
+    if (hasattr(data.get('df'), 'num_bytes_disk')):
+        num_bytes += data['df'].num_bytes_disk
+    if (    (data.get('opportunities') is not None)
+        and (hasattr(data['opportunities']['items'], 'num_bytes_disk'))
+    ):
+        num_bytes += data['opportunities']['items'].num_bytes_disk
+
+    return num_bytes
+
+# --------------------------------------------------------------------------------------------------
+
+# A session's hold on a shared dataset. The dataset is released when release() is called, or otherwise
+# when the handle is garbage collected, for example when a browser tab is closed and its session state
+# is discarded, so that datasets aren't kept alive by sessions that no longer exist.
+class DatasetHandle():
+    def __init__(self, store, dataset):
+        self.feed_url = dataset['feed_url']
+        self.data = dataset['data']
+        self.finalizer = weakref.finalize(self, store.release, dataset)
+
+    def release(self):
+        self.finalizer()
+
+# --------------------------------------------------------------------------------------------------
+
+# Holds one copy of each loaded feed for the whole process, to be shared read-only between sessions,
+# with a count of the handles currently held on each. A dataset is removed when its last handle is
+# released. If the total size goes over max_bytes, then the least recently used datasets are removed
+# too. These stay with the sessions already holding them, but are no longer given to new sessions, so
+# that their memory is freed as soon as the existing sessions are finished with them.
+class DatasetStore():
+    def __init__(self, max_bytes=MAX_BYTES_DEFAULT):
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.datasets = {}
+
+    def acquire(self, feed_url):
+        with self.lock:
+            if (feed_url not in self.datasets.keys()):
+                return None
+            return self.get_handle(self.datasets[feed_url])
+
+    def publish(self, feed_url, data):
+        with self.lock:
+            if (feed_url not in self.datasets.keys()):
+                self.datasets[feed_url] = {
+                    'feed_url': feed_url,
+                    'data': data,
+                    'num_bytes': get_data_num_bytes(data),
+                    'num_bytes_disk': get_data_num_bytes_disk(data),
+                    'num_handles': 0,
+                    'time_accessed': time(),
+                }
+            handle = self.get_handle(self.datasets[feed_url])
+            self.evict()
+            return handle
+
+    def get_handle(self, dataset):
+        dataset['num_handles'] += 1
+        dataset['time_accessed'] = time()
+        return DatasetHandle(self, dataset)
+
+    def release(self, dataset):
+        with self.lock:
+            dataset['num_handles'] -= 1
+            if (    (dataset['num_handles'] == 0)
+                and (self.datasets.get(dataset['feed_url']) is dataset)
+            ):
+                del(self.datasets[dataset['feed_url']])
+
+    def evict(self):
+        datasets = sorted(self.datasets.values(), key=lambda x: x['time_accessed'])
+        num_bytes_total = sum([dataset['num_bytes'] for dataset in datasets])
+        for dataset in datasets[:-1]:
+            if (num_bytes_total <= self.max_bytes):
+                break
+            del(self.datasets[dataset['feed_url']])
+            num_bytes_total -= dataset['num_bytes']
+
+    def get_stats(self):
+        with self.lock:
+            return [
+                {
+                    'feed_url': dataset['feed_url'],
+                    'num_bytes': dataset['num_bytes'],
+                    'num_bytes_disk': dataset['num_bytes_disk'],
+                    'num_sessions': dataset['num_handles'],
+                }
+                for dataset in self.datasets.values()
+            ]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------------------------------------------------------------
+
+PAGE_SIZES = [100, 500, 1000, 5000]
+
+# --------------------------------------------------------------------------------------------------
+
+# Sort keys for paging through the table on the server, so that only the rows on the current page need
+# to be sent to the browser. Each column's values are replaced by their integer rank in the whole
+# DataFrame the first time the column is sorted on, after which sorting any set of filtered rows is a
+# fast integer sort rather than a sort of the values themselves. Missing values always go last, and
+# equal values keep their row order, as with a stable pandas sort.
+class SortIndex():
+    def __init__(self, df):
+        self.df = df
+        self.ranks = {}
+
+    def get_ranks(self, column):
+        if (column not in self.ranks.keys()):
+            try:
+                codes, values = pd.factorize(self.df[column], sort=True)
+            except TypeError:
+                codes, values = pd.factorize(self.df[column].map(lambda x: None if (x is None) else str(x)), sort=True)
+            codes = codes.astype(np.int32)
+            codes[codes < 0] = len(values)
+            self.ranks[column] = (codes, len(values))
+        return self.ranks[column]
+
+    @property
+    def num_bytes(self):
+        return sum([codes.nbytes for codes,num_values in self.ranks.values()])
+
+    def get_positions(self, positions, column, ascending=True):
+        codes, num_values = self.get_ranks(column)
+        keys = codes[positions]
+        if (not ascending):
+            keys = np.where(keys == num_values, num_values, num_values - 1 - keys)
+        return positions[np.lexsort((positions, keys))]
+
+# --------------------------------------------------------------------------------------------------
+
+def get_num_pages(num_rows, page_size):
+    return max(1, -(-num_rows // page_size))